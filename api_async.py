@@ -0,0 +1,305 @@
+"""
+Capa asíncrona (ASGI) para los endpoints que usan los POS.
+
+Las rutas del POS se atienden en el event loop: las lecturas van al
+DBExecutor (pocos hilos con conexión del pool) y las escrituras al
+escritor único, esperando su Future sin ocupar un hilo. El resto de la
+app Flask se sirve por WSGIFallback con un pool de hilos acotado.
+
+Uso: ASYNC_API=1 python app.py   (o uvicorn asgi:application)
+"""
+
+import json
+import re
+from datetime import datetime
+from urllib.parse import parse_qs
+
+from utils import catalog_sync
+from utils import codigos
+from utils import compression
+from utils import serializer
+from utils import shards
+from utils.aio import DBExecutor, WSGIFallback, read_body, run_write, send_response, serve
+from utils.security import log_security_event
+from api_routes import _validar_venta, _insertar_venta, _estado_sync, _actualizar_stock, _parametros_feed
+from api_routes import _codigos_del_pedido, _validar_codigos, _respuesta_codigos
+
+class AsyncRequest:
+    """Datos mínimos del request ASGI"""
+
+    def __init__(self, scope, body: bytes, params):
+        self.method = scope['method']
+        self.path = scope['path']
+        self.params = params
+        self.args = {k: v[0] for k, v in parse_qs(scope.get('query_string', b'').decode('latin-1')).items()}
+        self.headers = {k.decode('latin-1').lower(): v.decode('latin-1') for k, v in scope.get('headers', [])}
+        self.remote_addr = (scope.get('client') or ('',))[0]
+        self.body = body
+
+    def get_json(self):
+        try:
+            return json.loads(self.body) if self.body else None
+        except ValueError:
+            return None
+
+def _json(status: int, obj):
+    return status, serializer.dumps(obj)
+
+def _lista_productos(conn, version: int, formato: str) -> bytes:
+    return catalog_sync.cuerpo_por_version(
+        ('productos.pos', formato), version,
+        lambda: serializer.named_json(conn, 'productos.pos', (), formato))
+
+def _error_interno(request, e):
+    log_security_event('API_ERROR', request.remote_addr, str(e))
+    return _json(500, {'error': 'Error interno del servidor'})
+
+class AsyncAPI:
+    """App ASGI: rutas del POS asíncronas y el resto delegado a Flask"""
+
+    def __init__(self, flask_app, db_workers: int = 4, wsgi_workers: int = 8):
+        self.flask_app = flask_app
+        self.config = flask_app.config
+        self.db = DBExecutor(flask_app.extensions['db_pool'], db_workers)
+        self.writer = flask_app.extensions['db_writer']
+        self.fallback = WSGIFallback(flask_app, wsgi_workers)
+        flask_app.extensions['async_api'] = self
+
+        self.routes = []
+        # /api/productos lo resuelve la ruta de app.py (registrada antes que el blueprint)
+        self.route('GET', '/api/productos', self.productos, api_key=False)
+        # Antes que <codigo>: si no, 'cambios' se tomaría como un código de barras
+        self.route('GET', '/api/productos/cambios', self.productos_cambios)
+        self.route('GET', '/api/productos/codigos', self.productos_por_codigos)
+        self.route('POST', '/api/productos/codigos', self.productos_por_codigos)
+        self.route('GET', '/api/productos/<codigo>', self.producto_por_codigo)
+        self.route('POST', '/api/ventas', self.recibir_venta)
+        self.route('POST', '/api/productos/stock', self.actualizar_stock)
+        self.route('GET', '/api/sync/status', self.sync_status)
+        self.route('GET', '/api/db/async', self.async_stats)
+
+    def route(self, method: str, pattern: str, handler, api_key: bool = True):
+        regex = re.compile('^' + re.sub(r'<(\w+)>', r'(?P<\1>[^/]+)', pattern) + '$')
+        self.routes.append((method, regex, handler, api_key))
+
+    def _match(self, method: str, path: str):
+        for route_method, regex, handler, api_key in self.routes:
+            match = regex.match(path)
+            if match and route_method == method:
+                return handler, api_key, match.groupdict()
+        return None, False, None
+
+    def _api_key_ok(self, request: AsyncRequest) -> bool:
+        api_key = request.headers.get('x-api-key')
+        if not api_key or api_key != self.config.get('API_KEY', 'default_key'):
+            log_security_event('INVALID_API_KEY', request.remote_addr)
+            return False
+        return True
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self._lifespan(receive, send)
+            return
+        if scope['type'] != 'http':
+            return
+
+        handler, api_key, params = self._match(scope['method'], scope['path'])
+        if handler is None:
+            await self.fallback(scope, receive, send)
+            return
+
+        request = AsyncRequest(scope, await read_body(receive), params)
+        try:
+            request.body = compression.decompress(request.body, request.headers.get('content-encoding'),
+                                                  self.config.get('COMPRESSION_MAX_SIZE',
+                                                                  compression.MAX_DECOMPRESSED))
+        except compression.UnsupportedEncodingError:
+            await send_response(send, *_json(415, {'error': 'Content-Encoding no soportado'}))
+            return
+        except compression.PayloadTooLargeError:
+            await send_response(send, *_json(413, {'error': 'Cuerpo demasiado grande'}))
+            return
+        except (OSError, EOFError, ValueError):
+            await send_response(send, *_json(400, {'error': 'Cuerpo comprimido inválido'}))
+            return
+
+        if api_key and not self._api_key_ok(request):
+            status, body = _json(401, {'error': 'API key inválida'})
+            headers = []
+        else:
+            status, body, *extra = await handler(request)
+            headers = list(extra[0]) if extra else []
+        body, headers = self._encode(request, status, body, headers)
+        await send_response(send, status, body, headers=headers)
+
+    def _encode(self, request, status: int, body, headers):
+        """Comprime la respuesta si el cliente lo acepta (mismo criterio que compression.compress_response)"""
+        if not self.config.get('COMPRESSION_ENABLED', True):
+            return body, headers
+        headers.append((b'accept-encoding', compression.accept_encoding_header().encode('latin-1')))
+        if status in (204, 304) or not body:
+            return body, headers
+        headers.append((b'vary', b'Accept-Encoding'))
+        body, encoding = compression.encode_body(body, request.headers.get('accept-encoding'),
+                                                 self.config.get('COMPRESSION_MIN_SIZE', compression.MIN_SIZE))
+        if encoding:
+            headers = [(k, compression.etag_for(v.decode('latin-1'), encoding).encode('latin-1'))
+                       if k == b'etag' else (k, v) for k, v in headers]
+            headers.append((b'content-encoding', encoding.encode('latin-1')))
+        return body, headers
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                self.db.shutdown()
+                self.fallback.shutdown()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    # ------------------------------------------------------------------
+    # Endpoints
+    # ------------------------------------------------------------------
+    async def productos(self, request):
+        """Productos activos para el POS (304 si el ETag sigue vigente)"""
+        try:
+            formato = request.args.get('formato', serializer.FORMATO_FILAS)
+            if formato != serializer.FORMATO_COLUMNAR:
+                formato = serializer.FORMATO_FILAS
+            version = await self.db.run(catalog_sync.version_actual)
+            tag = catalog_sync.etag(version, 'productos.pos', formato)
+            if tag is None:
+                data_json = await self.db.run(serializer.named_json, 'productos.pos', (), formato)
+                return 200, data_json.encode('utf-8')
+
+            headers = [(b'etag', tag.encode('latin-1')), (b'cache-control', b'no-cache')]
+            if catalog_sync.etag_coincide(request.headers.get('if-none-match'), tag):
+                return 304, b'', headers
+            body = await self.db.run(_lista_productos, version, formato)
+            return 200, body, headers
+        except Exception as e:
+            return _json(500, {'error': str(e)})
+
+    async def productos_cambios(self, request):
+        """Feed incremental de productos desde el cursor ?since="""
+        try:
+            since, limite = _parametros_feed(request.args)
+        except ValueError:
+            return _json(400, {'error': 'since y limite deben ser enteros'})
+        try:
+            data = await self.db.run(catalog_sync.feed, since, limite)
+            data.update(success=True, timestamp=datetime.now().isoformat())
+            return _json(200, data)
+        except Exception as e:
+            return _error_interno(request, e)
+
+    async def _indice_codigos(self):
+        """Índice de códigos al día; la relectura de la base va a un worker, no al loop"""
+        indice = self.flask_app.extensions['code_index']
+        if indice.vencido():
+            await self.db.run(indice.actualizar)
+        return indice
+
+    async def producto_por_codigo(self, request):
+        """Obtiene un producto específico por código (índice en memoria, ver utils.codigos)"""
+        try:
+            producto = (await self._indice_codigos()).get(request.params['codigo'])
+            if producto is None:
+                return _json(404, {'error': 'Producto no encontrado'})
+            return _json(200, {
+                'success': True,
+                'data': producto,
+                'timestamp': datetime.now().isoformat()
+            })
+        except Exception as e:
+            return _error_interno(request, e)
+
+    async def productos_por_codigos(self, request):
+        """Obtiene varios productos por código en una sola llamada (ver api_routes)"""
+        data = (request.get_json() or {}) if request.method == 'POST' else None
+        lista = _codigos_del_pedido(request.args, data)
+        error = _validar_codigos(lista)
+        if error:
+            return _json(400, {'error': error})
+        try:
+            indice = await self._indice_codigos()
+            return _json(200, _respuesta_codigos(indice.get_many(dict.fromkeys(lista))))
+        except Exception as e:
+            return _error_interno(request, e)
+
+    async def recibir_venta(self, request):
+        """Recibe una venta del POS"""
+        try:
+            data = request.get_json()
+            error = _validar_venta(data)
+            if error:
+                return _json(400, {'error': error})
+
+            router = self.flask_app.extensions.get('shard_router')
+            writer = self.writer
+            if router is not None:
+                try:
+                    writer = router.writer(shards.tienda_from_headers(request.headers, data))
+                except shards.UnknownShardError as e:
+                    return _json(400, {'error': str(e)})
+            id_venta = await run_write(writer, _insertar_venta, data)
+            log_security_event('VENTA_RECIBIDA', request.remote_addr, f"Venta ID: {id_venta}")
+            return _json(200, {
+                'success': True,
+                'message': 'Venta registrada correctamente',
+                'id_venta': id_venta,
+                'timestamp': datetime.now().isoformat()
+            })
+        except Exception as e:
+            return _error_interno(request, e)
+
+    async def actualizar_stock(self, request):
+        """Actualiza stock de productos (para sincronización)"""
+        try:
+            data = request.get_json()
+            if not data or 'productos' not in data:
+                return _json(400, {'error': 'Datos requeridos'})
+
+            actualizados = await run_write(self.writer, _actualizar_stock, data['productos'])
+            codigos.notificar(p['id_producto'] for p in data['productos'] if 'id_producto' in p)
+            return _json(200, {
+                'success': True,
+                'message': f'{actualizados} productos actualizados',
+                'actualizados': actualizados,
+                'timestamp': datetime.now().isoformat()
+            })
+        except Exception as e:
+            return _error_interno(request, e)
+
+    async def sync_status(self, request):
+        """Obtiene estado de sincronización"""
+        try:
+            estado = await self.db.run(_estado_sync)
+            return _json(200, {
+                'success': True,
+                'data': estado,
+                'timestamp': datetime.now().isoformat()
+            })
+        except Exception as e:
+            return _error_interno(request, e)
+
+    async def async_stats(self, request):
+        """Estadísticas del ejecutor de base de datos asíncrono"""
+        return _json(200, {
+            'success': True,
+            'data': self.db.stats(),
+            'timestamp': datetime.now().isoformat()
+        })
+
+def create_asgi_app(flask_app) -> AsyncAPI:
+    return AsyncAPI(
+        flask_app,
+        db_workers=flask_app.config.get('ASYNC_DB_WORKERS', 4),
+        wsgi_workers=flask_app.config.get('ASYNC_WSGI_WORKERS', 8),
+    )
+
+def run(flask_app, host: str = '0.0.0.0', port: int = 5000):
+    """Sirve la app completa en modo asíncrono"""
+    serve(create_asgi_app(flask_app), host=host, port=port)
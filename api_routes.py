@@ -1,10 +1,23 @@
-from flask import Blueprint, jsonify, request, current_app
+from flask import Blueprint, Response, jsonify, request, current_app, session
 from functools import wraps
 import sqlite3
 import json
 from datetime import datetime
-from utils.database import get_db_connection, execute_query, execute_update
+from utils.database import get_db_connection, execute_update
 from utils.security import log_security_event
+from utils import storage
+from utils import backends
+from utils import shards
+from utils import queries
+from utils.writer import get_writer
+from utils import catalog_sync
+from utils import pos_client
+from utils import outbox
+from utils import eventos
+from utils import reconciliacion
+from utils import busqueda
+from utils import codigos
+from utils.serializer import query_response, named_response, named_json, json_response, wrap, requested_format
 
 api = Blueprint('api', __name__, url_prefix='/api')
 
@@ -19,36 +32,203 @@ def require_api_key(f):
         return f(*args, **kwargs)
     return decorated_function
 
+def require_api_key_o_sesion(f):
+    """Como require_api_key, pero también acepta la sesión del admin (páginas del navegador)"""
+    con_api_key = require_api_key(f)
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        if 'user_id' in session:
+            return f(*args, **kwargs)
+        return con_api_key(*args, **kwargs)
+    return decorated_function
+
 @api.route('/productos', methods=['GET'])
 @require_api_key
 def get_productos():
-    """Obtiene lista de productos para el POS"""
+    """Obtiene lista de productos para el POS (?formato=columnar para columnas + filas)
+
+    Lleva ETag: con If-None-Match de la versión vigente responde 304 sin
+    recorrer el catálogo.
+    """
     try:
-        query = """
-        SELECT 
-            p.id_producto,
-            p.codigo,
-            p.nombre,
-            m.nombre as marca,
-            p.precio_venta,
-            p.stock,
-            p.es_pesable,
-            p.unidad_medida,
-            c.nombre as categoria_nombre
-        FROM productos p
-        LEFT JOIN categorias c ON p.categoria_id = c.id_categoria
-        LEFT JOIN marcas m ON p.marca_id = m.id_marca
-        WHERE p.activo = 1 AND p.eliminado = 0
-        ORDER BY p.nombre
-        """
+        formato = requested_format()
+        with get_db_connection() as conn:
+            return catalog_sync.respuesta_lista(
+                conn, ('productos.api', formato),
+                lambda: wrap(named_json(conn, 'productos.api', (), formato), {
+                    'success': True,
+                    'timestamp': datetime.now().isoformat()
+                }))
         
-        productos = execute_query(query)
+    except Exception as e:
+        log_security_event('API_ERROR', request.remote_addr, str(e))
+        return jsonify({'error': 'Error interno del servidor'}), 500
+
+def _parametros_feed(args):
+    """since y limite del feed incremental; ValueError si no son enteros"""
+    since = int(args.get('since', 0))
+    limite = int(args.get('limite', catalog_sync.FEED_LIMIT))
+    return since, max(1, min(limite, catalog_sync.FEED_LIMIT))
+
+@api.route('/productos/cambios', methods=['GET'])
+@require_api_key
+def get_productos_cambios():
+    """Feed incremental: productos cambiados desde el cursor ?since= y el cursor siguiente"""
+    try:
+        since, limite = _parametros_feed(request.args)
+    except ValueError:
+        return jsonify({'error': 'since y limite deben ser enteros'}), 400
+    try:
+        with get_db_connection() as conn:
+            data = catalog_sync.feed(conn, since, limite)
+        data.update(success=True, timestamp=datetime.now().isoformat())
+        return json_response(data)
         
-        return jsonify({
+    except Exception as e:
+        log_security_event('API_ERROR', request.remote_addr, str(e))
+        return jsonify({'error': 'Error interno del servidor'}), 500
+
+@api.route('/eventos', methods=['GET'])
+@require_api_key
+def get_eventos():
+    """Server-sent events con los cambios del catálogo (en vez de esperar al push periódico)
+
+    El POS indica su cursor con Last-Event-ID (reconexión) o ?since=; cada
+    evento 'catalogo' trae la página del feed desde ese cursor, o resync=true
+    si tiene que completarla con /api/productos/cambios.
+    """
+    ultimo = request.headers.get('Last-Event-ID') or request.args.get('since')
+    try:
+        ultimo = int(ultimo) if ultimo is not None else None
+    except ValueError:
+        return jsonify({'error': 'since debe ser entero'}), 400
+    try:
+        stream = current_app.extensions['catalog_events'].subscribe(ultimo)
+    except eventos.TooManySubscribersError as e:
+        return jsonify({'error': str(e)}), 503, {'Retry-After': '30'}
+    # Generador sin contexto del request: no retiene la conexión a la base
+    return Response(stream, mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@api.route('/eventos/estado', methods=['GET'])
+@require_api_key
+def get_eventos_estado():
+    """Versión publicada y suscripciones abiertas del canal de eventos"""
+    return jsonify({
+        'success': True,
+        'data': current_app.extensions['catalog_events'].stats(),
+        'timestamp': datetime.now().isoformat()
+    })
+
+@api.route('/reconciliacion', methods=['GET', 'POST'])
+@require_api_key
+def reconciliacion_catalogo():
+    """Detecta y repara diferencias entre el catálogo del POS y el del admin por buckets de hashes
+
+    GET devuelve la raíz y los hashes de los grupos (?grupo=N: los buckets de
+    ese grupo) para comparar del lado del POS; POST recibe los hashes del POS
+    (raiz, grupos o buckets) y responde lo que difiere, con los productos de
+    los buckets a reemplazar.
+    """
+    tree = current_app.extensions['catalog_tree']
+    try:
+        with get_db_connection() as conn:
+            if request.method == 'GET':
+                tree.actualizar(conn)
+                data = tree.resumen()
+                grupo = request.args.get('grupo', type=int)
+                if grupo is None:
+                    data['grupos'] = tree.grupo_hashes()
+                elif 0 <= grupo < tree.buckets // tree.grupo:
+                    data['buckets_grupo'] = tree.bucket_hashes(grupo)
+                else:
+                    return jsonify({'error': 'Grupo fuera de rango'}), 400
+            else:
+                pedido = request.get_json(silent=True)
+                if not isinstance(pedido, dict):
+                    return jsonify({'error': 'Se espera un objeto JSON'}), 400
+                data = reconciliacion.reconciliar(conn, tree, pedido,
+                                                  current_app.config.get('RECONCILE_MAX_PRODUCTOS',
+                                                                         reconciliacion.MAX_PRODUCTOS))
+        data.update(success=True, timestamp=datetime.now().isoformat())
+        return json_response(data)
+        
+    except reconciliacion.ProtocolError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        log_security_event('API_ERROR', request.remote_addr, str(e))
+        return jsonify({'error': 'Error interno del servidor'}), 500
+
+@api.route('/productos/search', methods=['GET'])
+@require_api_key_o_sesion
+def buscar_productos():
+    """Busca productos por nombre, código, marca, subcategoría o versión
+
+    ?q=texto&limite=20&pagina=1&con_stock=1. Cada palabra se toma como
+    prefijo y los resultados vienen ordenados por relevancia, con mas=true
+    si hay otra página. Lo usa el selector de productos de los formularios
+    del admin mientras se escribe: las respuestas se cachean unos segundos.
+    """
+    texto = request.args.get('q', '')
+    limite = request.args.get('limite', busqueda.LIMITE, type=int)
+    pagina = request.args.get('pagina', 1, type=int)
+    con_stock = request.args.get('con_stock', '0') in ('1', 'true')
+    try:
+        with get_db_connection() as conn:
+            resultado = busqueda.buscar(conn, texto, limite, pagina, con_stock)
+        ttl = current_app.config.get('SEARCH_BROWSER_TTL', 5)
+        return json_response({
             'success': True,
-            'data': productos,
+            'q': texto,
+            'data': resultado['productos'],
+            'pagina': resultado['pagina'],
+            'mas': resultado['mas'],
             'timestamp': datetime.now().isoformat()
-        })
+        }, headers={'Cache-Control': f'private, max-age={ttl}'})
+        
+    except Exception as e:
+        log_security_event('API_ERROR', request.remote_addr, str(e))
+        return jsonify({'error': 'Error interno del servidor'}), 500
+
+def _codigos_del_pedido(args, data):
+    """Lista de códigos de ?codigos=c1,c2 o de {"codigos": [...]}"""
+    if data is not None:
+        lista = data.get('codigos') if isinstance(data, dict) else None
+    else:
+        lista = [c for c in args.get('codigos', '').split(',') if c]
+    return [str(c) for c in lista] if isinstance(lista, list) else None
+
+def _validar_codigos(lista):
+    if not lista:
+        return 'Se espera una lista de codigos'
+    if len(lista) > codigos.MAX_LOTE:
+        return f'Máximo {codigos.MAX_LOTE} códigos por pedido'
+    return None
+
+def _respuesta_codigos(encontrados):
+    return {
+        'success': True,
+        'data': {codigo: producto for codigo, producto in encontrados.items() if producto is not None},
+        'no_encontrados': [codigo for codigo, producto in encontrados.items() if producto is None],
+        'timestamp': datetime.now().isoformat()
+    }
+
+@api.route('/productos/codigos', methods=['GET', 'POST'])
+@require_api_key
+def get_productos_by_codes():
+    """Obtiene varios productos por código en una sola llamada
+
+    GET ?codigos=c1,c2,... o POST {"codigos": [...]}, hasta MAX_LOTE
+    códigos. data lleva cada código encontrado con su producto y
+    no_encontrados, el resto. Pensado para los POS que juntan escaneos.
+    """
+    data = (request.get_json(silent=True) or {}) if request.method == 'POST' else None
+    lista = _codigos_del_pedido(request.args, data)
+    error = _validar_codigos(lista)
+    if error:
+        return jsonify({'error': error}), 400
+    try:
+        return json_response(_respuesta_codigos(codigos.productos(lista)))
         
     except Exception as e:
         log_security_event('API_ERROR', request.remote_addr, str(e))
@@ -57,33 +237,16 @@ def get_productos():
 @api.route('/productos/<codigo>', methods=['GET'])
 @require_api_key
 def get_producto_by_code(codigo):
-    """Obtiene un producto específico por código"""
+    """Obtiene un producto específico por código (índice en memoria, ver utils.codigos)"""
     try:
-        query = """
-        SELECT 
-            p.id_producto,
-            p.codigo,
-            p.nombre,
-            m.nombre as marca,
-            p.precio_venta,
-            p.stock,
-            p.es_pesable,
-            p.unidad_medida,
-            c.nombre as categoria_nombre
-        FROM productos p
-        LEFT JOIN categorias c ON p.categoria_id = c.id_categoria
-        LEFT JOIN marcas m ON p.marca_id = m.id_marca
-        WHERE p.codigo = ? AND p.activo = 1 AND p.eliminado = 0
-        """
-        
-        productos = execute_query(query, (codigo,))
+        producto = codigos.producto(codigo)
         
-        if not productos:
+        if producto is None:
             return jsonify({'error': 'Producto no encontrado'}), 404
         
-        return jsonify({
+        return json_response({
             'success': True,
-            'data': productos[0],
+            'data': producto,
             'timestamp': datetime.now().isoformat()
         })
         
@@ -96,14 +259,11 @@ def get_producto_by_code(codigo):
 def get_categorias():
     """Obtiene lista de categorías"""
     try:
-        query = "SELECT id_categoria, nombre, es_pesable FROM categorias ORDER BY nombre"
-        categorias = execute_query(query)
-        
-        return jsonify({
-            'success': True,
-            'data': categorias,
-            'timestamp': datetime.now().isoformat()
-        })
+        with get_db_connection() as conn:
+            return named_response(conn, 'categorias.api', envelope={
+                'success': True,
+                'timestamp': datetime.now().isoformat()
+            })
         
     except Exception as e:
         log_security_event('API_ERROR', request.remote_addr, str(e))
@@ -119,18 +279,80 @@ def get_clientes():
         FROM clientes 
         ORDER BY nombre
         """
-        clientes = execute_query(query)
-        
-        return jsonify({
-            'success': True,
-            'data': clientes,
-            'timestamp': datetime.now().isoformat()
-        })
+        with get_db_connection() as conn:
+            return query_response(conn, query, envelope={
+                'success': True,
+                'timestamp': datetime.now().isoformat()
+            })
         
     except Exception as e:
         log_security_event('API_ERROR', request.remote_addr, str(e))
         return jsonify({'error': 'Error interno del servidor'}), 500
 
+def _validar_venta(data):
+    """Retorna el mensaje de error de una venta del POS, o None si es válida"""
+    if not data:
+        return 'Datos requeridos'
+    
+    # Validar datos mínimos
+    required_fields = ['fecha_venta', 'productos', 'total_venta']
+    for field in required_fields:
+        if field not in data:
+            return f'Campo requerido: {field}'
+    return None
+
+def _insertar_venta(conn, data):
+    """Trabajo del escritor: inserta la venta del POS y sus detalles; retorna id_venta"""
+    cursor = conn.cursor()
+    
+    # Insertar venta principal
+    cursor.execute("""
+        INSERT INTO ventas (id_cliente, fecha_venta, total_venta, metodo_pago, origen_venta)
+        VALUES (?, ?, ?, ?, ?)
+    """, (
+        data.get('id_cliente'),
+        data['fecha_venta'],
+        data['total_venta'],
+        data.get('metodo_pago', 'Efectivo'),
+        'pos'
+    ))
+    
+    id_venta = cursor.lastrowid
+    
+    # Insertar detalles de venta
+    cursor.executemany("""
+        INSERT INTO ventas_detalles (id_venta, id_producto, cantidad, precio_unitario, subtotal)
+        VALUES (?, ?, ?, ?, ?)
+    """, [(
+        id_venta,
+        producto['id_producto'],
+        producto['cantidad'],
+        producto['precio_unitario'],
+        producto['subtotal']
+    ) for producto in data['productos']])
+    
+    return id_venta
+
+def _estado_sync(conn):
+    """Estadísticas básicas de sincronización con el POS"""
+    cursor = conn.cursor()
+    
+    cursor.execute("SELECT COUNT(*) FROM productos WHERE activo = 1 AND eliminado = 0")
+    total_productos = cursor.fetchone()[0]
+    
+    cursor.execute("SELECT COUNT(*) FROM ventas WHERE origen_venta = 'pos'")
+    ventas_pos = cursor.fetchone()[0]
+    
+    cursor.execute("SELECT MAX(fecha_registro) FROM ventas WHERE origen_venta = 'pos'")
+    ultima_venta = cursor.fetchone()[0]
+    
+    return {
+        'total_productos': total_productos,
+        'ventas_pos': ventas_pos,
+        'ultima_venta': ultima_venta,
+        'servidor_activo': True
+    }
+
 @api.route('/ventas', methods=['POST'])
 @require_api_key
 def recibir_venta():
@@ -138,47 +360,15 @@ def recibir_venta():
     try:
         data = request.get_json()
         
-        if not data:
-            return jsonify({'error': 'Datos requeridos'}), 400
+        error = _validar_venta(data)
+        if error:
+            return jsonify({'error': error}), 400
         
-        # Validar datos mínimos
-        required_fields = ['fecha_venta', 'productos', 'total_venta']
-        for field in required_fields:
-            if field not in data:
-                return jsonify({'error': f'Campo requerido: {field}'}), 400
-        
-        # Insertar venta
-        with get_db_connection() as conn:
-            cursor = conn.cursor()
-            
-            # Insertar venta principal
-            cursor.execute("""
-                INSERT INTO ventas (id_cliente, fecha_venta, total_venta, metodo_pago, origen_venta)
-                VALUES (?, ?, ?, ?, ?)
-            """, (
-                data.get('id_cliente'),
-                data['fecha_venta'],
-                data['total_venta'],
-                data.get('metodo_pago', 'Efectivo'),
-                'pos'
-            ))
-            
-            id_venta = cursor.lastrowid
-            
-            # Insertar detalles de venta
-            for producto in data['productos']:
-                cursor.execute("""
-                    INSERT INTO ventas_detalles (id_venta, id_producto, cantidad, precio_unitario, subtotal)
-                    VALUES (?, ?, ?, ?, ?)
-                """, (
-                    id_venta,
-                    producto['id_producto'],
-                    producto['cantidad'],
-                    producto['precio_unitario'],
-                    producto['subtotal']
-                ))
-            
-            conn.commit()
+        try:
+            writer = _writer_de_ventas(request.headers, data)
+        except shards.UnknownShardError as e:
+            return jsonify({'error': str(e)}), 400
+        id_venta = writer.run(_insertar_venta, data)
         
         log_security_event('VENTA_RECIBIDA', request.remote_addr, f"Venta ID: {id_venta}")
         
@@ -199,26 +389,11 @@ def sync_status():
     """Obtiene estado de sincronización"""
     try:
         with get_db_connection() as conn:
-            cursor = conn.cursor()
-            
-            # Obtener estadísticas básicas
-            cursor.execute("SELECT COUNT(*) FROM productos WHERE activo = 1 AND eliminado = 0")
-            total_productos = cursor.fetchone()[0]
-            
-            cursor.execute("SELECT COUNT(*) FROM ventas WHERE origen_venta = 'pos'")
-            ventas_pos = cursor.fetchone()[0]
-            
-            cursor.execute("SELECT MAX(fecha_registro) FROM ventas WHERE origen_venta = 'pos'")
-            ultima_venta = cursor.fetchone()[0]
+            estado = _estado_sync(conn)
         
         return jsonify({
             'success': True,
-            'data': {
-                'total_productos': total_productos,
-                'ventas_pos': ventas_pos,
-                'ultima_venta': ultima_venta,
-                'servidor_activo': True
-            },
+            'data': estado,
             'timestamp': datetime.now().isoformat()
         })
         
@@ -226,6 +401,30 @@ def sync_status():
         log_security_event('API_ERROR', request.remote_addr, str(e))
         return jsonify({'error': 'Error interno del servidor'}), 500
 
+def _get_writer():
+    """Escritor único de la base de datos de la app"""
+    return current_app.extensions.get('db_writer') or get_writer(current_app.config['DATABASE_PATH'])
+
+def _writer_de_ventas(headers, data):
+    """Escritor del shard de la tienda que envía la venta (el de la app sin modo por tienda)"""
+    router = current_app.extensions.get('shard_router')
+    if router is None:
+        return _get_writer()
+    return router.writer(shards.tienda_from_headers(headers, data))
+
+def _actualizar_stock(conn, productos):
+    """Trabajo del escritor: fija el stock recibido y retorna filas afectadas"""
+    actualizados = 0
+    for producto in productos:
+        if 'id_producto' in producto and 'stock' in producto:
+            cursor = conn.execute("""
+                UPDATE productos 
+                SET stock = ? 
+                WHERE id_producto = ? AND activo = 1 AND eliminado = 0
+            """, (producto['stock'], producto['id_producto']))
+            actualizados += cursor.rowcount
+    return actualizados
+
 @api.route('/productos/stock', methods=['POST'])
 @require_api_key
 def actualizar_stock():
@@ -236,21 +435,8 @@ def actualizar_stock():
         if not data or 'productos' not in data:
             return jsonify({'error': 'Datos requeridos'}), 400
         
-        actualizados = 0
-        
-        with get_db_connection() as conn:
-            cursor = conn.cursor()
-            
-            for producto in data['productos']:
-                if 'id_producto' in producto and 'stock' in producto:
-                    cursor.execute("""
-                        UPDATE productos 
-                        SET stock = ? 
-                        WHERE id_producto = ? AND activo = 1 AND eliminado = 0
-                    """, (producto['stock'], producto['id_producto']))
-                    actualizados += cursor.rowcount
-            
-            conn.commit()
+        actualizados = _get_writer().run(_actualizar_stock, data['productos'])
+        codigos.notificar(p['id_producto'] for p in data['productos'] if 'id_producto' in p)
         
         return jsonify({
             'success': True,
@@ -263,6 +449,137 @@ def actualizar_stock():
         log_security_event('API_ERROR', request.remote_addr, str(e))
         return jsonify({'error': 'Error interno del servidor'}), 500
 
+@api.route('/db/pool', methods=['GET'])
+@require_api_key
+def db_pool_stats():
+    """Estadísticas del pool de conexiones para monitoreo"""
+    pool = current_app.extensions.get('db_pool')
+    if pool is None:
+        return jsonify({'error': 'Pool no inicializado'}), 503
+    
+    return jsonify({
+        'success': True,
+        'data': pool.stats(),
+        'timestamp': datetime.now().isoformat()
+    })
+
+@api.route('/db/writer', methods=['GET'])
+@require_api_key
+def db_writer_stats():
+    """Estadísticas del escritor único (cola, tamaño de grupo, commits)"""
+    return jsonify({
+        'success': True,
+        'data': _get_writer().stats(),
+        'timestamp': datetime.now().isoformat()
+    })
+
+@api.route('/db/codigos', methods=['GET'])
+@require_api_key
+def db_codigos_stats():
+    """Índice de códigos en memoria: productos, versión, aciertos y actualizaciones"""
+    return jsonify({
+        'success': True,
+        'data': codigos.stats(),
+        'timestamp': datetime.now().isoformat()
+    })
+
+@api.route('/db/storage', methods=['GET'])
+@require_api_key
+def db_storage_stats():
+    """Estado del WAL: tamaño, lag de checkpoint y reintentos por bloqueo"""
+    db_path = current_app.config['DATABASE_PATH']
+    checkpointer = current_app.extensions.get('wal_checkpointer')
+    pool = current_app.extensions.get('db_pool')
+    
+    with get_db_connection() as conn:
+        if backends.dialect(conn) != backends.SQLITE:
+            return jsonify({'error': 'Solo disponible con el backend SQLite'}), 400
+        journal_mode = conn.execute("PRAGMA journal_mode").fetchone()[0]
+    
+    data = checkpointer.stats() if checkpointer else {'wal_bytes': storage.wal_size(db_path)}
+    data['journal_mode'] = journal_mode
+    if pool is not None:
+        data.update(pool.retry_policy.stats())
+        data['pool_waits'] = pool.stats()['waits']
+    
+    return jsonify({
+        'success': True,
+        'data': data,
+        'timestamp': datetime.now().isoformat()
+    })
+
+@api.route('/db/shards', methods=['GET'])
+@require_api_key
+def db_shards_stats():
+    """Tiendas con archivo propio y tiempos de los reportes repartidos"""
+    router = shards.get_router()
+    if router is None:
+        return jsonify({'error': 'Modo por tienda desactivado'}), 404
+    
+    return jsonify({
+        'success': True,
+        'data': router.stats(),
+        'timestamp': datetime.now().isoformat()
+    })
+
+@api.route('/sync/outbox', methods=['GET'])
+@require_api_key
+def sync_outbox_status():
+    """Pendientes del outbox por POS, lotes en dead letter y últimas entregas"""
+    try:
+        with get_db_connection() as conn:
+            if backends.dialect(conn) != backends.SQLITE:
+                return jsonify({'error': 'Solo disponible con el backend SQLite'}), 400
+            data = outbox.estado(conn)
+        return jsonify({
+            'success': True,
+            'data': data,
+            'timestamp': datetime.now().isoformat()
+        })
+        
+    except Exception as e:
+        log_security_event('API_ERROR', request.remote_addr, str(e))
+        return jsonify({'error': 'Error interno del servidor'}), 500
+
+@api.route('/sync/outbox/fallidos/<int:id_fallido>/reintentar', methods=['POST'])
+@require_api_key
+def sync_outbox_reintentar(id_fallido):
+    """Reenvía un lote en dead letter en la próxima entrega"""
+    try:
+        if not _get_writer().run(outbox.reintentar_fallido, id_fallido):
+            return jsonify({'error': 'Lote no encontrado o ya reintentado'}), 404
+        return jsonify({
+            'success': True,
+            'message': 'Lote reencolado',
+            'timestamp': datetime.now().isoformat()
+        })
+        
+    except Exception as e:
+        log_security_event('API_ERROR', request.remote_addr, str(e))
+        return jsonify({'error': 'Error interno del servidor'}), 500
+
+@api.route('/pos/http', methods=['GET'])
+@require_api_key
+def pos_http_stats():
+    """Clientes HTTP de los POS: llamadas, reintentos y estado del circuito"""
+    return jsonify({
+        'success': True,
+        'data': pos_client.stats(),
+        'timestamp': datetime.now().isoformat()
+    })
+
+@api.route('/db/queries', methods=['GET'])
+@require_api_key
+def db_queries_stats():
+    """Contadores de las consultas del registro (llamadas, filas, tiempos)"""
+    pool = current_app.extensions.get('db_pool')
+    return jsonify({
+        'success': True,
+        'data': queries.stats(),
+        'cached_statements': getattr(pool, 'cached_statements', None),
+        'timestamp': datetime.now().isoformat()
+    })
+
 @api.errorhandler(404)
 def not_found(error):
     return jsonify({'error': 'Endpoint no encontrado'}), 404
@@ -1,5 +1,5 @@
 from flask import Flask, render_template, request, redirect, url_for, flash, jsonify, send_file, session
-import sqlite3
+from flask import Response, stream_with_context
 import os
 import random
 import json
@@ -17,6 +17,23 @@ import barcode
 from barcode.writer import ImageWriter
 from functools import wraps
 from config import config
+from utils import backends
+from utils import shards
+from utils import query_log
+from utils import queries
+from utils import serializer
+from utils import pos_sync
+from utils import pos_client
+from utils import outbox
+from utils import eventos
+from utils import reconciliacion
+from utils import taxonomia
+from utils import listado
+from utils import busqueda
+from utils import codigos
+from utils import catalog_sync
+from utils import compression
+from utils import ingest
 import requests
 import threading
 import time
@@ -27,6 +44,30 @@ app.config.from_object(config['production'] if os.environ.get('FLASK_ENV') == 'p
 
 DB_PATH = app.config['DATABASE_PATH']
 
+# Backend de datos (DB_BACKEND): SQLite con pool, WAL, migraciones y escritor
+# único, o PostgreSQL con pool y escrituras concurrentes
+backends.init_app(app)
+# Registro de consultas lentas con EXPLAIN QUERY PLAN
+query_log.init_app(app)
+# Modo por tienda (SHARDING=1): ventas de cada POS en su propio archivo
+shards.init_app(app)
+# Compresión gzip/zstd de la API negociada por cabeceras
+compression.init_app(app)
+# Clientes HTTP de los POS: keep-alive, reintentos con backoff y circuit breaker
+pos_client.init_app(app)
+# Outbox de cambios del catálogo para los POS (acks, reintentos y dead letter)
+outbox.init_app(app)
+# Canal SSE de cambios del catálogo para los POS suscriptos
+eventos.init_app(app)
+# Árbol de hashes del catálogo para reconciliar con los POS
+reconciliacion.init_app(app)
+# Caché de categorías/subcategorías/marcas/versiones (se invalida al escribir)
+taxonomia.init_app(app)
+# Caché de búsquedas de productos (selectores de ventas, lotes y códigos)
+busqueda.init_app(app)
+# Índice en memoria de códigos de barras para los escaneos de los POS
+codigos.init_app(app)
+
 # Filtro personalizado para formatear fechas
 @app.template_filter('datetime')
 def format_datetime(value):
@@ -79,15 +120,30 @@ def verify_user(username, password):
 
 def update_last_login(user_id):
     """Actualiza la fecha del último login"""
-    conn = get_db_connection()
-    conn.execute("UPDATE usuarios SET ultimo_login = CURRENT_TIMESTAMP WHERE id_usuario = ?", (user_id,))
-    conn.commit()
-    conn.close()
+    run_write(_ejecutar, "UPDATE usuarios SET ultimo_login = CURRENT_TIMESTAMP WHERE id_usuario = ?", (user_id,))
 
 def get_db_connection():
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
-    return conn
+    """Conexión del backend; dentro de un request se reutiliza hasta el teardown"""
+    return app.extensions['db_backend'].get_connection()
+
+def get_venta_connection(id_venta):
+    """Conexión a la base que guarda la venta (su tienda en modo por tienda)"""
+    router = shards.get_router()
+    if router is None:
+        return get_db_connection()
+    return router.connection_for_id(id_venta)
+
+def run_write(fn, *args):
+    """Ejecuta fn(conn, *args) en el hilo escritor y espera el commit"""
+    return app.extensions['db_writer'].run(fn, *args)
+
+def submit_write(fn, *args):
+    """Encola fn(conn, *args) en el hilo escritor y retorna el Future"""
+    return app.extensions['db_writer'].submit(fn, *args)
+
+def _ejecutar(conn, sql, params=()):
+    """Trabajo de una sola sentencia para run_write; retorna el lastrowid"""
+    return conn.execute(sql, params).lastrowid
 
 # -------------------
 # FUNCIONES DE SINCRONIZACIÓN
@@ -133,67 +189,11 @@ def generar_codigo():
     conn.close()
 
 def sync_with_pos_clients():
-    """Sincroniza datos con clientes POS"""
+    """Sincroniza datos con clientes POS: entrega el outbox de cambios a cada uno"""
     try:
-        conn = get_db_connection()
-        
-        # Obtener productos activos para sincronizar
-        productos = conn.execute("""
-            SELECT 
-                id_producto, codigo, nombre, precio_venta, stock, 
-                categoria_id, subcategoria_id, marca_id, version_id,
-                es_pesable, unidad_medida, activo
-            FROM productos 
-            WHERE activo = 1 AND eliminado = 0
-        """).fetchall()
-        
-        # Obtener clientes POS registrados
-        clientes_pos = conn.execute("SELECT * FROM clientes_pos WHERE activo = 1").fetchall()
-        
-        sync_data = {
-            'productos': [dict(p) for p in productos],
-            'timestamp': datetime.now().isoformat(),
-            'version': '1.0.0'
-        }
-        
-        # Enviar datos a cada cliente POS
-        for cliente in clientes_pos:
-            try:
-                response = requests.post(
-                    f"{cliente['url']}/api/sync",
-                    json=sync_data,
-                    headers={'Content-Type': 'application/json'},
-                    timeout=10
-                )
-                
-                if response.status_code == 200:
-                    # Actualizar estado de sincronización
-                    conn.execute("""
-                        UPDATE clientes_pos 
-                        SET ultima_sincronizacion = CURRENT_TIMESTAMP, 
-                            estado = 'conectado'
-                        WHERE id_cliente = ?
-                    """, (cliente['id_cliente'],))
-                else:
-                    conn.execute("""
-                        UPDATE clientes_pos 
-                        SET estado = 'error',
-                            ultimo_error = ?
-                        WHERE id_cliente = ?
-                    """, (f"HTTP {response.status_code}", cliente['id_cliente']))
-                    
-            except Exception as e:
-                conn.execute("""
-                    UPDATE clientes_pos 
-                    SET estado = 'desconectado',
-                        ultimo_error = ?
-                    WHERE id_cliente = ?
-                """, (str(e), cliente['id_cliente']))
-        
-        conn.commit()
-        conn.close()
-        
-        return True
+        # Un lote por POS y ciclo; se repite mientras alguno tenga más pendiente
+        resumenes = app.extensions['sync_outbox'].drain()
+        return not any(r['fallidos'] for r in resumenes)
         
     except Exception as e:
         print(f"Error en sincronización: {e}")
@@ -305,97 +305,45 @@ def dashboard():
 def admin():
     conn = get_db_connection()
     
-    # Obtener filtros de la URL
-    filtro_categoria = request.args.get('filtro_categoria', '')
-    filtro_subcategoria = request.args.get('filtro_subcategoria', '')
-    filtro_marca = request.args.get('filtro_marca', '')
-    filtro_version = request.args.get('filtro_version', '')
-    filtro_pesable = request.args.get('filtro_pesable', '')
-    
-    # Construir la consulta base
-    query = """
-        SELECT 
-            p.id_producto,
-            p.codigo,
-            p.nombre,
-            c.nombre AS categoria,
-            s.nombre AS subcategoria,
-            m.nombre AS marca_nombre,
-            v.nombre AS version_nombre,
-            p.precio_compra,
-            p.precio_venta,
-            p.stock,
-            p.es_pesable,
-            p.unidad_medida,
-            p.ultima_sincronizacion
-        FROM productos p
-        LEFT JOIN categorias c ON p.categoria_id = c.id_categoria
-        LEFT JOIN subcategorias s ON p.subcategoria_id = s.id_subcategoria
-        LEFT JOIN marcas m ON p.marca_id = m.id_marca
-        LEFT JOIN versiones v ON p.version_id = v.id_version
-        WHERE p.activo = 1 AND p.eliminado = 0
-    """
-    
-    params = []
+    # Solo la primera página: el resto lo pide la tabla a /admin/productos
+    filtros = listado.filtros_de(request.args)
+    orden, sentido = listado.orden_de(request.args)
+    pagina = listado.pagina(conn, filtros, orden, sentido, limite=listado.limite_de(request.args))
     
-    # Agregar filtros si están presentes
-    if filtro_categoria:
-        query += " AND p.categoria_id = ?"
-        params.append(filtro_categoria)
-    
-    if filtro_subcategoria:
-        query += " AND p.subcategoria_id = ?"
-        params.append(filtro_subcategoria)
-    
-    if filtro_marca:
-        query += " AND p.marca_id = ?"
-        params.append(filtro_marca)
-    
-    if filtro_version:
-        query += " AND p.version_id = ?"
-        params.append(filtro_version)
-    
-    if filtro_pesable:
-        if filtro_pesable == 'si':
-            query += " AND p.es_pesable = 1"
-        elif filtro_pesable == 'no':
-            query += " AND p.es_pesable = 0"
-    
-    query += " ORDER BY c.nombre, s.nombre, m.nombre, v.nombre, p.nombre"
-    
-    productos = conn.execute(query, params).fetchall()
-    
-    # Obtener datos para los filtros
-    categorias = conn.execute("SELECT * FROM categorias ORDER BY nombre").fetchall()
-    subcategorias = conn.execute("SELECT * FROM subcategorias ORDER BY nombre").fetchall()
-    marcas = conn.execute("SELECT * FROM marcas ORDER BY nombre").fetchall()
-    versiones = conn.execute("SELECT * FROM versiones ORDER BY nombre").fetchall()
-    
-    # Convertir a diccionarios para JSON
-    subcategorias_data = [dict(row) for row in subcategorias]
-    marcas_data = [dict(row) for row in marcas]
-    versiones_data = [dict(row) for row in versiones]
-    
-    # Datos de filtros actuales
-    filtros = {
-        'categoria_id': filtro_categoria,
-        'subcategoria_id': filtro_subcategoria,
-        'marca_id': filtro_marca,
-        'version_id': filtro_version,
-        'pesable': filtro_pesable
-    }
+    # Categorías completas; de los demás niveles solo los hijos del filtro
+    # elegido (al cambiar un filtro el formulario los pide a /api/...)
+    categorias = taxonomia.filas(conn, 'categorias')
+    subcategorias = taxonomia.hijos(conn, 'subcategorias', filtros['categoria_id']) if filtros['categoria_id'] else []
+    marcas = taxonomia.hijos(conn, 'marcas', filtros['subcategoria_id']) if filtros['subcategoria_id'] else []
+    versiones = taxonomia.hijos(conn, 'versiones', filtros['marca_id']) if filtros['marca_id'] else []
     
     conn.close()
     return render_template("admin.html", 
-                         productos=productos,
+                         productos=pagina['productos'],
+                         cursor=pagina['cursor'],
                          categorias=categorias,
                          subcategorias=subcategorias,
                          marcas=marcas,
                          versiones=versiones,
-                         subcategorias_data=subcategorias_data,
-                         marcas_data=marcas_data,
-                         versiones_data=versiones_data,
-                         filtros=filtros)
+                         filtros=dict(filtros, pesable=request.args.get('filtro_pesable', '')),
+                         orden=orden,
+                         sentido=sentido,
+                         ordenes=list(queries.ADMIN_ORDENES))
+
+@app.route("/admin/productos")
+@login_required
+def admin_productos():
+    """Páginas siguientes del listado del admin (mismos parámetros que /admin más ?cursor=)"""
+    conn = get_db_connection()
+    try:
+        orden, sentido = listado.orden_de(request.args)
+        pagina = listado.pagina(conn, listado.filtros_de(request.args), orden, sentido,
+                                request.args.get('cursor') or None, listado.limite_de(request.args))
+    except listado.CursorInvalido as e:
+        return jsonify({"error": str(e)}), 400
+    finally:
+        conn.close()
+    return serializer.json_response(pagina)
 
 # -------------------
 # NUEVO PRODUCTO
@@ -427,7 +375,7 @@ def nuevo_producto():
                 return redirect(url_for("nuevo_producto"))
             
             # Insertar producto
-            conn.execute("""
+            run_write(_ejecutar, """
                 INSERT INTO productos (
                     codigo, nombre, categoria_id, subcategoria_id, marca_id, version_id,
                     precio_compra, precio_venta, stock, es_pesable, unidad_medida,
@@ -435,9 +383,8 @@ def nuevo_producto():
                 ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, 1, CURRENT_TIMESTAMP)
             """, (codigo, nombre, categoria_id, subcategoria_id, marca_id, version_id,
                   precio_compra, precio_venta, stock, es_pesable, unidad_medida))
-            
-            conn.commit()
             conn.close()
+            codigos.notificar()
             
             flash("Producto creado exitosamente", "success")
             return redirect(url_for("admin"))
@@ -447,10 +394,10 @@ def nuevo_producto():
             return redirect(url_for("nuevo_producto"))
     
     conn = get_db_connection()
-    categorias = conn.execute("SELECT * FROM categorias ORDER BY nombre").fetchall()
-    subcategorias = conn.execute("SELECT * FROM subcategorias ORDER BY nombre").fetchall()
-    marcas = conn.execute("SELECT * FROM marcas ORDER BY nombre").fetchall()
-    versiones = conn.execute("SELECT * FROM versiones ORDER BY nombre").fetchall()
+    categorias = taxonomia.filas(conn, 'categorias')
+    subcategorias = taxonomia.filas(conn, 'subcategorias')
+    marcas = taxonomia.filas(conn, 'marcas')
+    versiones = taxonomia.filas(conn, 'versiones')
     conn.close()
     
     return render_template("nuevo_producto.html",
@@ -463,6 +410,29 @@ def nuevo_producto():
 # API ROUTES PARA SINCRONIZACIÓN
 # -------------------
 
+def _aplicar_sync_pos(conn, productos_recibidos, ventas_recibidas):
+    """Aplica el stock y las ventas recibidas de un cliente POS"""
+    # Actualizar productos
+    conn.executemany("""
+        UPDATE productos 
+        SET stock = ?, ultima_sincronizacion = CURRENT_TIMESTAMP
+        WHERE codigo = ?
+    """, [(p.get('stock', 0), p.get('codigo')) for p in productos_recibidos])
+    
+    # Registrar ventas del cliente POS
+    if not ventas_recibidas:
+        return
+    conn.executemany("""
+        INSERT INTO ventas_pos (
+            cliente_id, total, fecha_venta, productos_json
+        ) VALUES (?, ?, ?, ?)
+    """, [(
+        venta_data.get('cliente_id'),
+        venta_data.get('total', 0),
+        venta_data.get('fecha_venta'),
+        json.dumps(venta_data.get('productos', []))
+    ) for venta_data in ventas_recibidas])
+
 @app.route("/api/sync", methods=["POST"])
 def api_sync():
     """Endpoint para sincronización con clientes POS"""
@@ -476,31 +446,8 @@ def api_sync():
         productos_recibidos = data.get('productos', [])
         ventas_recibidas = data.get('ventas', [])
         
-        conn = get_db_connection()
-        
-        # Actualizar productos
-        for producto_data in productos_recibidos:
-            conn.execute("""
-                UPDATE productos 
-                SET stock = ?, ultima_sincronizacion = CURRENT_TIMESTAMP
-                WHERE codigo = ?
-            """, (producto_data.get('stock', 0), producto_data.get('codigo')))
-        
-        # Registrar ventas del cliente POS
-        for venta_data in ventas_recibidas:
-            conn.execute("""
-                INSERT INTO ventas_pos (
-                    cliente_id, total, fecha_venta, productos_json
-                ) VALUES (?, ?, ?, ?)
-            """, (
-                venta_data.get('cliente_id'),
-                venta_data.get('total', 0),
-                venta_data.get('fecha_venta'),
-                json.dumps(venta_data.get('productos', []))
-            ))
-        
-        conn.commit()
-        conn.close()
+        run_write(_aplicar_sync_pos, productos_recibidos, ventas_recibidas)
+        codigos.notificar()
         
         return jsonify({"status": "success", "message": "Sincronización completada"})
         
@@ -512,27 +459,13 @@ def api_productos():
     """Endpoint para obtener productos activos"""
     try:
         conn = get_db_connection()
-        productos = conn.execute("""
-            SELECT 
-                p.id_producto, p.codigo, p.nombre, p.categoria_id, p.subcategoria_id,
-                p.marca_id, p.version_id, p.precio_compra, p.precio_venta, p.stock,
-                p.es_pesable, p.venta_por_peso, p.unidad_medida, p.activo, p.eliminado, p.fecha_creacion
-            FROM productos p
-            WHERE p.activo = 1 AND p.eliminado = 0
-            ORDER BY p.nombre
-        """).fetchall()
-        
+        # precio duplica precio_venta por compatibilidad con el POS; 304 si no cambió
+        formato = serializer.requested_format()
+        respuesta = catalog_sync.respuesta_lista(
+            conn, ('productos.pos', formato),
+            lambda: serializer.named_json(conn, 'productos.pos', (), formato))
         conn.close()
-        
-        # Convertir a diccionario y mapear precio_venta a precio para compatibilidad con POS
-        productos_dict = []
-        for p in productos:
-            producto_dict = dict(p)
-            # Mapear precio_venta a precio para compatibilidad con POS
-            producto_dict['precio'] = producto_dict.get('precio_venta', 0)
-            productos_dict.append(producto_dict)
-        
-        return jsonify(productos_dict)
+        return respuesta
         
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -544,14 +477,14 @@ def api_categorias():
         conn = get_db_connection()
         
         if request.method == "GET":
-            categorias = conn.execute("""
+            respuesta = serializer.query_response(conn, """
                 SELECT id_categoria, nombre
                 FROM categorias
                 ORDER BY nombre
-            """).fetchall()
+            """)
             
             conn.close()
-            return jsonify([dict(c) for c in categorias])
+            return respuesta
         
         elif request.method == "POST":
             data = request.get_json()
@@ -561,15 +494,15 @@ def api_categorias():
                 return jsonify({"success": False, "message": "El nombre es requerido"}), 400
             
             # Insertar nueva categoría
-            cursor = conn.execute("INSERT INTO categorias (nombre) VALUES (?)", (nombre,))
-            conn.commit()
+            id_categoria = run_write(_ejecutar, "INSERT INTO categorias (nombre) VALUES (?)", (nombre,))
+            taxonomia.invalidar()
             
             # Obtener la categoría creada
             nueva_categoria = conn.execute("""
                 SELECT id_categoria, nombre
                 FROM categorias
                 WHERE id_categoria = ?
-            """, (cursor.lastrowid,)).fetchone()
+            """, (id_categoria,)).fetchone()
             
             conn.close()
             
@@ -608,16 +541,16 @@ def api_subcategorias():
                 return jsonify({"success": False, "message": "El nombre es requerido"}), 400
             
             # Insertar nueva subcategoría
-            cursor = conn.execute("INSERT INTO subcategorias (nombre, categoria_id) VALUES (?, ?)", 
-                                (nombre, categoria_id))
-            conn.commit()
+            id_subcategoria = run_write(_ejecutar, "INSERT INTO subcategorias (nombre, categoria_id) VALUES (?, ?)",
+                                        (nombre, categoria_id))
+            taxonomia.invalidar()
             
             # Obtener la subcategoría creada
             nueva_subcategoria = conn.execute("""
                 SELECT id_subcategoria, nombre, categoria_id
                 FROM subcategorias
                 WHERE id_subcategoria = ?
-            """, (cursor.lastrowid,)).fetchone()
+            """, (id_subcategoria,)).fetchone()
             
             conn.close()
             
@@ -645,12 +578,12 @@ def api_editar_subcategoria(id_subcategoria):
         conn = get_db_connection()
         
         # Actualizar la subcategoría
-        conn.execute("""
+        run_write(_ejecutar, """
             UPDATE subcategorias 
             SET nombre = ?, categoria_id = ?
             WHERE id_subcategoria = ?
         """, (nombre, categoria_id, id_subcategoria))
-        conn.commit()
+        taxonomia.invalidar()
         
         # Obtener la subcategoría actualizada
         subcategoria_actualizada = conn.execute("""
@@ -696,16 +629,16 @@ def api_marcas():
                 return jsonify({"success": False, "message": "El nombre es requerido"}), 400
             
             # Insertar nueva marca
-            cursor = conn.execute("INSERT INTO marcas (nombre, subcategoria_id) VALUES (?, ?)", 
-                                (nombre, subcategoria_id))
-            conn.commit()
+            id_marca = run_write(_ejecutar, "INSERT INTO marcas (nombre, subcategoria_id) VALUES (?, ?)",
+                                 (nombre, subcategoria_id))
+            taxonomia.invalidar()
             
             # Obtener la marca creada
             nueva_marca = conn.execute("""
                 SELECT id_marca, nombre, subcategoria_id
                 FROM marcas
                 WHERE id_marca = ?
-            """, (cursor.lastrowid,)).fetchone()
+            """, (id_marca,)).fetchone()
             
             conn.close()
             
@@ -733,12 +666,12 @@ def api_editar_marca(id_marca):
         conn = get_db_connection()
         
         # Actualizar la marca
-        conn.execute("""
+        run_write(_ejecutar, """
             UPDATE marcas 
             SET nombre = ?, subcategoria_id = ?
             WHERE id_marca = ?
         """, (nombre, subcategoria_id, id_marca))
-        conn.commit()
+        taxonomia.invalidar()
         
         # Obtener la marca actualizada
         marca_actualizada = conn.execute("""
@@ -784,16 +717,16 @@ def api_versiones():
                 return jsonify({"success": False, "message": "El nombre es requerido"}), 400
             
             # Insertar nueva versión
-            cursor = conn.execute("INSERT INTO versiones (nombre, marca_id) VALUES (?, ?)", 
-                                (nombre, marca_id))
-            conn.commit()
+            id_version = run_write(_ejecutar, "INSERT INTO versiones (nombre, marca_id) VALUES (?, ?)",
+                                   (nombre, marca_id))
+            taxonomia.invalidar()
             
             # Obtener la versión creada
             nueva_version = conn.execute("""
                 SELECT id_version, nombre, marca_id
                 FROM versiones
                 WHERE id_version = ?
-            """, (cursor.lastrowid,)).fetchone()
+            """, (id_version,)).fetchone()
             
             conn.close()
             
@@ -812,16 +745,16 @@ def api_clientes():
     """Endpoint para obtener clientes"""
     try:
         conn = get_db_connection()
-        clientes = conn.execute("""
+        respuesta = serializer.query_response(conn, """
             SELECT id_cliente, nombre, telefono, email, direccion, activo
             FROM clientes
             WHERE activo = 1
             ORDER BY nombre
-        """).fetchall()
+        """)
         
         conn.close()
         
-        return jsonify([dict(c) for c in clientes])
+        return respuesta
         
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -848,6 +781,20 @@ def api_health():
             "timestamp": datetime.now().isoformat()
         }), 500
 
+def _writer_de_tienda(tienda):
+    """Escritor de la base que guarda las ventas de la tienda (el de la app sin modo por tienda)"""
+    router = shards.get_router()
+    if router is None:
+        return app.extensions['db_writer']
+    return router.writer(tienda)
+
+def _writer_de_venta(id_venta):
+    """Escritor de la base que guarda la venta (ver get_venta_connection)"""
+    router = shards.get_router()
+    if router is None:
+        return app.extensions['db_writer']
+    return router.writer(router.tienda_for_id(id_venta))
+
 @app.route("/api/ventas/batch", methods=["POST"])
 def api_ventas_batch():
     """Endpoint para recibir ventas en lote desde el POS"""
@@ -859,63 +806,67 @@ def api_ventas_batch():
         # Aceptar tanto formato {"ventas": [...]} como formato directo [...]
         if isinstance(data, list):
             ventas_data = data
-        elif isinstance(data, dict) and 'ventas' in data:
+        elif isinstance(data, dict) and isinstance(data.get('ventas'), list):
             ventas_data = data['ventas']
         else:
             return jsonify({"success": False, "error": "Formato de datos inválido"}), 400
         
+        cabecera = data if isinstance(data, dict) else None
+        tienda = shards.tienda_from_headers(request.headers, cabecera)
         conn = get_db_connection()
-        ventas_recibidas = 0
+        id_cliente_pos = ingest.pos_del_request(conn, request.headers, cabecera)
         
-        for venta_data in ventas_data:
-            try:
-                # Insertar venta principal
-                cursor = conn.execute("""
-                    INSERT INTO ventas (
-                        id_venta, fecha_venta, total, id_usuario, metodo_pago, 
-                        cliente_id, sincronizado, fecha_sincronizacion
-                    ) VALUES (?, ?, ?, ?, ?, ?, 1, CURRENT_TIMESTAMP)
-                """, (
-                    venta_data['id_venta'],
-                    venta_data['fecha_venta'],
-                    venta_data['total'],
-                    venta_data['id_usuario'],
-                    venta_data.get('metodo_pago', 'efectivo'),
-                    venta_data.get('cliente_id')
-                ))
-                
-                # Insertar detalles de la venta
-                for item in venta_data.get('items', []):
-                    conn.execute("""
-                        INSERT INTO detalles_venta (
-                            venta_id, producto_id, cantidad, precio_unitario, subtotal
-                        ) VALUES (?, ?, ?, ?, ?)
-                    """, (
-                        venta_data['id_venta'],
-                        item['id_producto'],
-                        item['cantidad'],
-                        item['precio_unitario'],
-                        item['cantidad'] * item['precio_unitario']
-                    ))
-                
-                ventas_recibidas += 1
-                
-            except Exception as e:
-                print(f"Error procesando venta {venta_data.get('id_venta')}: {e}")
-                continue
-        
-        conn.commit()
-        conn.close()
+        # La validación no necesita al escritor; el lote válido entra en un
+        # solo trabajo (una transacción) y es idempotente por (POS, id_venta)
+        validas, resultados = ingest.validar_lote(conn, ventas_data)
+        if validas:
+            resultados.update(_writer_de_tienda(tienda).run(ingest.ingerir_ventas, id_cliente_pos, validas))
+            codigos.notificar()
         
+        resumen = ingest.respuesta(ventas_data, resultados)
         return jsonify({
             "success": True,
-            "message": f"Procesadas {ventas_recibidas} ventas",
-            "ventas_recibidas": ventas_recibidas
+            "message": f"Procesadas {resumen['ventas_recibidas']} ventas",
+            **resumen
         })
         
+    except (shards.UnknownShardError, ingest.IdentidadPOSError) as e:
+        return jsonify({"success": False, "error": str(e)}), 400
     except Exception as e:
         return jsonify({"success": False, "error": str(e)}), 500
 
+@app.route("/api/ventas/stream", methods=["POST"])
+def api_ventas_stream():
+    """Backlog de ventas del POS en NDJSON (una venta por línea, gzip/zstd opcional)"""
+    if request.mimetype not in compression.STREAM_TYPES:
+        return jsonify({"success": False, "error": "Se espera application/x-ndjson"}), 415
+    try:
+        tienda = shards.tienda_from_headers(request.headers)
+        id_cliente_pos = ingest.pos_del_request(get_db_connection(), request.headers)
+        escribir = _writer_de_tienda(tienda).run
+        cuerpo = compression.open_stream(request.stream, request.headers.get('Content-Encoding'))
+    except (shards.UnknownShardError, ingest.IdentidadPOSError) as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+    except compression.UnsupportedEncodingError:
+        return jsonify({"success": False, "error": "Content-Encoding no soportado"}), 415
+    
+    chunk_size = request.args.get('tanda', app.config.get('INGEST_CHUNK_SIZE', 500), type=int)
+    chunk_size = max(1, min(chunk_size, 5000))
+    max_line = app.config.get('INGEST_MAX_LINE', ingest.MAX_LINE)
+    
+    # Una línea de progreso por tanda confirmada y una final con fin=true
+    def generar():
+        try:
+            conn = get_db_connection()
+            for progreso in ingest.ingerir_ndjson(cuerpo, conn, escribir, id_cliente_pos, chunk_size, max_line):
+                codigos.notificar()
+                yield serializer.dumps(progreso) + b'\n'
+        except Exception as e:
+            # Las tandas ya informadas quedan confirmadas
+            yield serializer.dumps({"fin": True, "error": str(e)}) + b'\n'
+    
+    return Response(stream_with_context(generar()), mimetype='application/x-ndjson')
+
 # -------------------
 # SINCRONIZACIÓN MANUAL
 # -------------------
@@ -952,20 +903,15 @@ def clientes_pos():
 def nuevo_cliente_pos():
     if request.method == "POST":
         try:
-            conn = get_db_connection()
-            
             nombre = request.form.get("nombre")
             url = request.form.get("url")
             descripcion = request.form.get("descripcion", "")
             
-            conn.execute("""
+            run_write(_ejecutar, """
                 INSERT INTO clientes_pos (nombre, url, descripcion, activo, fecha_registro)
                 VALUES (?, ?, ?, 1, CURRENT_TIMESTAMP)
             """, (nombre, url, descripcion))
             
-            conn.commit()
-            conn.close()
-            
             flash("Cliente POS registrado exitosamente", "success")
             return redirect(url_for("clientes_pos"))
             
@@ -994,10 +940,8 @@ def listar_categorias():
 def nueva_categoria():
     if request.method == "POST":
         nombre = request.form["nombre"]
-        conn = get_db_connection()
-        conn.execute("INSERT INTO categorias (nombre) VALUES (?)", (nombre,))
-        conn.commit()
-        conn.close()
+        run_write(_ejecutar, "INSERT INTO categorias (nombre) VALUES (?)", (nombre,))
+        taxonomia.invalidar()
         return redirect(url_for("listar_categorias"))
     return render_template("nueva_categoria.html")
 
@@ -1015,7 +959,7 @@ def listar_subcategorias():
         ORDER BY c.nombre, s.nombre
     """).fetchall()
     
-    categorias = conn.execute("SELECT * FROM categorias ORDER BY nombre").fetchall()
+    categorias = taxonomia.filas(conn, 'categorias')
     conn.close()
     return render_template("subcategorias.html", subcategorias=subcategorias, categorias=categorias)
 
@@ -1023,14 +967,14 @@ def listar_subcategorias():
 @login_required
 def nueva_subcategoria():
     conn = get_db_connection()
-    categorias = conn.execute("SELECT * FROM categorias ORDER BY nombre").fetchall()
+    categorias = taxonomia.filas(conn, 'categorias')
     
     if request.method == "POST":
         nombre = request.form["nombre"]
         categoria_id = request.form.get("categoria_id") or None
         
-        conn.execute("INSERT INTO subcategorias (nombre, categoria_id) VALUES (?, ?)", (nombre, categoria_id))
-        conn.commit()
+        run_write(_ejecutar, "INSERT INTO subcategorias (nombre, categoria_id) VALUES (?, ?)", (nombre, categoria_id))
+        taxonomia.invalidar()
         conn.close()
         flash("Subcategoría creada correctamente", "success")
         return redirect(url_for("listar_subcategorias"))
@@ -1053,7 +997,7 @@ def listar_marcas():
         ORDER BY c.nombre, s.nombre, m.nombre
     """).fetchall()
     
-    subcategorias = conn.execute("SELECT * FROM subcategorias ORDER BY nombre").fetchall()
+    subcategorias = taxonomia.filas(conn, 'subcategorias')
     conn.close()
     return render_template("marcas.html", marcas=marcas, subcategorias=subcategorias)
 
@@ -1061,15 +1005,15 @@ def listar_marcas():
 @login_required
 def nueva_marca():
     conn = get_db_connection()
-    categorias = conn.execute("SELECT * FROM categorias ORDER BY nombre").fetchall()
-    subcategorias = conn.execute("SELECT * FROM subcategorias ORDER BY nombre").fetchall()
+    categorias = taxonomia.filas(conn, 'categorias')
+    subcategorias = taxonomia.filas(conn, 'subcategorias')
     
     if request.method == "POST":
         nombre = request.form["nombre"]
         subcategoria_id = request.form.get("subcategoria_id") or None
         
-        conn.execute("INSERT INTO marcas (nombre, subcategoria_id) VALUES (?, ?)", (nombre, subcategoria_id))
-        conn.commit()
+        run_write(_ejecutar, "INSERT INTO marcas (nombre, subcategoria_id) VALUES (?, ?)", (nombre, subcategoria_id))
+        taxonomia.invalidar()
         conn.close()
         flash("Marca creada correctamente", "success")
         return redirect(url_for("listar_marcas"))
@@ -1100,16 +1044,16 @@ def listar_versiones():
 @login_required
 def nueva_version():
     conn = get_db_connection()
-    categorias = conn.execute("SELECT * FROM categorias ORDER BY nombre").fetchall()
-    subcategorias = conn.execute("SELECT * FROM subcategorias ORDER BY nombre").fetchall()
-    marcas = conn.execute("SELECT * FROM marcas ORDER BY nombre").fetchall()
+    categorias = taxonomia.filas(conn, 'categorias')
+    subcategorias = taxonomia.filas(conn, 'subcategorias')
+    marcas = taxonomia.filas(conn, 'marcas')
     
     if request.method == "POST":
         nombre = request.form["nombre"]
         marca_id = request.form.get("marca_id") or None
         
-        conn.execute("INSERT INTO versiones (nombre, marca_id) VALUES (?, ?)", (nombre, marca_id))
-        conn.commit()
+        run_write(_ejecutar, "INSERT INTO versiones (nombre, marca_id) VALUES (?, ?)", (nombre, marca_id))
+        taxonomia.invalidar()
         conn.close()
         flash("Versión creada correctamente", "success")
         return redirect(url_for("listar_versiones"))
@@ -1126,10 +1070,10 @@ def nueva_version():
 def editar_producto(id_producto):
     conn = get_db_connection()
     producto = conn.execute("SELECT * FROM productos WHERE id_producto = ?", (id_producto,)).fetchone()
-    categorias = conn.execute("SELECT * FROM categorias ORDER BY nombre").fetchall()
-    subcategorias = conn.execute("SELECT * FROM subcategorias ORDER BY nombre").fetchall()
-    marcas = conn.execute("SELECT * FROM marcas ORDER BY nombre").fetchall()
-    versiones = conn.execute("SELECT * FROM versiones ORDER BY nombre").fetchall()
+    categorias = taxonomia.filas(conn, 'categorias')
+    subcategorias = taxonomia.filas(conn, 'subcategorias')
+    marcas = taxonomia.filas(conn, 'marcas')
+    versiones = taxonomia.filas(conn, 'versiones')
 
     if not producto:
         conn.close()
@@ -1148,16 +1092,15 @@ def editar_producto(id_producto):
         unidad_medida = request.form.get("unidad_medida", "unidad")
         activo = 1 if request.form.get("activo") else 0
 
-        conn.execute("""
+        run_write(_ejecutar, """
             UPDATE productos
             SET nombre = ?, categoria_id = ?, subcategoria_id = ?, marca_id = ?, version_id = ?,
                 precio_compra = ?, precio_venta = ?, es_pesable = ?, unidad_medida = ?, activo = ?
             WHERE id_producto = ?
         """, (nombre, categoria_id, subcategoria_id, marca_id, version_id, 
               precio_compra, precio_venta, es_pesable, unidad_medida, activo, id_producto))
-
-        conn.commit()
         conn.close()
+        codigos.notificar([id_producto])
         flash("Producto actualizado correctamente", "success")
         return redirect(url_for("admin"))
 
@@ -1186,6 +1129,37 @@ def listar_lotes():
     conn.close()
     return render_template("lotes.html", lotes=lotes)
 
+def _insertar_lote(conn, numero_lote, nro_factura, id_proveedor, fecha_factura, observaciones, renglones):
+    """Inserta el lote del formulario, crea sus productos nuevos y suma stock; retorna el id del lote"""
+    id_lote = conn.execute("""
+        INSERT INTO lotes (numero_lote, nro_factura, id_proveedor, fecha_factura, observaciones)
+        VALUES (?, ?, ?, ?, ?)
+    """, (numero_lote, nro_factura, id_proveedor, fecha_factura, observaciones)).lastrowid
+
+    for id_producto, nuevo, cantidad, pcompra, pventa in renglones:
+        if id_producto is None:
+            # Producto nuevo - crearlo
+            id_producto = conn.execute("""
+                INSERT INTO productos (codigo, nombre, categoria_id, subcategoria_id, marca_id, version_id, 
+                                     precio_compra, precio_venta, es_pesable, unidad_medida)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """, nuevo).lastrowid
+
+        # Agregar detalle del lote
+        conn.execute("""
+            INSERT INTO lotes_detalles (id_lote, id_producto, cantidad, precio_compra, precio_venta)
+            VALUES (?, ?, ?, ?, ?)
+        """, (id_lote, id_producto, cantidad, pcompra, pventa))
+        
+        # Actualizar el stock del producto
+        conn.execute("""
+            UPDATE productos 
+            SET stock = stock + ? 
+            WHERE id_producto = ?
+        """, (cantidad, id_producto))
+
+    return id_lote
+
 @app.route("/nuevo_lote", methods=["GET", "POST"])
 @login_required
 def nuevo_lote():
@@ -1200,14 +1174,8 @@ def nuevo_lote():
         # Generar número de lote automático
         numero_lote = generar_numero_lote()
 
-        cursor = conn.cursor()
-        cursor.execute("""
-            INSERT INTO lotes (numero_lote, nro_factura, id_proveedor, fecha_factura, observaciones)
-            VALUES (?, ?, ?, ?, ?)
-        """, (numero_lote, nro_factura, id_proveedor, fecha_factura, observaciones))
-        id_lote = cursor.lastrowid
-
-        # Procesar productos del lote
+        # Procesar productos del lote: (id existente o None, datos del nuevo, cantidad, precios)
+        renglones = []
         categoria_ids = request.form.getlist("categoria_id[]")
         subcategoria_ids = request.form.getlist("subcategoria_id[]")
         marca_ids = request.form.getlist("marca_id[]")
@@ -1223,9 +1191,9 @@ def nuevo_lote():
             if cantidad and pcompra and pventa:
                 if codigo_existente:
                     # Producto existente - usar su ID
-                    id_producto = int(codigo_existente)
+                    renglones.append((int(codigo_existente), None, float(cantidad), float(pcompra), float(pventa)))
                 else:
-                    # Producto nuevo - crearlo
+                    # Producto nuevo - se crea en el escritor
                     codigo = generar_codigo()
                     while conn.execute("SELECT 1 FROM productos WHERE codigo = ?", (codigo,)).fetchone():
                         codigo = generar_codigo()
@@ -1239,79 +1207,44 @@ def nuevo_lote():
                     # Generar nombre automático a partir de categoría/subcategoría/marca/versión
                     nombre_parts = []
                     if marca_id:
-                        marca_nombre = conn.execute("SELECT nombre FROM marcas WHERE id_marca = ?", (marca_id,)).fetchone()
-                        if marca_nombre: nombre_parts.append(marca_nombre[0])
+                        marca_nombre = taxonomia.nombre(conn, 'marcas', marca_id)
+                        if marca_nombre: nombre_parts.append(marca_nombre)
                     if subcategoria_id:
-                        sub_nombre = conn.execute("SELECT nombre FROM subcategorias WHERE id_subcategoria = ?", (subcategoria_id,)).fetchone()
-                        if sub_nombre: nombre_parts.append(sub_nombre[0])
+                        sub_nombre = taxonomia.nombre(conn, 'subcategorias', subcategoria_id)
+                        if sub_nombre: nombre_parts.append(sub_nombre)
                     if version_id:
-                        ver_nombre = conn.execute("SELECT nombre FROM versiones WHERE id_version = ?", (version_id,)).fetchone()
-                        if ver_nombre: nombre_parts.append(ver_nombre[0])
+                        ver_nombre = taxonomia.nombre(conn, 'versiones', version_id)
+                        if ver_nombre: nombre_parts.append(ver_nombre)
                     nombre_auto = " ".join(nombre_parts) or "Producto"
 
-                    cursor.execute("""
-                        INSERT INTO productos (codigo, nombre, categoria_id, subcategoria_id, marca_id, version_id, 
-                                             precio_compra, precio_venta, es_pesable, unidad_medida)
-                        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                    """, (codigo, nombre_auto, categoria_id or None, subcategoria_id or None, marca_id or None, version_id or None, 
-                          float(pcompra), float(pventa), es_pesable_val, unidad_medida_val))
-                    id_producto = cursor.lastrowid
-
-                # Agregar detalle del lote
-                cursor.execute("""
-                    INSERT INTO lotes_detalles (id_lote, id_producto, cantidad, precio_compra, precio_venta)
-                    VALUES (?, ?, ?, ?, ?)
-                """, (id_lote, id_producto, float(cantidad), float(pcompra), float(pventa)))
-                
-                # Actualizar el stock del producto
-                cursor.execute("""
-                    UPDATE productos 
-                    SET stock = stock + ? 
-                    WHERE id_producto = ?
-                """, (float(cantidad), id_producto))
-
-        conn.commit()
+                    nuevo = (codigo, nombre_auto, categoria_id or None, subcategoria_id or None, marca_id or None, version_id or None, 
+                             float(pcompra), float(pventa), es_pesable_val, unidad_medida_val)
+                    renglones.append((None, nuevo, float(cantidad), float(pcompra), float(pventa)))
+
         conn.close()
+        id_lote = run_write(_insertar_lote, numero_lote, nro_factura, id_proveedor, fecha_factura,
+                            observaciones, renglones)
+        codigos.notificar()
         flash(f"Lote {numero_lote} creado correctamente con todos los productos.", "success")
         return redirect(url_for("ver_lote", id_lote=id_lote))
 
     # Generar número de lote para mostrar
     numero_lote = generar_numero_lote()
-    proveedores = conn.execute("SELECT id_proveedor, nombre FROM proveedores").fetchall()
-    categorias = conn.execute("SELECT * FROM categorias ORDER BY nombre").fetchall()
-    subcategorias = conn.execute("SELECT * FROM subcategorias ORDER BY nombre").fetchall()
-    marcas = conn.execute("SELECT * FROM marcas ORDER BY nombre").fetchall()
-    versiones = conn.execute("SELECT * FROM versiones ORDER BY nombre").fetchall()
-    productos_existentes = conn.execute("""
-        SELECT p.id_producto, p.codigo, p.nombre, p.precio_venta,
-               c.nombre as categoria, s.nombre as subcategoria, m.nombre as marca_nombre, v.nombre as version
-        FROM productos p
-        LEFT JOIN categorias c ON p.categoria_id = c.id_categoria
-        LEFT JOIN subcategorias s ON p.subcategoria_id = s.id_subcategoria
-        LEFT JOIN marcas m ON p.marca_id = m.id_marca
-        LEFT JOIN versiones v ON p.version_id = v.id_version
-        WHERE p.activo = 1 AND p.eliminado = 0
-        ORDER BY p.nombre
-    """).fetchall()
+    # Los productos existentes se buscan en /api/productos/search y los niveles
+    # de la taxonomía debajo de la categoría se piden a /api/... al elegir
+    proveedores = queries.fetchall(conn, 'proveedores.todos')
+    categorias = taxonomia.filas(conn, 'categorias')
     conn.close()
     
     # Convertir objetos Row a diccionarios para JSON serialization
     categorias_dict = [dict(cat) for cat in categorias]
-    subcategorias_dict = [dict(sub) for sub in subcategorias]
-    marcas_dict = [dict(marca) for marca in marcas]
-    versiones_dict = [dict(version) for version in versiones]
     proveedores_dict = [dict(prov) for prov in proveedores]
-    productos_dict = [dict(prod) for prod in productos_existentes]
     
     today = datetime.now().strftime("%Y-%m-%d")
     return render_template("nuevo_lote.html", 
                          numero_lote=numero_lote,
                          proveedores=proveedores_dict, 
                          categorias=categorias_dict,
-                         subcategorias=subcategorias_dict,
-                         marcas=marcas_dict,
-                         versiones=versiones_dict,
-                         productos_existentes=productos_dict,
                          today=today)
 
 @app.route("/ver_lote/<int:id_lote>")
@@ -1349,7 +1282,26 @@ def ver_lote(id_lote):
 # -------------------
 # EDITAR LOTE
 # -------------------
+def _actualizar_lote(conn, id_lote, datos, detalles):
+    """Actualiza la cabecera del lote y reemplaza sus detalles"""
+    # Actualizar información del lote
+    conn.execute("""
+        UPDATE lotes 
+        SET nro_factura = ?, id_proveedor = ?, fecha = ?, observaciones = ?
+        WHERE id_lote = ?
+    """, (*datos, id_lote))
+    
+    # Eliminar detalles existentes
+    conn.execute("DELETE FROM lotes_detalles WHERE id_lote = ?", (id_lote,))
+    
+    # Insertar nuevos detalles
+    conn.executemany("""
+        INSERT INTO lotes_detalles (id_lote, id_producto, cantidad, precio_compra, precio_venta)
+        VALUES (?, ?, ?, ?, ?)
+    """, detalles)
+
 @app.route("/editar_lote/<int:id_lote>", methods=["GET", "POST"])
+@login_required
 def editar_lote(id_lote):
     conn = get_db_connection()
     
@@ -1372,31 +1324,17 @@ def editar_lote(id_lote):
         observaciones = request.form.get("observaciones")
         fecha = request.form.get("fecha")
         
-        # Actualizar información del lote
-        conn.execute("""
-            UPDATE lotes 
-            SET nro_factura = ?, id_proveedor = ?, fecha = ?, observaciones = ?
-            WHERE id_lote = ?
-        """, (nro_factura, id_proveedor, fecha, observaciones, id_lote))
-        
-        # Eliminar detalles existentes
-        conn.execute("DELETE FROM lotes_detalles WHERE id_lote = ?", (id_lote,))
-        
-        # Insertar nuevos detalles
+        # Nuevos detalles
         productos = request.form.getlist("producto_id[]")
         cantidades = request.form.getlist("cantidad[]")
         precios_compra = request.form.getlist("precio_compra[]")
         precios_venta = request.form.getlist("precio_venta[]")
+        detalles = [(id_lote, int(prod_id), float(cantidad), float(pcompra or 0), float(pventa or 0))
+                    for prod_id, cantidad, pcompra, pventa in zip(productos, cantidades, precios_compra, precios_venta)
+                    if prod_id and cantidad]
         
-        for prod_id, cantidad, pcompra, pventa in zip(productos, cantidades, precios_compra, precios_venta):
-            if prod_id and cantidad:
-                conn.execute("""
-                    INSERT INTO lotes_detalles (id_lote, id_producto, cantidad, precio_compra, precio_venta)
-                    VALUES (?, ?, ?, ?, ?)
-                """, (id_lote, int(prod_id), float(cantidad), float(pcompra or 0), float(pventa or 0)))
-        
-        conn.commit()
         conn.close()
+        run_write(_actualizar_lote, id_lote, (nro_factura, id_proveedor, fecha, observaciones), detalles)
         flash("Lote actualizado correctamente.", "success")
         return redirect(url_for("ver_lote", id_lote=id_lote))
     
@@ -1409,37 +1347,30 @@ def editar_lote(id_lote):
         ORDER BY p.nombre
     """, (id_lote,)).fetchall()
     
-    # Datos para el formulario
-    proveedores = conn.execute("SELECT id_proveedor, nombre FROM proveedores").fetchall()
-    productos = conn.execute("SELECT id_producto, nombre, codigo, precio_compra, precio_venta FROM productos WHERE activo=1").fetchall()
-    categorias = conn.execute("SELECT * FROM categorias").fetchall()
+    # Datos para el formulario (los productos se buscan en /api/productos/search)
+    proveedores = queries.fetchall(conn, 'proveedores.todos')
+    categorias = taxonomia.filas(conn, 'categorias')
     conn.close()
     
     # Convertir objetos Row a diccionarios para JSON serialization
     proveedores_dict = [dict(prov) for prov in proveedores]
-    productos_dict = [dict(prod) for prod in productos]
     categorias_dict = [dict(cat) for cat in categorias]
     
     return render_template("editar_lote.html", 
                          lote=lote, 
                          detalles=detalles,
                          proveedores=proveedores_dict, 
-                         productos=productos_dict, 
                          categorias=categorias_dict)
 
 # -------------------
 # ELIMINAR LOTE
 # -------------------
-@app.route("/eliminar_lote/<int:id_lote>")
-def eliminar_lote(id_lote):
-    conn = get_db_connection()
-    
+def _eliminar_lote(conn, id_lote):
+    """Revierte el stock del lote y lo elimina; retorna los productos afectados (None si no existe)"""
     # Verificar que el lote existe
     lote = conn.execute("SELECT id_lote FROM lotes WHERE id_lote = ?", (id_lote,)).fetchone()
     if not lote:
-        conn.close()
-        flash("Lote no encontrado", "danger")
-        return redirect(url_for("listar_lotes"))
+        return None
     
     # Obtener detalles del lote para revertir el stock
     detalles = conn.execute("""
@@ -1462,9 +1393,16 @@ def eliminar_lote(id_lote):
     
     # Eliminar el lote
     conn.execute("DELETE FROM lotes WHERE id_lote = ?", (id_lote,))
+    return [id_producto for id_producto, _ in detalles]
+
+@app.route("/eliminar_lote/<int:id_lote>")
+def eliminar_lote(id_lote):
+    productos = run_write(_eliminar_lote, id_lote)
+    if productos is None:
+        flash("Lote no encontrado", "danger")
+        return redirect(url_for("listar_lotes"))
     
-    conn.commit()
-    conn.close()
+    codigos.notificar(productos)
     flash("Lote eliminado correctamente.", "success")
     return redirect(url_for("listar_lotes"))
 
@@ -1533,13 +1471,10 @@ def nuevo_cliente():
         email = request.form.get("email", "")
         direccion = request.form.get("direccion", "")
         
-        conn = get_db_connection()
-        conn.execute("""
+        run_write(_ejecutar, """
             INSERT INTO clientes (nombre, telefono, email, direccion)
             VALUES (?, ?, ?, ?)
         """, (nombre, telefono, email, direccion))
-        conn.commit()
-        conn.close()
         
         flash("Cliente creado correctamente", "success")
         return redirect(url_for("listar_clientes"))
@@ -1552,16 +1487,97 @@ def nuevo_cliente():
 @app.route("/ventas")
 @login_required
 def ventas():
-    conn = get_db_connection()
-    ventas = conn.execute("""
+    query = """
         SELECT v.*, c.nombre AS cliente_nombre,
                (SELECT COUNT(*) FROM detalles_venta vd WHERE vd.venta_id = v.id_venta) AS items
         FROM ventas v
         LEFT JOIN clientes c ON v.cliente_id = c.id_cliente
         ORDER BY v.fecha_venta DESC, v.fecha_registro DESC
-    """).fetchall()
+    """
+    conn = get_db_connection()
+    router = shards.get_router()
+    if router is None:
+        ventas = conn.execute(query).fetchall()
+        conn.close()
+        return render_template("ventas.html", ventas=ventas)
+    
+    # Modo por tienda: las ventas del admin y de cada POS viven en archivos distintos
+    resultados = router.fan_out(lambda c: c.execute(query).fetchall())
+    ventas = shards.merge_sorted(resultados, key=lambda v: (v['fecha_venta'] or '', v['fecha_registro'] or ''),
+                                 reverse=True)
+    nombres = dict(conn.execute("SELECT id_cliente, nombre FROM clientes_pos").fetchall())
     conn.close()
-    return render_template("ventas.html", ventas=ventas)
+    tiendas = [(tienda, "Central" if tienda == shards.CENTRAL else nombres.get(tienda, f"Tienda {tienda}"))
+               for tienda in router.tiendas()]
+    return render_template("ventas.html", ventas=ventas, tiendas=tiendas, tienda_actual=shards.current_tienda())
+
+@app.route("/tienda", methods=["POST"])
+@login_required
+def seleccionar_tienda():
+    """Tienda de la sesión en modo por tienda: a su archivo van las ventas cargadas desde el admin"""
+    router = shards.get_router()
+    tienda = request.form.get("tienda_id", type=int)
+    if router is None or tienda is None:
+        flash("El modo por tienda no está activo", "error")
+        return redirect(url_for("ventas"))
+    try:
+        router.ensure_shard(tienda)
+    except shards.UnknownShardError as e:
+        flash(str(e), "error")
+        return redirect(url_for("ventas"))
+    session['tienda_id'] = tienda
+    flash("Tienda seleccionada para las nuevas ventas", "success")
+    return redirect(url_for("ventas"))
+
+class StockInsuficienteError(Exception):
+    """El stock disponible no alcanza para la cantidad vendida"""
+    def __init__(self, stock_actual):
+        super().__init__(f"Stock insuficiente: {stock_actual}")
+        self.stock_actual = stock_actual
+
+def _registrar_venta(conn, id_cliente, fecha_venta, metodo_pago, observaciones, items):
+    """Crea la venta, sus detalles y descuenta stock; retorna el id de la venta"""
+    # Crear la venta
+    cursor = conn.cursor()
+    cursor.execute("""
+        INSERT INTO ventas (id_cliente, fecha_venta, metodo_pago, observaciones)
+        VALUES (?, ?, ?, ?)
+    """, (id_cliente, fecha_venta, metodo_pago, observaciones))
+    id_venta = cursor.lastrowid
+    
+    total_venta = 0
+    for prod_id, cantidad, precio in items:
+        if prod_id and cantidad and precio:
+            cantidad = float(cantidad)  # Permitir decimales para productos pesables
+            precio = float(precio)
+            subtotal = cantidad * precio
+            total_venta += subtotal
+            
+            # Verificar stock disponible (la excepción deshace toda la venta)
+            stock_actual = conn.execute("SELECT stock FROM productos WHERE id_producto = ?", (prod_id,)).fetchone()[0]
+            if stock_actual < cantidad:
+                raise StockInsuficienteError(stock_actual)
+            
+            cursor.execute("""
+                INSERT INTO detalles_venta (venta_id, producto_id, cantidad, precio_unitario, subtotal)
+                VALUES (?, ?, ?, ?, ?)
+            """, (id_venta, int(prod_id), cantidad, precio, subtotal))
+            
+            # Actualizar el stock del producto
+            cursor.execute("""
+                UPDATE productos 
+                SET stock = stock - ? 
+                WHERE id_producto = ?
+            """, (cantidad, int(prod_id)))
+    
+    # Actualizar el total de la venta
+    cursor.execute("""
+        UPDATE ventas 
+        SET total = ? 
+        WHERE id_venta = ?
+    """, (total_venta, id_venta))
+    
+    return id_venta
 
 @app.route("/nueva_venta", methods=["GET", "POST"])
 @login_required
@@ -1574,84 +1590,44 @@ def nueva_venta():
         metodo_pago = request.form.get("metodo_pago", "Efectivo")
         observaciones = request.form.get("observaciones", "")
         
-        # Crear la venta
-        cursor = conn.cursor()
-        cursor.execute("""
-            INSERT INTO ventas (id_cliente, fecha_venta, metodo_pago, observaciones)
-            VALUES (?, ?, ?, ?)
-        """, (id_cliente, fecha_venta, metodo_pago, observaciones))
-        id_venta = cursor.lastrowid
-        
         # Procesar productos de la venta
-        productos = request.form.getlist("producto_id[]")
-        cantidades = request.form.getlist("cantidad[]")
-        precios = request.form.getlist("precio[]")
-        
-        total_venta = 0
-        for prod_id, cantidad, precio in zip(productos, cantidades, precios):
-            if prod_id and cantidad and precio:
-                cantidad = float(cantidad)  # Permitir decimales para productos pesables
-                precio = float(precio)
-                subtotal = cantidad * precio
-                total_venta += subtotal
-                
-                # Verificar stock disponible
-                stock_actual = conn.execute("SELECT stock FROM productos WHERE id_producto = ?", (prod_id,)).fetchone()[0]
-                if stock_actual < cantidad:
-                    conn.rollback()
-                    conn.close()
-                    flash(f"Stock insuficiente para el producto seleccionado. Stock disponible: {stock_actual}", "error")
-                    return redirect(url_for("nueva_venta"))
-                
-                cursor.execute("""
-                    INSERT INTO detalles_venta (venta_id, producto_id, cantidad, precio_unitario, subtotal)
-                    VALUES (?, ?, ?, ?, ?)
-                """, (id_venta, int(prod_id), cantidad, precio, subtotal))
-                
-                # Actualizar el stock del producto
-                cursor.execute("""
-                    UPDATE productos 
-                    SET stock = stock - ? 
-                    WHERE id_producto = ?
-                """, (cantidad, int(prod_id)))
-        
-        # Actualizar el total de la venta
-        cursor.execute("""
-            UPDATE ventas 
-            SET total = ? 
-            WHERE id_venta = ?
-        """, (total_venta, id_venta))
-        
-        conn.commit()
+        items = list(zip(request.form.getlist("producto_id[]"),
+                         request.form.getlist("cantidad[]"),
+                         request.form.getlist("precio[]")))
+        
+        try:
+            # En modo por tienda la venta va al archivo de la tienda de la sesión
+            escritor = _writer_de_tienda(shards.current_tienda())
+            id_venta = escritor.run(_registrar_venta, id_cliente, fecha_venta, metodo_pago, observaciones, items)
+        except StockInsuficienteError as e:
+            conn.close()
+            flash(f"Stock insuficiente para el producto seleccionado. Stock disponible: {e.stock_actual}", "error")
+            return redirect(url_for("nueva_venta"))
+        except shards.UnknownShardError as e:
+            conn.close()
+            flash(str(e), "error")
+            return redirect(url_for("nueva_venta"))
+        
         conn.close()
+        codigos.notificar([int(producto_id) for producto_id, _, _ in items if producto_id])
         flash("Venta registrada correctamente", "success")
         return redirect(url_for("ver_venta", id_venta=id_venta))
     
-    # Obtener datos para el formulario
+    # Obtener datos para el formulario (los productos se buscan en /api/productos/search)
     clientes = conn.execute("SELECT id_cliente, nombre FROM clientes ORDER BY nombre").fetchall()
-    productos = conn.execute("""
-        SELECT p.id_producto, p.codigo, p.nombre, p.precio_venta, p.stock, 
-               c.nombre AS categoria, p.es_pesable, p.unidad_medida
-        FROM productos p
-        LEFT JOIN categorias c ON p.categoria_id = c.id_categoria
-        WHERE p.activo = 1 AND p.eliminado = 0 AND p.stock > 0
-        ORDER BY p.nombre
-    """).fetchall()
     conn.close()
     
     # Convertir objetos Row a diccionarios para JSON serialization
     clientes_dict = [dict(cli) for cli in clientes]
-    productos_dict = [dict(prod) for prod in productos]
     
     today = datetime.now().strftime("%Y-%m-%d")
     return render_template("nueva_venta.html", 
                          clientes=clientes_dict, 
-                         productos=productos_dict,
                          today=today)
 
 @app.route("/ver_venta/<int:id_venta>")
 def ver_venta(id_venta):
-    conn = get_db_connection()
+    conn = get_venta_connection(id_venta)
     
     # Obtener información de la venta
     venta = conn.execute("""
@@ -1678,16 +1654,12 @@ def ver_venta(id_venta):
     conn.close()
     return render_template("ver_venta.html", venta=venta, detalles=detalles)
 
-@app.route("/eliminar_venta/<int:id_venta>")
-def eliminar_venta(id_venta):
-    conn = get_db_connection()
-    
+def _eliminar_venta(conn, id_venta):
+    """Revierte el stock de la venta y la elimina; retorna los productos afectados (None si no existe)"""
     # Verificar que la venta existe
     venta = conn.execute("SELECT id_venta FROM ventas WHERE id_venta = ?", (id_venta,)).fetchone()
     if not venta:
-        conn.close()
-        flash("Venta no encontrada", "danger")
-        return redirect(url_for("listar_ventas"))
+        return None
     
     # Obtener detalles de la venta para revertir el stock
     detalles = conn.execute("""
@@ -1710,9 +1682,16 @@ def eliminar_venta(id_venta):
     
     # Eliminar la venta
     conn.execute("DELETE FROM ventas WHERE id_venta = ?", (id_venta,))
+    return [producto_id for producto_id, _ in detalles]
+
+@app.route("/eliminar_venta/<int:id_venta>")
+def eliminar_venta(id_venta):
+    productos = _writer_de_venta(id_venta).run(_eliminar_venta, id_venta)
+    if productos is None:
+        flash("Venta no encontrada", "danger")
+        return redirect(url_for("ventas"))
     
-    conn.commit()
-    conn.close()
+    codigos.notificar(productos)
     flash("Venta eliminada correctamente", "success")
     return redirect(url_for("ventas"))
 
@@ -1722,30 +1701,10 @@ def eliminar_venta(id_venta):
 @app.route("/api/productos_venta")
 def api_productos_venta():
     conn = get_db_connection()
-    productos = conn.execute("""
-        SELECT p.id_producto, p.codigo, p.nombre, p.precio_venta, p.stock, 
-               c.nombre AS categoria, s.nombre AS subcategoria, m.nombre AS marca, v.nombre AS version
-        FROM productos p
-        LEFT JOIN categorias c ON p.categoria_id = c.id_categoria
-        LEFT JOIN subcategorias s ON p.subcategoria_id = s.id_subcategoria
-        LEFT JOIN marcas m ON p.marca_id = m.id_marca
-        LEFT JOIN versiones v ON p.version_id = v.id_version
-        WHERE p.activo = 1 AND p.eliminado = 0 AND p.stock > 0
-        ORDER BY p.nombre
-    """).fetchall()
+    productos = queries.fetchall(conn, 'productos.para_venta')
     conn.close()
     
-    return jsonify([{
-        'id_producto': p.id_producto,
-        'codigo': p.codigo,
-        'nombre': p.nombre,
-        'precio_venta': p.precio_venta,
-        'stock': p.stock,
-        'categoria': p.categoria,
-        'subcategoria': p.subcategoria,
-        'marca': p.marca_nombre,
-        'version': p.version_nombre
-    } for p in productos])
+    return jsonify([dict(p) for p in productos])
 
 @app.route("/api/clientes", methods=["POST"])
 def api_crear_cliente():
@@ -1759,17 +1718,11 @@ def api_crear_cliente():
         if not nombre:
             return jsonify({"success": False, "message": "El nombre es obligatorio"})
         
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute("""
+        id_cliente = run_write(_ejecutar, """
             INSERT INTO clientes (nombre, telefono, email, direccion)
             VALUES (?, ?, ?, ?)
         """, (nombre, telefono, email, direccion))
         
-        id_cliente = cursor.lastrowid
-        conn.commit()
-        conn.close()
-        
         return jsonify({
             "success": True,
             "cliente": {
@@ -1787,23 +1740,10 @@ def api_crear_cliente():
 # GENERAR CÓDIGOS DE BARRAS
 # -------------------
 @app.route("/generar_codigos")
+@login_required
 def generar_codigos():
-    conn = get_db_connection()
-    productos = conn.execute("""
-        SELECT p.id_producto, p.codigo, p.nombre, p.precio_venta, 
-               c.nombre AS categoria
-        FROM productos p
-        LEFT JOIN categorias c ON p.categoria_id = c.id_categoria
-
-        WHERE p.activo = 1 AND p.eliminado = 0
-        ORDER BY p.nombre
-    """).fetchall()
-    conn.close()
-    
-    # Convertir objetos Row a diccionarios para JSON serialization
-    productos_dict = [dict(prod) for prod in productos]
-    
-    return render_template("generar_codigos.html", productos=productos_dict)
+    # La tabla de productos se llena con /api/productos/search al escribir
+    return render_template("generar_codigos.html")
 
 @app.route("/generar_pdf_codigos", methods=["POST"])
 def generar_pdf_codigos():
@@ -1922,10 +1862,8 @@ def generar_pdf_codigos():
 # -------------------
 @app.route("/eliminar/<int:id_producto>")
 def eliminar_producto(id_producto):
-    conn = get_db_connection()
-    conn.execute("UPDATE productos SET eliminado = 1 WHERE id_producto = ?", (id_producto,))
-    conn.commit()
-    conn.close()
+    run_write(_ejecutar, "UPDATE productos SET eliminado = 1 WHERE id_producto = ?", (id_producto,))
+    codigos.notificar([id_producto])
     return redirect(url_for("admin"))
 
 # -------------------
@@ -1960,17 +1898,11 @@ def api_proveedores():
             if not nombre:
                 return jsonify({"success": False, "message": "El nombre es obligatorio"})
             
-            conn = get_db_connection()
-            cursor = conn.cursor()
-            cursor.execute("""
+            id_proveedor = run_write(_ejecutar, """
                 INSERT INTO proveedores (nombre, telefono, email)
                 VALUES (?, ?, ?)
             """, (nombre, telefono, email))
             
-            id_proveedor = cursor.lastrowid
-            conn.commit()
-            conn.close()
-            
             return jsonify({
                 "success": True,
                 "proveedor": {
@@ -1996,21 +1928,18 @@ def api_crear_producto():
             return jsonify({"success": False, "message": "El nombre es obligatorio"})
         
         conn = get_db_connection()
-        cursor = conn.cursor()
         
         # Generar código único
         codigo = generar_codigo()
         while conn.execute("SELECT 1 FROM productos WHERE codigo = ?", (codigo,)).fetchone():
             codigo = generar_codigo()
+        conn.close()
         
-        cursor.execute("""
+        id_producto = run_write(_ejecutar, """
             INSERT INTO productos (codigo, nombre, categoria_id, precio_compra, precio_venta)
             VALUES (?, ?, ?, ?, ?)
         """, (codigo, nombre, categoria_id, precio_compra, precio_venta))
-        
-        id_producto = cursor.lastrowid
-        conn.commit()
-        conn.close()
+        codigos.notificar([id_producto])
         
         return jsonify({
             "success": True,
@@ -2071,17 +2000,23 @@ def reporte_ventas():
         query += " AND v.fecha_venta <= ?"
         params.append(fecha_fin)
     
-    query += " GROUP BY v.id_venta ORDER BY v.fecha_venta DESC"
+    query += " GROUP BY v.id_venta, c.nombre ORDER BY v.fecha_venta DESC"
     
-    cursor.execute(query, params)
-    ventas = cursor.fetchall()
+    router = shards.get_router()
+    if router is not None:
+        # Modo por tienda: cada archivo se consulta en paralelo y se unen ya ordenados
+        resultados = router.fan_out(lambda c: c.execute(query, params).fetchall())
+        ventas = shards.merge_sorted(resultados, key=lambda v: v['fecha'] or '', reverse=True)
+    else:
+        # Cursor del lado del servidor en PostgreSQL: el resultado llega por tandas
+        ventas = list(backends.iter_rows(conn, query, params))
     
     # Calcular estadísticas
     total_ventas = len(ventas)
     total_ingresos = sum(venta[4] for venta in ventas) if ventas else 0
     
     # Ventas por método de pago
-    cursor.execute("""
+    query_pagos = """
         SELECT 
             CASE 
                 WHEN efectivo > 0 THEN 'Efectivo'
@@ -2094,8 +2029,11 @@ def reporte_ventas():
             SUM(total)
         FROM ventas 
         GROUP BY metodo_pago
-    """)
-    ventas_por_pago = cursor.fetchall()
+    """
+    if router is not None:
+        ventas_por_pago = shards.merge_totals(router.fan_out(lambda c: c.execute(query_pagos).fetchall()))
+    else:
+        ventas_por_pago = cursor.execute(query_pagos).fetchall()
     
     conn.close()
     
@@ -2114,7 +2052,7 @@ def reporte_ganancias():
     cursor = conn.cursor()
     
     # Obtener ventas con detalles y costos
-    cursor.execute("""
+    productos_ganancia = list(backends.iter_rows(conn, """
         SELECT 
             p.nombre as producto,
             p.codigo,
@@ -2131,11 +2069,9 @@ def reporte_ganancias():
         LEFT JOIN categorias cat ON p.categoria_id = cat.id_categoria
         JOIN ventas v ON vd.venta_id = v.id_venta
         WHERE v.eliminado = 0
-        GROUP BY p.id_producto
+        GROUP BY p.id_producto, cat.nombre
         ORDER BY ganancia_estimada DESC
-    """)
-    
-    productos_ganancia = cursor.fetchall()
+    """))
     
     # Calcular totales
     total_ingresos = sum(row[4] for row in productos_ganancia)
@@ -2156,7 +2092,7 @@ def reporte_ganancias():
         JOIN ventas v ON vd.venta_id = v.id_venta
         WHERE v.eliminado = 0
         GROUP BY p.id_producto
-        HAVING margen_porcentual > 0
+        HAVING (AVG(vd.precio_unitario) - AVG(COALESCE(ld.precio_compra, 0))) / NULLIF(AVG(vd.precio_unitario), 0) * 100 > 0
         ORDER BY margen_porcentual DESC
         LIMIT 10
     """)
@@ -2379,31 +2315,26 @@ def api_test_connection():
         
         # Probar conexión HTTP
         try:
-            response = requests.get(f"{url}/api/health", timeout=5)
+            # Prueba manual: pasa aunque el circuito del POS esté abierto y lo cierra si responde
+            response = pos_client.get_client(url).get(f"{url}/api/health", timeout=5, probe=True)
             if response.status_code == 200:
                 # Actualizar estado en base de datos
-                conn = get_db_connection()
-                conn.execute("""
+                run_write(_ejecutar, """
                     UPDATE clientes_pos 
                     SET estado = 'conectado', ultima_sincronizacion = CURRENT_TIMESTAMP
                     WHERE id_cliente = ?
                 """, (cliente_id,))
-                conn.commit()
-                conn.close()
                 
                 return jsonify({"success": True, "message": "Conexión exitosa"})
             else:
                 return jsonify({"success": False, "error": f"HTTP {response.status_code}"})
         except requests.exceptions.RequestException as e:
             # Actualizar estado de error
-            conn = get_db_connection()
-            conn.execute("""
+            run_write(_ejecutar, """
                 UPDATE clientes_pos 
                 SET estado = 'error', ultimo_error = ?
                 WHERE id_cliente = ?
             """, (str(e), cliente_id))
-            conn.commit()
-            conn.close()
             
             return jsonify({"success": False, "error": str(e)})
             
@@ -2427,38 +2358,26 @@ def api_sync_client():
         if not cliente:
             return jsonify({"success": False, "error": "Cliente no encontrado"}), 404
         
-        # Obtener productos para sincronizar
-        productos = conn.execute("""
-            SELECT 
-                id_producto, codigo, nombre, precio_venta, stock, 
-                es_pesable, unidad_medida, activo
-            FROM productos 
-            WHERE activo = 1 AND eliminado = 0
-        """).fetchall()
-        
-        sync_data = {
-            'productos': [dict(p) for p in productos],
-            'timestamp': datetime.now().isoformat(),
-            'version': '1.0.0'
-        }
+        # Cambios del catálogo desde la última versión confirmada por el cliente
+        hasta = catalog_sync.version_actual(conn)
+        sync_data = catalog_sync.payload(conn, cliente['version_productos'] or 0, hasta)
         
         # Enviar datos al cliente
         try:
-            response = requests.post(
+            response = pos_sync.post(
                 f"{cliente['url']}/api/sync",
-                json=sync_data,
-                headers={'Content-Type': 'application/json'},
+                serializer.dumps(sync_data),
                 timeout=10
             )
             
             if response.status_code == 200:
                 # Actualizar estado
-                conn.execute("""
+                run_write(_ejecutar, """
                     UPDATE clientes_pos 
-                    SET estado = 'conectado', ultima_sincronizacion = CURRENT_TIMESTAMP
+                    SET estado = 'conectado', ultima_sincronizacion = CURRENT_TIMESTAMP,
+                        version_productos = ?
                     WHERE id_cliente = ?
-                """, (cliente_id,))
-                conn.commit()
+                """, (hasta, cliente_id))
                 conn.close()
                 
                 return jsonify({"success": True, "message": f"Sincronización exitosa con {cliente['nombre']}"})
@@ -2467,12 +2386,11 @@ def api_sync_client():
                 
         except requests.exceptions.RequestException as e:
             # Actualizar estado de error
-            conn.execute("""
+            run_write(_ejecutar, """
                 UPDATE clientes_pos 
                 SET estado = 'error', ultimo_error = ?
                 WHERE id_cliente = ?
             """, (str(e), cliente_id))
-            conn.commit()
             conn.close()
             
             return jsonify({"success": False, "error": str(e)})
@@ -2499,8 +2417,7 @@ def api_delete_client_pos():
             return jsonify({"success": False, "error": "Cliente no encontrado"}), 404
         
         # Eliminar (marcar como inactivo)
-        conn.execute("UPDATE clientes_pos SET activo = 0 WHERE id_cliente = ?", (cliente_id,))
-        conn.commit()
+        run_write(_ejecutar, "UPDATE clientes_pos SET activo = 0 WHERE id_cliente = ?", (cliente_id,))
         conn.close()
         
         return jsonify({"success": True, "message": "Cliente eliminado exitosamente"})
@@ -2508,6 +2425,24 @@ def api_delete_client_pos():
     except Exception as e:
         return jsonify({"success": False, "error": str(e)}), 500
 
+def _registrar_pago_parcial(conn, data):
+    """Inserta el pago parcial y descuenta el pendiente de la venta; retorna el id del pago"""
+    # Insertar pago parcial
+    cursor = conn.execute("""
+        INSERT INTO pagos_parciales (cliente_id, venta_id, monto_pago, usuario_id, fecha_pago)
+        VALUES (?, ?, ?, ?, CURRENT_TIMESTAMP)
+    """, (data['cliente_id'], data['venta_id'], data['monto_pago'], data['usuario_id']))
+    
+    pago_id = cursor.lastrowid
+    
+    # Actualizar monto pendiente en la venta
+    conn.execute("""
+        UPDATE ventas 
+        SET monto_pendiente = COALESCE(monto_pendiente, prestamo_personal) - ?
+        WHERE id_venta = ?
+    """, (data['monto_pago'], data['venta_id']))
+    return pago_id
+
 @app.route("/api/pagos_parciales", methods=["GET", "POST"])
 def api_pagos_parciales():
     """API para pagos parciales de créditos personales"""
@@ -2536,25 +2471,8 @@ def api_pagos_parciales():
             if not all(key in data for key in ['cliente_id', 'venta_id', 'monto_pago', 'usuario_id']):
                 return jsonify({"success": False, "error": "Datos incompletos"}), 400
             
-            conn = get_db_connection()
-            
-            # Insertar pago parcial
-            cursor = conn.execute("""
-                INSERT INTO pagos_parciales (cliente_id, venta_id, monto_pago, usuario_id, fecha_pago)
-                VALUES (?, ?, ?, ?, CURRENT_TIMESTAMP)
-            """, (data['cliente_id'], data['venta_id'], data['monto_pago'], data['usuario_id']))
-            
-            pago_id = cursor.lastrowid
-            
-            # Actualizar monto pendiente en la venta
-            conn.execute("""
-                UPDATE ventas 
-                SET monto_pendiente = COALESCE(monto_pendiente, prestamo_personal) - ?
-                WHERE id_venta = ?
-            """, (data['monto_pago'], data['venta_id']))
-            
-            conn.commit()
-            conn.close()
+            # El pago va a la base que guarda la venta
+            pago_id = _writer_de_venta(data['venta_id']).run(_registrar_pago_parcial, data)
             
             return jsonify({
                 "success": True,
@@ -2640,9 +2558,9 @@ def eliminar_categoria(id_categoria):
             return redirect(url_for("listar_categorias"))
         
         # Eliminar la categoría
-        conn.execute("DELETE FROM categorias WHERE id_categoria = ?", (id_categoria,))
-        conn.commit()
         conn.close()
+        run_write(_ejecutar, "DELETE FROM categorias WHERE id_categoria = ?", (id_categoria,))
+        taxonomia.invalidar()
         
         flash("Categoría eliminada correctamente", "success")
         return redirect(url_for("listar_categorias"))
@@ -2672,9 +2590,9 @@ def eliminar_subcategoria(id_subcategoria):
             return redirect(url_for("listar_subcategorias"))
         
         # Eliminar la subcategoría
-        conn.execute("DELETE FROM subcategorias WHERE id_subcategoria = ?", (id_subcategoria,))
-        conn.commit()
         conn.close()
+        run_write(_ejecutar, "DELETE FROM subcategorias WHERE id_subcategoria = ?", (id_subcategoria,))
+        taxonomia.invalidar()
         
         flash("Subcategoría eliminada correctamente", "success")
         return redirect(url_for("listar_subcategorias"))
@@ -2704,9 +2622,9 @@ def eliminar_marca(id_marca):
             return redirect(url_for("listar_marcas"))
         
         # Eliminar la marca
-        conn.execute("DELETE FROM marcas WHERE id_marca = ?", (id_marca,))
-        conn.commit()
         conn.close()
+        run_write(_ejecutar, "DELETE FROM marcas WHERE id_marca = ?", (id_marca,))
+        taxonomia.invalidar()
         
         flash("Marca eliminada correctamente", "success")
         return redirect(url_for("listar_marcas"))
@@ -2729,9 +2647,9 @@ def eliminar_version(id_version):
             return redirect(url_for("listar_versiones"))
         
         # Eliminar la versión
-        conn.execute("DELETE FROM versiones WHERE id_version = ?", (id_version,))
-        conn.commit()
         conn.close()
+        run_write(_ejecutar, "DELETE FROM versiones WHERE id_version = ?", (id_version,))
+        taxonomia.invalidar()
         
         flash("Versión eliminada correctamente", "success")
         return redirect(url_for("listar_versiones"))
@@ -2746,15 +2664,10 @@ def api_subcategorias_por_categoria(categoria_id):
     """Obtener subcategorías por categoría"""
     try:
         conn = get_db_connection()
-        subcategorias = conn.execute("""
-            SELECT id_subcategoria, nombre, categoria_id
-            FROM subcategorias
-            WHERE categoria_id = ?
-            ORDER BY nombre
-        """, (categoria_id,)).fetchall()
+        subcategorias = taxonomia.hijos(conn, 'subcategorias', categoria_id)
         
         conn.close()
-        return jsonify([dict(s) for s in subcategorias])
+        return jsonify(subcategorias)
         
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -2764,15 +2677,10 @@ def api_marcas_por_subcategoria(subcategoria_id):
     """Obtener marcas por subcategoría"""
     try:
         conn = get_db_connection()
-        marcas = conn.execute("""
-            SELECT id_marca, nombre, subcategoria_id
-            FROM marcas
-            WHERE subcategoria_id = ?
-            ORDER BY nombre
-        """, (subcategoria_id,)).fetchall()
+        marcas = taxonomia.hijos(conn, 'marcas', subcategoria_id)
         
         conn.close()
-        return jsonify([dict(m) for m in marcas])
+        return jsonify(marcas)
         
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -2782,19 +2690,81 @@ def api_versiones_por_marca(marca_id):
     """Obtener versiones por marca"""
     try:
         conn = get_db_connection()
-        versiones = conn.execute("""
-            SELECT id_version, nombre, marca_id
-            FROM versiones
-            WHERE marca_id = ?
-            ORDER BY nombre
-        """, (marca_id,)).fetchall()
+        versiones = taxonomia.hijos(conn, 'versiones', marca_id)
         
         conn.close()
-        return jsonify([dict(v) for v in versiones])
+        return jsonify(versiones)
         
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+def _crear_lote(conn, data):
+    """Inserta el lote, sus productos y actualiza stock; retorna el id del lote"""
+    # Insertar el lote
+    cursor = conn.execute("""
+        INSERT INTO lotes (numero_lote, nro_factura, id_proveedor, fecha_factura, observaciones, fecha_carga)
+        VALUES (?, ?, ?, ?, ?, datetime('now'))
+    """, (
+        data['numero_lote'],
+        data['nro_factura'],
+        data['id_proveedor'],
+        data['fecha_factura'],
+        data.get('observaciones', '')
+    ))
+    
+    lote_id = cursor.lastrowid
+    
+    # Procesar cada producto del lote
+    for producto in data['productos']:
+        if producto['tipo'] == 'existente':
+            # Producto existente - solo agregar al lote
+            producto_id = producto['producto_existente']
+        else:
+            # Producto nuevo - crear primero el producto
+            cursor_producto = conn.execute("""
+                INSERT INTO productos (codigo, nombre, categoria_id, subcategoria_id, marca_id, version_id, precio_compra, precio_venta, eliminado)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, 0)
+            """, (
+                producto['codigo'],
+                producto['nombre'],
+                producto['categoria_id'],
+                producto['subcategoria_id'],
+                producto['marca_id'],
+                producto['version_id'],
+                producto['precio_compra'],
+                producto['precio_venta']
+            ))
+            
+            producto_id = cursor_producto.lastrowid
+        
+        # Agregar al lote
+        conn.execute("""
+            INSERT INTO lotes_detalles (id_lote, id_producto, cantidad, precio_compra, precio_venta)
+            VALUES (?, ?, ?, ?, ?)
+        """, (
+            lote_id,
+            producto_id,
+            producto['cantidad'],
+            producto['precio_compra'],
+            producto['precio_venta']
+        ))
+        
+        # Actualizar stock y precios del producto
+        conn.execute("""
+            UPDATE productos 
+            SET stock = stock + ?, 
+                precio_compra = ?, 
+                precio_venta = ?
+            WHERE id_producto = ?
+        """, (
+            producto['cantidad'],
+            producto['precio_compra'],
+            producto['precio_venta'],
+            producto_id
+        ))
+    
+    return lote_id
+
 # Ruta para crear lotes
 @app.route("/crear_lote", methods=["POST"])
 @login_required
@@ -2810,97 +2780,8 @@ def crear_lote():
         if not data.get('productos') or len(data['productos']) == 0:
             return jsonify({"success": False, "message": "Debe agregar al menos un producto al lote"}), 400
         
-        conn = get_db_connection()
-        
-        # Insertar el lote
-        cursor = conn.execute("""
-            INSERT INTO lotes (numero_lote, nro_factura, id_proveedor, fecha_factura, observaciones, fecha_carga)
-            VALUES (?, ?, ?, ?, ?, datetime('now'))
-        """, (
-            data['numero_lote'],
-            data['nro_factura'],
-            data['id_proveedor'],
-            data['fecha_factura'],
-            data.get('observaciones', '')
-        ))
-        
-        lote_id = cursor.lastrowid
-        
-        # Procesar cada producto del lote
-        for producto in data['productos']:
-            if producto['tipo'] == 'existente':
-                # Producto existente - solo agregar al lote
-                conn.execute("""
-                    INSERT INTO lotes_detalles (id_lote, id_producto, cantidad, precio_compra, precio_venta)
-                    VALUES (?, ?, ?, ?, ?)
-                """, (
-                    lote_id,
-                    producto['producto_existente'],
-                    producto['cantidad'],
-                    producto['precio_compra'],
-                    producto['precio_venta']
-                ))
-                
-                # Actualizar stock del producto existente
-                conn.execute("""
-                    UPDATE productos 
-                    SET stock = stock + ?, 
-                        precio_compra = ?, 
-                        precio_venta = ?
-                    WHERE id_producto = ?
-                """, (
-                    producto['cantidad'],
-                    producto['precio_compra'],
-                    producto['precio_venta'],
-                    producto['producto_existente']
-                ))
-                
-            else:
-                # Producto nuevo - crear primero el producto
-                cursor_producto = conn.execute("""
-                    INSERT INTO productos (codigo, nombre, categoria_id, subcategoria_id, marca_id, version_id, precio_compra, precio_venta, eliminado)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, 0)
-                """, (
-                    producto['codigo'],
-                    producto['nombre'],
-                    producto['categoria_id'],
-                    producto['subcategoria_id'],
-                    producto['marca_id'],
-                    producto['version_id'],
-                    producto['precio_compra'],
-                    producto['precio_venta']
-                ))
-                
-                producto_id = cursor_producto.lastrowid
-                
-                # Agregar al lote
-                conn.execute("""
-                    INSERT INTO lotes_detalles (id_lote, id_producto, cantidad, precio_compra, precio_venta)
-                    VALUES (?, ?, ?, ?, ?)
-                """, (
-                    lote_id,
-                    producto_id,
-                    producto['cantidad'],
-                    producto['precio_compra'],
-                    producto['precio_venta']
-                ))
-                
-                # Actualizar stock del producto
-                conn.execute("""
-                    UPDATE productos 
-                    SET stock = stock + ?, 
-                        precio_compra = ?, 
-                        precio_venta = ?
-                    WHERE id_producto = ?
-                """, (
-                    producto['cantidad'],
-                    producto['precio_compra'],
-                    producto['precio_venta'],
-                    producto_id
-                ))
-        
-        conn.commit()
-        conn.close()
+        lote_id = run_write(_crear_lote, data)
+        codigos.notificar()
         
         return jsonify({
             "success": True,
@@ -2909,10 +2790,40 @@ def crear_lote():
         })
         
     except Exception as e:
-        conn.close()
         print(f"Error al crear lote: {str(e)}")
         return jsonify({"success": False, "message": f"Error al crear el lote: {str(e)}"}), 500
 
+# -------------------
+# CONSULTAS LENTAS
+# -------------------
+@app.route("/admin/slow_queries")
+@admin_required
+def slow_queries():
+    """Consultas lentas recientes con su plan de ejecución"""
+    registro = app.extensions.get('query_log')
+    if registro is None:
+        flash("El registro de consultas está deshabilitado", "warning")
+        return redirect(url_for('dashboard'))
+
+    orden = request.args.get('orden', 'total_ms')
+    if orden not in ('total_ms', 'max_ms', 'count', 'slow'):
+        orden = 'total_ms'
+    return render_template("slow_queries.html",
+                           stats=registro.stats(),
+                           lentas=registro.slow_queries(),
+                           top=registro.top_queries(limit=25, order_by=orden),
+                           orden=orden)
+
+@app.route("/admin/slow_queries/limpiar", methods=["POST"])
+@admin_required
+def limpiar_slow_queries():
+    """Reinicia las estadísticas de consultas"""
+    registro = app.extensions.get('query_log')
+    if registro is not None:
+        registro.reset()
+        flash("Estadísticas de consultas reiniciadas", "success")
+    return redirect(url_for('slow_queries'))
+
 # -------------------
 # GESTIÓN DE USUARIOS
 # -------------------
@@ -2956,14 +2867,12 @@ def nuevo_usuario():
         password_hash = hashlib.sha256(password.encode()).hexdigest()
         
         # Insertar nuevo usuario
-        conn.execute("""
+        conn.close()
+        run_write(_ejecutar, """
             INSERT INTO usuarios (username, password_hash, nombre_completo, rol, activo)
             VALUES (?, ?, ?, ?, 1)
         """, (username, password_hash, nombre_completo, rol))
         
-        conn.commit()
-        conn.close()
-        
         flash("Usuario creado correctamente", "success")
         return redirect(url_for("listar_usuarios"))
     
@@ -2995,20 +2904,19 @@ def editar_usuario(id_usuario):
         if password:
             # Si se proporciona una nueva contraseña
             password_hash = hashlib.sha256(password.encode()).hexdigest()
-            conn.execute("""
+            run_write(_ejecutar, """
                 UPDATE usuarios 
                 SET nombre_completo = ?, rol = ?, activo = ?, password_hash = ?
                 WHERE id_usuario = ?
             """, (nombre_completo, rol, activo, password_hash, id_usuario))
         else:
             # Sin cambiar la contraseña
-            conn.execute("""
+            run_write(_ejecutar, """
                 UPDATE usuarios 
                 SET nombre_completo = ?, rol = ?, activo = ?
                 WHERE id_usuario = ?
             """, (nombre_completo, rol, activo, id_usuario))
         
-        conn.commit()
         conn.close()
         
         flash("Usuario actualizado correctamente", "success")
@@ -3031,9 +2939,8 @@ def eliminar_usuario(id_usuario):
         return redirect(url_for("listar_usuarios"))
     
     # Desactivar usuario
-    conn.execute("UPDATE usuarios SET activo = 0 WHERE id_usuario = ?", (id_usuario,))
-    conn.commit()
     conn.close()
+    run_write(_ejecutar, "UPDATE usuarios SET activo = 0 WHERE id_usuario = ?", (id_usuario,))
     
     flash("Usuario desactivado correctamente", "success")
     return redirect(url_for("listar_usuarios"))
@@ -3046,14 +2953,14 @@ def api_usuarios():
     """Endpoint para sincronizar usuarios con el POS"""
     try:
         conn = get_db_connection()
-        usuarios = conn.execute("""
+        respuesta = serializer.query_response(conn, """
             SELECT username, password_hash, nombre_completo, activo
             FROM usuarios
             WHERE activo = 1
-        """).fetchall()
+        """)
         conn.close()
         
-        return jsonify([dict(usuario) for usuario in usuarios])
+        return respuesta
         
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -3075,10 +2982,16 @@ if __name__ == "__main__":
         port = int(os.environ.get('PORT', 5000))
         debug = app.config.get('DEBUG', False)
         
-        app.run(debug=debug, 
-                host='0.0.0.0',  # Permitir conexiones externas
-                port=port, 
-                use_reloader=False)  # Desactivar reloader para evitar problemas
+        if app.config.get('ASYNC_API_ENABLED', False):
+            # API del POS en asyncio, el resto de Flask en un pool de hilos acotado
+            import api_async
+            print("⚡ Modo asíncrono activado para la API del POS")
+            api_async.run(app, host='0.0.0.0', port=port)
+        else:
+            app.run(debug=debug, 
+                    host='0.0.0.0',  # Permitir conexiones externas
+                    port=port, 
+                    use_reloader=False)  # Desactivar reloader para evitar problemas
     except KeyboardInterrupt:
         print("\n🛑 Servidor detenido por el usuario")
     except Exception as e:
@@ -0,0 +1,8 @@
+"""
+Punto de entrada ASGI: uvicorn asgi:application
+"""
+
+from app import app
+from api_async import create_asgi_app
+
+application = create_asgi_app(app)
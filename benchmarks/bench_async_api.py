@@ -0,0 +1,148 @@
+"""
+Benchmark de concurrencia de la API del POS: hilos vs. asyncio.
+
+Simula N cajas conectadas a la vez; cada una hace M pedidos que alternan
+una búsqueda por código y el alta de una venta. Cada pedido incluye una
+espera de red (cliente lento, WAN) durante la que el servidor no trabaja.
+
+- hilos (pool): un servidor WSGI con un pool fijo de hilos; la espera de
+  red ocupa el hilo.
+- hilos (uno por caja): sin límite de hilos, uno por conexión.
+- asyncio: el esquema de api_async; la espera de red es una corrutina,
+  las lecturas van a un DBExecutor de pocos hilos y las escrituras al
+  escritor único, esperando su Future.
+
+Uso: python benchmarks/bench_async_api.py [cajas] [pedidos_por_caja] [espera_red_ms]
+"""
+
+import asyncio
+import os
+import random
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.datos import crear_base
+from utils.aio import DBExecutor, run_write
+from utils.pool import ConnectionPool
+from utils.writer import WriteQueue
+
+SQL_PRODUCTO = """
+    SELECT p.id_producto, p.codigo, p.nombre, p.precio_venta, p.stock
+    FROM productos p
+    WHERE p.codigo = ? AND p.activo = 1 AND p.eliminado = 0
+"""
+
+def buscar_producto(conn, codigo):
+    return conn.execute(SQL_PRODUCTO, (codigo,)).fetchone()
+
+def insertar_venta(conn, total):
+    cursor = conn.execute("""
+        INSERT INTO ventas (total, efectivo, usuario_id, fecha_venta, eliminado)
+        VALUES (?, 1, 1, datetime('now'), 0)
+    """, (total,))
+    return cursor.lastrowid
+
+class Medicion:
+    def __init__(self):
+        self.latencias = []
+        self.max_hilos = threading.active_count()
+        self._lock = threading.Lock()
+
+    def agregar(self, segundos):
+        with self._lock:
+            self.latencias.append(segundos)
+            self.max_hilos = max(self.max_hilos, threading.active_count())
+
+    def resumen(self, total_s):
+        lat = sorted(self.latencias)
+        p = lambda q: lat[min(len(lat) - 1, int(len(lat) * q))] * 1000
+        return {'pedidos_s': len(lat) / total_s, 'p50': p(0.50), 'p95': p(0.95),
+                'p99': p(0.99), 'hilos': self.max_hilos}
+
+def pedido_sync(pool, writer, codigos, espera, i):
+    time.sleep(espera)  # lectura del pedido desde la red
+    if i % 2:
+        return writer.run(insertar_venta, round(random.uniform(100, 5000), 2))
+    conn = pool.acquire()
+    try:
+        return buscar_producto(conn, random.choice(codigos))
+    finally:
+        conn.close()
+
+def correr_hilos(pool, writer, codigos, cajas, pedidos, espera, hilos):
+    medicion = Medicion()
+
+    inicio = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=hilos) as executor:
+        # Cada caja envía su siguiente pedido cuando recibe la respuesta del anterior;
+        # la latencia incluye la espera por un hilo libre
+        def caja(_):
+            for i in range(pedidos):
+                enviado = time.perf_counter()
+                executor.submit(pedido_sync, pool, writer, codigos, espera, i).result()
+                medicion.agregar(time.perf_counter() - enviado)
+        with ThreadPoolExecutor(max_workers=cajas) as clientes:
+            list(clientes.map(caja, range(cajas)))
+    total = time.perf_counter() - inicio
+    # Los hilos de las cajas son del cliente simulado, no del servidor
+    medicion.max_hilos -= cajas
+    return medicion.resumen(total)
+
+def correr_asyncio(pool, writer, codigos, cajas, pedidos, espera, workers):
+    medicion = Medicion()
+    db = DBExecutor(pool, workers)
+
+    async def atender(i):
+        await asyncio.sleep(espera)
+        if i % 2:
+            await run_write(writer, insertar_venta, round(random.uniform(100, 5000), 2))
+        else:
+            await db.run(buscar_producto, random.choice(codigos))
+
+    async def caja():
+        for i in range(pedidos):
+            inicio = time.perf_counter()
+            await atender(i)
+            medicion.agregar(time.perf_counter() - inicio)
+
+    async def todas():
+        await asyncio.gather(*(caja() for _ in range(cajas)))
+
+    inicio = time.perf_counter()
+    asyncio.run(todas())
+    total = time.perf_counter() - inicio
+    db.shutdown()
+    return medicion.resumen(total)
+
+def main():
+    cajas = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    pedidos = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    espera = (float(sys.argv[3]) if len(sys.argv) > 3 else 20) / 1000
+
+    print("Generando base sintética...")
+    db_path = crear_base(productos=20000, ventas=1000)
+    pool = ConnectionPool(db_path, size=16)
+    writer = WriteQueue(db_path)
+    writer.start()
+    conn = pool.acquire()
+    codigos = [r[0] for r in conn.execute("SELECT codigo FROM productos").fetchall()]
+    conn.close()
+
+    print(f"\n{cajas} cajas x {pedidos} pedidos, {espera * 1000:.0f} ms de red por pedido")
+    print(f"\n{'Modo':<24}{'Pedidos/s':>11}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'Hilos':>8}")
+    print("-" * 70)
+    for nombre, fn in [('hilos (pool de 16)', lambda: correr_hilos(pool, writer, codigos, cajas, pedidos, espera, 16)),
+                       ('hilos (uno por caja)', lambda: correr_hilos(pool, writer, codigos, cajas, pedidos, espera, cajas)),
+                       ('asyncio (4 workers)', lambda: correr_asyncio(pool, writer, codigos, cajas, pedidos, espera, 4))]:
+        r = fn()
+        print(f"{nombre:<24}{r['pedidos_s']:>11.0f}{r['p50']:>9.1f}{r['p95']:>9.1f}{r['p99']:>9.1f}{r['hilos']:>8}")
+
+    writer.stop()
+    pool.close_all()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,109 @@
+"""
+Benchmark de la búsqueda por código de barras (escaneos del POS).
+
+Compara la consulta anterior (una conexión y productos.api_por_codigo por
+escaneo) con el índice en memoria de utils.codigos: escaneos sueltos,
+lotes de códigos y escaneos mientras otro hilo escribe stock y notifica
+(cada notificación obliga a aplicar los cambios antes del próximo escaneo).
+
+Uso: python benchmarks/bench_codigos.py [productos] [escaneos]
+"""
+
+import os
+import random
+import sqlite3
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.datos import crear_base
+from utils import codigos, migrations, queries
+
+LOTE = 100
+
+def conectar(db_path):
+    conn = sqlite3.connect(db_path, check_same_thread=False)
+    conn.row_factory = sqlite3.Row
+    return conn
+
+def por_segundo(n, fn):
+    inicio = time.perf_counter()
+    fn()
+    segundos = time.perf_counter() - inicio
+    return n / segundos, segundos * 1e6 / n
+
+def informe(nombre, n, fn):
+    tasa, us = por_segundo(n, fn)
+    print(f"{nombre:<38}{tasa:>14,.0f}{us:>12.2f}")
+
+def main():
+    productos = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    escaneos = int(sys.argv[2]) if len(sys.argv) > 2 else 20000
+
+    print(f"Generando base sintética ({productos} productos)...")
+    db_path = crear_base(productos=productos, ventas=1000)
+    migrations.apply_migrations(db_path)
+
+    conn = conectar(db_path)
+    todos = [row[0] for row in conn.execute("SELECT codigo FROM productos WHERE activo = 1 AND eliminado = 0")]
+    ids = [row[0] for row in conn.execute("SELECT id_producto FROM productos")]
+    conn.close()
+    rnd = random.Random(42)
+    # Uno de cada diez escaneos es un código desconocido
+    muestra = [rnd.choice(todos) if i % 10 else f"999{i:010d}" for i in range(escaneos)]
+
+    indice = codigos.CodeIndex(lambda: conectar(db_path))
+    inicio = time.perf_counter()
+    indice.actualizar()
+    print(f"Carga del índice: {(time.perf_counter() - inicio) * 1000:.0f} ms, {len(indice)} códigos\n")
+
+    print(f"{'Búsqueda':<38}{'Códigos/s':>14}{'µs/código':>12}")
+    print("-" * 64)
+
+    def consulta_por_escaneo():
+        for codigo in muestra[:escaneos // 10]:
+            c = conectar(db_path)
+            queries.fetchall(c, 'productos.api_por_codigo', (codigo,))
+            c.close()
+    informe("Consulta por escaneo (antes)", escaneos // 10, consulta_por_escaneo)
+
+    def indice_por_escaneo():
+        for codigo in muestra:
+            indice.get(codigo)
+    informe("Índice, de a un código", escaneos, indice_por_escaneo)
+
+    def indice_por_lote():
+        for i in range(0, escaneos, LOTE):
+            indice.get_many(muestra[i:i + LOTE])
+    informe(f"Índice, lotes de {LOTE}", escaneos, indice_por_lote)
+
+    # Escrituras concurrentes: ventas que descuentan stock y notifican
+    fin = threading.Event()
+    escrituras = [0]
+
+    def escritor():
+        c = conectar(db_path)
+        while not fin.is_set():
+            id_producto = rnd.choice(ids)
+            c.execute("UPDATE productos SET stock = stock - 1 WHERE id_producto = ?", (id_producto,))
+            c.commit()
+            indice.notificar([id_producto])
+            escrituras[0] += 1
+            time.sleep(0.005)
+        c.close()
+
+    def indice_con_escrituras():
+        for _ in range(10):
+            indice_por_escaneo()
+
+    hilo = threading.Thread(target=escritor, daemon=True)
+    hilo.start()
+    informe("Índice, con escrituras concurrentes", escaneos * 10, indice_con_escrituras)
+    fin.set()
+    hilo.join()
+    print(f"\n{escrituras[0]} escrituras durante la última medición; {indice.stats()}")
+
+if __name__ == '__main__':
+    main()
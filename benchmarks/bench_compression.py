@@ -0,0 +1,129 @@
+"""
+Benchmark de compresión del payload de sincronización con los POS.
+
+Arma el push completo del catálogo (catalog_sync.payload con desde = 0)
+y lo envía por HTTP a un servidor WSGI local detrás de
+compression.DecompressMiddleware, a través de un enlace limitado: el
+cliente escribe a la tasa del enlace y suma un RTT por conexión y otro
+por la respuesta. El tiempo de punta a punta incluye comprimir, enviar,
+descomprimir y decodificar el JSON en el servidor.
+
+zstd se mide solo si está instalado el paquete zstandard.
+
+Uso: python benchmarks/bench_compression.py [productos] [mbit_por_segundo] [rtt_ms]
+"""
+
+import json
+import os
+import socket
+import sqlite3
+import sys
+import threading
+import time
+from wsgiref.simple_server import make_server, WSGIRequestHandler
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.datos import crear_base
+from utils import catalog_sync, compression, migrations, serializer
+
+BLOQUE = 16 * 1024
+
+class _SinLog(WSGIRequestHandler):
+    def log_message(self, *args):
+        pass
+
+def app_sync(environ, start_response):
+    """Como /api/sync: lee el cuerpo (ya descomprimido) y lo decodifica"""
+    cuerpo = environ['wsgi.input'].read(int(environ.get('CONTENT_LENGTH') or 0))
+    productos = len(json.loads(cuerpo)['productos'])
+    respuesta = json.dumps({'status': 'success', 'productos': productos}).encode('utf-8')
+    start_response('200 OK', [('Content-Type', 'application/json'),
+                              ('Content-Length', str(len(respuesta)))])
+    return [respuesta]
+
+def iniciar_servidor():
+    servidor = make_server('127.0.0.1', 0, compression.DecompressMiddleware(app_sync),
+                           handler_class=_SinLog)
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    return servidor
+
+def enviar(puerto, cuerpo: bytes, encoding, bytes_por_segundo: float, rtt: float):
+    """POST por un enlace limitado; retorna la respuesta del servidor"""
+    time.sleep(rtt)  # establecimiento de la conexión
+    sock = socket.create_connection(('127.0.0.1', puerto))
+    try:
+        cabeceras = (f"POST /api/sync HTTP/1.1\r\nHost: bench\r\n"
+                     f"Content-Type: application/json\r\nContent-Length: {len(cuerpo)}\r\n")
+        if encoding:
+            cabeceras += f"Content-Encoding: {encoding}\r\n"
+        datos = (cabeceras + "Connection: close\r\n\r\n").encode('latin-1') + cuerpo
+        inicio = time.perf_counter()
+        for desde in range(0, len(datos), BLOQUE):
+            bloque = datos[desde:desde + BLOQUE]
+            sock.sendall(bloque)
+            # Se respeta la tasa del enlace acumulada desde el inicio
+            atraso = (desde + len(bloque)) / bytes_por_segundo - (time.perf_counter() - inicio)
+            if atraso > 0:
+                time.sleep(atraso)
+        respuesta = b''
+        while True:
+            parte = sock.recv(65536)
+            if not parte:
+                break
+            respuesta += parte
+    finally:
+        sock.close()
+    time.sleep(rtt / 2)  # vuelta de la respuesta
+    return respuesta
+
+def medir(puerto, json_cuerpo: bytes, encoding, nivel, bytes_por_segundo, rtt):
+    if encoding == compression.GZIP:
+        compression.GZIP_LEVEL = nivel
+    elif encoding == compression.ZSTD:
+        compression.ZSTD_LEVEL = nivel
+
+    inicio = time.perf_counter()
+    cuerpo = compression.compress(json_cuerpo, encoding) if encoding else json_cuerpo
+    comprimir_ms = (time.perf_counter() - inicio) * 1000
+    respuesta = enviar(puerto, cuerpo, encoding, bytes_por_segundo, rtt)
+    total_ms = (time.perf_counter() - inicio) * 1000
+    assert b'200 OK' in respuesta.split(b'\r\n', 1)[0], respuesta[:200]
+    return len(cuerpo), comprimir_ms, total_ms
+
+def main():
+    productos = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    mbit = float(sys.argv[2]) if len(sys.argv) > 2 else 10.0
+    rtt = (float(sys.argv[3]) if len(sys.argv) > 3 else 40.0) / 1000
+
+    print(f"Generando base sintética ({productos} productos)...")
+    db_path = crear_base(productos=productos, ventas=100)
+    migrations.apply_migrations(db_path)
+    conn = sqlite3.connect(db_path)
+    json_cuerpo = serializer.dumps(catalog_sync.payload(conn, 0, catalog_sync.version_actual(conn)))
+    conn.close()
+
+    servidor = iniciar_servidor()
+    puerto = servidor.server_address[1]
+    bytes_por_segundo = mbit * 1_000_000 / 8
+
+    variantes = [(None, 0), (compression.GZIP, 1), (compression.GZIP, 6)]
+    if compression.zstandard is not None:
+        variantes += [(compression.ZSTD, 3), (compression.ZSTD, 10)]
+    else:
+        print("(zstandard no instalado: se omite zstd)")
+
+    print(f"\nPayload: {len(json_cuerpo) / 1024:.0f} KB JSON, enlace {mbit:g} Mbit/s, RTT {rtt * 1000:.0f} ms")
+    print(f"\n{'Codificación':<16}{'Bytes':>12}{'Ratio':>8}{'Comprimir ms':>14}{'Total ms':>12}{'Mejora':>9}")
+    print("-" * 71)
+    base_ms = None
+    for encoding, nivel in variantes:
+        size, comprimir_ms, total_ms = medir(puerto, json_cuerpo, encoding, nivel, bytes_por_segundo, rtt)
+        base_ms = base_ms or total_ms
+        nombre = f"{encoding}-{nivel}" if encoding else 'identity'
+        print(f"{nombre:<16}{size:>12}{len(json_cuerpo) / size:>7.1f}x{comprimir_ms:>14.1f}"
+              f"{total_ms:>12.0f}{base_ms / total_ms:>8.1f}x")
+    servidor.shutdown()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,102 @@
+"""
+Benchmark de los índices de rendimiento (migración 1).
+
+Genera una base sintética, mide las consultas de reportes sin índices,
+aplica las migraciones y vuelve a medir.
+
+Uso: python benchmarks/bench_indices.py [productos] [ventas]
+"""
+
+import os
+import sqlite3
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.datos import crear_base
+from utils.migrations import apply_migrations
+
+CONSULTAS = {
+    'reporte_ventas (rango de fechas)': ("""
+        SELECT v.id_venta, v.fecha_venta, c.nombre, COUNT(vd.id_detalle), v.total
+        FROM ventas v
+        LEFT JOIN clientes c ON v.cliente_id = c.id_cliente
+        LEFT JOIN detalles_venta vd ON v.id_venta = vd.venta_id
+        WHERE v.fecha_venta >= datetime('now', '-7 days')
+        GROUP BY v.id_venta
+        ORDER BY v.fecha_venta DESC
+    """, ()),
+    'reporte_ganancias': ("""
+        SELECT p.nombre, SUM(vd.cantidad), SUM(vd.cantidad * vd.precio_unitario),
+               SUM(vd.cantidad * vd.precio_unitario - vd.cantidad * COALESCE(
+                   (SELECT AVG(ld.precio_compra) FROM lotes_detalles ld
+                    WHERE ld.id_producto = p.id_producto), 0)) AS ganancia
+        FROM detalles_venta vd
+        JOIN productos p ON vd.producto_id = p.id_producto
+        JOIN ventas v ON vd.venta_id = v.id_venta
+        WHERE v.eliminado = 0
+        GROUP BY p.id_producto
+        ORDER BY ganancia DESC
+    """, ()),
+    'listar_clientes': ("""
+        SELECT c.*, COUNT(v.id_venta), COALESCE(SUM(v.total), 0)
+        FROM clientes c
+        LEFT JOIN ventas v ON c.id_cliente = v.cliente_id
+        GROUP BY c.id_cliente
+        ORDER BY c.nombre
+    """, ()),
+    'ver_venta (detalles)': ("""
+        SELECT vd.*, p.codigo, p.nombre
+        FROM detalles_venta vd
+        JOIN productos p ON vd.producto_id = p.id_producto
+        WHERE vd.venta_id = ?
+        ORDER BY p.nombre
+    """, (1234,)),
+    'detalle de lote': ("""
+        SELECT ld.*, p.nombre FROM lotes_detalles ld
+        JOIN productos p ON ld.id_producto = p.id_producto
+        WHERE ld.id_lote = ?
+    """, (42,)),
+    'productos activos': ("""
+        SELECT id_producto, nombre, precio_venta FROM productos
+        WHERE eliminado = 0 AND activo = 1
+        ORDER BY nombre LIMIT 50
+    """, ()),
+}
+
+def medir(db_path, repeticiones=3):
+    """Mediana en ms de cada consulta"""
+    conn = sqlite3.connect(db_path)
+    resultados = {}
+    for nombre, (sql, params) in CONSULTAS.items():
+        tiempos = []
+        for _ in range(repeticiones):
+            inicio = time.perf_counter()
+            conn.execute(sql, params).fetchall()
+            tiempos.append((time.perf_counter() - inicio) * 1000)
+        tiempos.sort()
+        resultados[nombre] = tiempos[len(tiempos) // 2]
+    conn.close()
+    return resultados
+
+def main():
+    productos = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    ventas = int(sys.argv[2]) if len(sys.argv) > 2 else 10000
+
+    print(f"Generando base sintética ({productos} productos, {ventas} ventas)...")
+    db_path = crear_base(productos=productos, ventas=ventas)
+
+    antes = medir(db_path)
+    aplicadas = apply_migrations(db_path)
+    print(f"Migraciones aplicadas: {aplicadas}")
+    despues = medir(db_path)
+
+    print(f"\n{'Consulta':<36}{'Antes (ms)':>12}{'Después (ms)':>14}{'Mejora':>10}")
+    print("-" * 72)
+    for nombre in CONSULTAS:
+        mejora = antes[nombre] / despues[nombre] if despues[nombre] else float('inf')
+        print(f"{nombre:<36}{antes[nombre]:>12.2f}{despues[nombre]:>14.2f}{mejora:>9.1f}x")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,104 @@
+"""
+Benchmark de ingesta de ventas del POS (/api/ventas/batch).
+
+Compara el camino por fila (un INSERT por venta, otro por item y un
+UPDATE de stock por item, como _registrar_venta) con utils.ingest: validación previa,
+executemany en una sola transacción, stock agregado por producto y mapeo
+idempotente (POS, id_venta). También mide el reenvío del mismo lote,
+que debe devolver todas las ventas como duplicadas sin escribir nada.
+
+Como en un comercio real, la mayoría de los items sale de pocos productos
+(80% de los items entre los POPULARES más vendidos). Cada UPDATE de stock
+dispara los triggers de versión y outbox del catálogo, así que agregar el
+descuento por producto es lo que más pesa.
+
+Uso: python benchmarks/bench_ingest.py [ventas] [items_por_venta] [tamaño_lote]
+"""
+
+import os
+import random
+import sqlite3
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.datos import crear_base
+from utils import ingest, migrations
+
+POS = 1
+POPULARES = 300
+
+def generar_ventas(cantidad, items_por_venta, productos, semilla=7):
+    rnd = random.Random(semilla)
+    ventas = []
+    for id_venta in range(1, cantidad + 1):
+        items = [{'id_producto': rnd.randint(1, POPULARES if rnd.random() < 0.8 else productos),
+                  'cantidad': rnd.randint(1, 5),
+                  'precio_unitario': round(rnd.uniform(100, 5000), 2)}
+                 for _ in range(items_por_venta)]
+        ventas.append({
+            'id_venta': id_venta, 'fecha_venta': '2024-05-01 10:00:00', 'id_usuario': 1,
+            'total': round(sum(i['cantidad'] * i['precio_unitario'] for i in items), 2),
+            'metodo_pago': 'efectivo', 'items': items,
+        })
+    return ventas
+
+def por_fila(conn, ventas):
+    """Una sentencia por venta y dos por item, un commit por lote"""
+    for venta in ventas:
+        cursor = conn.execute("""
+            INSERT INTO ventas (fecha_venta, total, usuario_id, sincronizado, fecha_sincronizacion)
+            VALUES (?, ?, ?, 1, CURRENT_TIMESTAMP)
+        """, (venta['fecha_venta'], venta['total'], venta['id_usuario']))
+        for item in venta['items']:
+            conn.execute("""
+                INSERT INTO detalles_venta (venta_id, producto_id, cantidad, precio_unitario, subtotal)
+                VALUES (?, ?, ?, ?, ?)
+            """, (cursor.lastrowid, item['id_producto'], item['cantidad'], item['precio_unitario'],
+                  item['cantidad'] * item['precio_unitario']))
+            conn.execute("UPDATE productos SET stock = stock - ? WHERE id_producto = ?",
+                         (item['cantidad'], item['id_producto']))
+    conn.commit()
+
+def en_lote(conn, ventas):
+    validas, resultados = ingest.validar_lote(conn, ventas)
+    resultados.update(ingest.ingerir_ventas(conn, POS, validas))
+    conn.commit()
+    return ingest.respuesta(ventas, resultados)
+
+def medir(nombre, fn, conn, ventas, lote):
+    inicio = time.perf_counter()
+    ultimo = None
+    for desde in range(0, len(ventas), lote):
+        ultimo = fn(conn, ventas[desde:desde + lote])
+    segundos = time.perf_counter() - inicio
+    print(f"{nombre:<28}{segundos * 1000:>10.0f}{len(ventas) / segundos:>14.0f}")
+    return ultimo
+
+def main():
+    cantidad = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    items_por_venta = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+    lote = int(sys.argv[3]) if len(sys.argv) > 3 else 500
+    productos = 20000
+
+    print(f"Generando base sintética ({productos} productos)...")
+    db_path = crear_base(productos=productos, ventas=1000)
+    migrations.apply_migrations(db_path)
+    ventas = generar_ventas(cantidad, items_por_venta, productos)
+
+    print(f"\n{cantidad} ventas x {items_por_venta} items, lotes de {lote}")
+    print(f"\n{'Camino':<28}{'Total ms':>10}{'Ventas/s':>14}")
+    print("-" * 52)
+    conn = sqlite3.connect(db_path)
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.execute("PRAGMA synchronous = NORMAL")
+    medir('por fila', por_fila, conn, ventas, lote)
+    resumen = medir('ingest (executemany)', en_lote, conn, ventas, lote)
+    assert resumen['insertadas'] == len(resumen['resultados']), resumen['resultados'][:3]
+    resumen = medir('ingest (reenvío duplicado)', en_lote, conn, ventas, lote)
+    assert resumen['duplicadas'] == len(resumen['resultados'])
+    conn.close()
+
+if __name__ == '__main__':
+    main()
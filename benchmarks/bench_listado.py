@@ -0,0 +1,76 @@
+"""
+Benchmark del listado de productos del admin.
+
+Compara la consulta anterior (todos los productos activos con los cuatro
+JOIN de la taxonomía y cinco columnas de orden) con la paginación por
+keyset de utils.listado: primera página, una página en la mitad del
+catálogo y la última, para cada orden. Con los índices de la migración 7
+las tres deberían costar lo mismo sin importar el tamaño del catálogo.
+
+Uso: python benchmarks/bench_listado.py [productos] [tamaño_página]
+"""
+
+import os
+import sqlite3
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.datos import crear_base
+from utils import listado, migrations, queries
+
+LISTADO_COMPLETO = """
+    SELECT p.id_producto, p.codigo, p.nombre, c.nombre, s.nombre, m.nombre, v.nombre,
+           p.precio_compra, p.precio_venta, p.stock, p.es_pesable, p.unidad_medida,
+           p.ultima_sincronizacion
+    FROM productos p
+    LEFT JOIN categorias c ON p.categoria_id = c.id_categoria
+    LEFT JOIN subcategorias s ON p.subcategoria_id = s.id_subcategoria
+    LEFT JOIN marcas m ON p.marca_id = m.id_marca
+    LEFT JOIN versiones v ON p.version_id = v.id_version
+    WHERE p.activo = 1 AND p.eliminado = 0
+    ORDER BY c.nombre, s.nombre, m.nombre, v.nombre, p.nombre
+"""
+
+SIN_FILTROS = {'categoria_id': None, 'subcategoria_id': None, 'marca_id': None,
+               'version_id': None, 'es_pesable': None}
+
+def ms(fn):
+    inicio = time.perf_counter()
+    fn()
+    return (time.perf_counter() - inicio) * 1000
+
+def cursores(conn, orden, limite):
+    """Cursor de cada página recorriendo el listado completo"""
+    resultado, cursor = [None], None
+    while True:
+        pagina = listado.pagina(conn, SIN_FILTROS, orden, 'asc', cursor, limite)
+        if not pagina['mas']:
+            return resultado
+        cursor = pagina['cursor']
+        resultado.append(cursor)
+
+def main():
+    productos = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    limite = int(sys.argv[2]) if len(sys.argv) > 2 else listado.LIMITE
+
+    print(f"Generando base sintética ({productos} productos)...")
+    db_path = crear_base(productos=productos, ventas=1000)
+    migrations.apply_migrations(db_path)
+    conn = sqlite3.connect(db_path)
+    conn.row_factory = sqlite3.Row
+
+    print(f"\nListado completo (antes): {ms(lambda: conn.execute(LISTADO_COMPLETO).fetchall()):.1f} ms")
+    print(f"\nPáginas de {limite} productos")
+    print(f"{'Orden':<10}{'Páginas':>9}{'Primera ms':>12}{'Mitad ms':>10}{'Última ms':>11}")
+    print("-" * 52)
+    for orden in queries.ADMIN_ORDENES:
+        paginas = cursores(conn, orden, limite)
+        tiempos = [ms(lambda c=c: listado.pagina(conn, SIN_FILTROS, orden, 'asc', c, limite))
+                   for c in (paginas[0], paginas[len(paginas) // 2], paginas[-1])]
+        print(f"{orden:<10}{len(paginas):>9}{tiempos[0]:>12.2f}{tiempos[1]:>10.2f}{tiempos[2]:>11.2f}")
+    conn.close()
+
+if __name__ == '__main__':
+    main()
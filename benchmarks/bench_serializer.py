@@ -0,0 +1,93 @@
+"""
+Microbenchmark de serialización JSON del catálogo de productos.
+
+Compara el camino anterior (sqlite3.Row -> dict(row) -> json con sort_keys,
+como hace jsonify) con utils.serializer: tuplas + description con el
+encoder de Python, y JSON armado por SQLite, en formato por filas y columnar.
+
+Uso: python benchmarks/bench_serializer.py [productos]
+"""
+
+import json
+import os
+import sqlite3
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.datos import crear_base
+from utils import serializer
+
+SQL = """
+    SELECT
+        p.id_producto, p.codigo, p.nombre, p.categoria_id, p.subcategoria_id,
+        p.marca_id, p.version_id, p.precio_compra, p.precio_venta, p.stock,
+        p.es_pesable, p.venta_por_peso, p.unidad_medida, p.activo, p.eliminado, p.fecha_creacion
+    FROM productos p
+    WHERE p.activo = 1 AND p.eliminado = 0
+    ORDER BY p.nombre
+"""
+
+def camino_anterior(conn):
+    conn.row_factory = sqlite3.Row
+    productos = conn.execute(SQL).fetchall()
+    productos_dict = []
+    for p in productos:
+        producto_dict = dict(p)
+        producto_dict['precio'] = producto_dict.get('precio_venta', 0)
+        productos_dict.append(producto_dict)
+    # Opciones por defecto del proveedor JSON de Flask 2.3
+    return json.dumps(productos_dict, sort_keys=True, ensure_ascii=True,
+                      separators=(',', ':')).encode('utf-8')
+
+def tuplas_filas(conn):
+    columns, rows = serializer.fetch_rows(conn, SQL)
+    return serializer.dumps(serializer.payload(columns, rows))
+
+def tuplas_columnar(conn):
+    columns, rows = serializer.fetch_rows(conn, SQL)
+    return serializer.dumps(serializer.payload(columns, rows, serializer.FORMATO_COLUMNAR))
+
+def sqlite_filas(conn):
+    return serializer.sql_json(conn, SQL)[0].encode('utf-8')
+
+def sqlite_columnar(conn):
+    return serializer.sql_json(conn, SQL, formato=serializer.FORMATO_COLUMNAR)[0].encode('utf-8')
+
+def medir(fn, conn, repeticiones=7):
+    tiempos = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        cuerpo = fn(conn)
+        tiempos.append((time.perf_counter() - inicio) * 1000)
+    tiempos.sort()
+    return tiempos[len(tiempos) // 2], len(cuerpo)
+
+def main():
+    productos = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    print(f"Generando base sintética ({productos} productos)...")
+    db_path = crear_base(productos=productos, ventas=100)
+    conn = sqlite3.connect(db_path)
+
+    # Las variantes deben producir los mismos datos
+    esperado = json.loads(camino_anterior(conn))
+    for fila in esperado:
+        del fila['precio']
+    assert json.loads(sqlite_filas(conn)) == esperado
+    assert json.loads(tuplas_filas(conn)) == esperado
+
+    base_ms = None
+    print(f"\n{'Camino':<24}{'Mediana (ms)':>14}{'Bytes':>12}{'Mejora':>10}")
+    print("-" * 60)
+    for nombre, fn in [('anterior (Row + dict)', camino_anterior),
+                       ('tuplas filas', tuplas_filas),
+                       ('tuplas columnar', tuplas_columnar),
+                       ('sqlite filas', sqlite_filas),
+                       ('sqlite columnar', sqlite_columnar)]:
+        ms, size = medir(fn, conn)
+        base_ms = base_ms or ms
+        print(f"{nombre:<24}{ms:>14.2f}{size:>12}{base_ms / ms:>9.1f}x")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,83 @@
+"""
+Generador de bases de datos sintéticas para los benchmarks
+"""
+
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+from contextlib import redirect_stdout
+from io import StringIO
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import setup_db
+
+def crear_base(directorio=None, productos=20000, ventas=50000, items_por_venta=3,
+               clientes=2000, lotes=300, semilla=42):
+    """Crea una base con el esquema de setup_db.py y datos aleatorios; retorna la ruta"""
+    directorio = directorio or tempfile.mkdtemp(prefix="bench_admin_")
+    cwd = os.getcwd()
+    try:
+        os.chdir(directorio)
+        with redirect_stdout(StringIO()):
+            setup_db.setup_database()
+    finally:
+        os.chdir(cwd)
+
+    db_path = os.path.join(directorio, "db", "admin_database.db")
+    rnd = random.Random(semilla)
+    conn = sqlite3.connect(db_path)
+
+    conn.executemany("INSERT INTO subcategorias (nombre, categoria_id) VALUES (?, ?)",
+                     [(f"Subcategoria {i}", rnd.randint(1, 5)) for i in range(50)])
+    conn.executemany("INSERT INTO marcas (nombre, subcategoria_id) VALUES (?, ?)",
+                     [(f"Marca {i}", rnd.randint(1, 50)) for i in range(200)])
+    conn.executemany("INSERT INTO versiones (nombre, marca_id) VALUES (?, ?)",
+                     [(f"Version {i}", rnd.randint(1, 200)) for i in range(400)])
+
+    conn.executemany("""
+        INSERT INTO productos (codigo, nombre, categoria_id, subcategoria_id, marca_id, version_id,
+                               precio_compra, precio_venta, stock, es_pesable, activo, eliminado)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    """, [(
+        f"{7790000000000 + i}", f"Producto {i:06d}", rnd.randint(1, 5), rnd.randint(1, 50),
+        rnd.randint(1, 200), rnd.randint(1, 400), round(rnd.uniform(10, 500), 2),
+        round(rnd.uniform(20, 900), 2), rnd.randint(0, 200), int(rnd.random() < 0.1),
+        int(rnd.random() < 0.95), int(rnd.random() < 0.03)
+    ) for i in range(productos)])
+
+    conn.executemany("INSERT OR IGNORE INTO clientes (dni, nombre, apellido) VALUES (?, ?, ?)",
+                     [(f"{30000000 + i}", f"Nombre {i}", f"Apellido {i}") for i in range(clientes)])
+
+    conn.executemany("""
+        INSERT INTO ventas (total, efectivo, usuario_id, cliente_id, fecha_venta, eliminado)
+        VALUES (?, ?, 1, ?, datetime('now', ?), ?)
+    """, [(
+        round(rnd.uniform(100, 5000), 2), 1, rnd.randint(1, clientes) if rnd.random() < 0.6 else None,
+        f"-{rnd.randint(0, 365)} days", int(rnd.random() < 0.02)
+    ) for _ in range(ventas)])
+
+    detalles = []
+    for venta_id in range(1, ventas + 1):
+        for _ in range(rnd.randint(1, items_por_venta * 2 - 1)):
+            cantidad = rnd.randint(1, 5)
+            precio = round(rnd.uniform(20, 900), 2)
+            detalles.append((venta_id, rnd.randint(1, productos), cantidad, precio, cantidad * precio))
+    conn.executemany("""
+        INSERT INTO detalles_venta (venta_id, producto_id, cantidad, precio_unitario, subtotal)
+        VALUES (?, ?, ?, ?, ?)
+    """, detalles)
+
+    conn.executemany("INSERT INTO lotes (numero_lote, nro_factura, id_proveedor) VALUES (?, ?, 1)",
+                     [(f"LOTE-{i:05d}", f"F-{i}") for i in range(lotes)])
+    conn.executemany("""
+        INSERT INTO lotes_detalles (id_lote, id_producto, cantidad, precio_compra, precio_venta)
+        VALUES (?, ?, ?, ?, ?)
+    """, [(rnd.randint(1, lotes), rnd.randint(1, productos), rnd.randint(1, 50),
+           round(rnd.uniform(10, 500), 2), round(rnd.uniform(20, 900), 2)) for _ in range(lotes * 10)])
+
+    conn.commit()
+    conn.close()
+    return db_path
@@ -5,6 +5,51 @@ class Config:
     SECRET_KEY = os.environ.get('SECRET_KEY') or 'dev-secret-key-change-in-production'
     DATABASE_PATH = os.environ.get('DATABASE_PATH') or os.path.join("db", "admin_database.db")
     
+    # Backend de datos: 'sqlite' (DATABASE_PATH) o 'postgresql' (DATABASE_URL, requiere psycopg2)
+    DB_BACKEND = os.environ.get('DB_BACKEND', 'sqlite')
+    DATABASE_URL = os.environ.get('DATABASE_URL', 'postgresql://localhost/admin_pos')
+    PG_POOL_MIN = 1  # conexiones abiertas al iniciar (el máximo es DB_POOL_SIZE)
+    PG_ITERSIZE = 2000  # filas por tanda en los cursores del servidor (reportes)
+    PG_WRITER_WORKERS = 4  # escrituras concurrentes en PostgreSQL
+    
+    # Modo por tienda: ventas de cada POS en su propio archivo, catálogo compartido
+    SHARDING_ENABLED = os.environ.get('SHARDING', '0') == '1'
+    SHARD_DIR = os.path.join("db", "tiendas")
+    SHARD_POOL_SIZE = 5  # conexiones por tienda
+    SHARD_WORKERS = 8  # tiendas consultadas en paralelo en los reportes
+    
+    # Configuración del pool de conexiones
+    DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 10))
+    DB_POOL_TIMEOUT = 30  # segundos de espera por una conexión libre
+    DB_POOL_MAX_LIFETIME = 3600  # reciclar conexiones tras 1 hora
+    DB_POOL_HEALTH_CHECK = 60  # validar conexiones ociosas por más de 60 segundos
+    DB_CACHED_STATEMENTS = 256  # sentencias compiladas que conserva cada conexión
+    
+    # Configuración del motor de almacenamiento (WAL)
+    DB_JOURNAL_MODE = os.environ.get('DB_JOURNAL_MODE', 'WAL')
+    WAL_CHECKPOINT_INTERVAL = 30  # checkpoint PASSIVE cada 30 segundos
+    WAL_TRUNCATE_THRESHOLD = 16 * 1024 * 1024  # TRUNCATE si el WAL supera 16 MB
+    DB_BUSY_RETRIES = 5  # reintentos ante SQLITE_BUSY
+    DB_BUSY_BASE_DELAY = 0.02  # segundos, base del backoff exponencial
+    DB_BUSY_MAX_DELAY = 1.0
+    
+    # Configuración del escritor único (commit agrupado)
+    WRITER_MAX_BATCH = 64  # trabajos máximos por transacción
+    WRITER_BATCH_WINDOW = 0.0  # segundos extra para juntar trabajos (0 = solo los ya encolados)
+    
+    # Configuración del log de consultas lentas
+    QUERY_LOG_ENABLED = True
+    SLOW_QUERY_THRESHOLD_MS = float(os.environ.get('SLOW_QUERY_THRESHOLD_MS', 100))
+    SLOW_QUERY_HISTORY = 200  # consultas lentas visibles en /admin/slow_queries
+    SLOW_QUERY_LOG_FILE = os.path.join("logs", "slow_queries.log")
+    SLOW_QUERY_LOG_MAX_BYTES = 5 * 1024 * 1024
+    SLOW_QUERY_LOG_BACKUPS = 5
+    
+    # Modo asíncrono (ASGI) para la API del POS
+    ASYNC_API_ENABLED = os.environ.get('ASYNC_API', '0') == '1'
+    ASYNC_DB_WORKERS = 4  # hilos con conexión para las lecturas del event loop
+    ASYNC_WSGI_WORKERS = 8  # hilos para el resto de las rutas Flask
+    
     # Configuración de sesiones
     SESSION_COOKIE_SECURE = False
     SESSION_COOKIE_HTTPONLY = True
@@ -39,6 +84,50 @@ class Config:
     # Configuración de sincronización
     SYNC_INTERVAL = 300  # 5 minutos
     SYNC_TIMEOUT = 10  # 10 segundos
+    SYNC_CONNECT_TIMEOUT = 3  # segundos para conectar con cada cliente POS
+    SYNC_MAX_WORKERS = 16  # clientes POS sincronizados en paralelo
+    POS_HTTP_POOL_SIZE = 4  # conexiones keep-alive por POS
+    POS_HTTP_RETRIES = 2  # reintentos ante errores de red o 502/503/504
+    POS_HTTP_BACKOFF_BASE = 0.5  # segundos; backoff exponencial con jitter
+    POS_HTTP_BACKOFF_MAX = 5.0
+    POS_CIRCUIT_THRESHOLD = 3  # fallos seguidos que abren el circuito de un POS
+    POS_CIRCUIT_RESET = 60  # segundos hasta volver a probar un POS caído
+    OUTBOX_BATCH_SIZE = 500  # cambios del outbox por lote y POS
+    OUTBOX_MAX_ATTEMPTS = 5  # rechazos del mismo lote antes de pasarlo a dead letter
+    OUTBOX_BACKOFF_BASE = 30  # segundos; se duplica en cada intento fallido
+    OUTBOX_BACKOFF_MAX = 1800
+    # Canal SSE /api/eventos: los POS suscriptos reciben los cambios sin esperar SYNC_INTERVAL
+    EVENTS_POLL_INTERVAL = 0.5  # segundos entre lecturas de la versión del catálogo
+    EVENTS_MAX_PRODUCTOS = 200  # cambios que viajan en el evento; más, y el POS usa el feed
+    EVENTS_MAX_SUBSCRIBERS = 50  # cada suscripción ocupa un hilo del servidor
+    EVENTS_HEARTBEAT = 15  # segundos entre pings de una conexión sin cambios
+    # Reconciliación por árbol de hashes (/api/reconciliacion): id_producto % buckets
+    RECONCILE_BUCKETS = 1024
+    RECONCILE_GRUPO = 32  # buckets por nodo intermedio del árbol
+    RECONCILE_MAX_PRODUCTOS = 5000  # productos de reparación por respuesta
+    
+    # Compresión de requests y respuestas de la API (gzip; zstd con el paquete zstandard).
+    # Los envíos a los POS se comprimen si el POS lo anuncia con Accept-Encoding
+    COMPRESSION_ENABLED = os.environ.get('COMPRESSION', '1') == '1'
+    COMPRESSION_MIN_SIZE = 1024  # bytes; cuerpos menores van sin comprimir
+    COMPRESSION_MAX_SIZE = 64 * 1024 * 1024  # tope del cuerpo descomprimido de un request
+    
+    # Backlogs de ventas en NDJSON (/api/ventas/stream): se confirman por tandas
+    INGEST_CHUNK_SIZE = 500  # ventas por transacción
+    INGEST_MAX_LINE = 1024 * 1024  # bytes; una línea mayor se rechaza sin leerla entera
+    
+    # Caché en memoria de la taxonomía: cada cuántos segundos se relee su versión
+    # en la base para ver cambios de otros procesos (los propios invalidan al instante)
+    TAXONOMIA_CHECK_INTERVAL = 1.0
+    
+    # Caché de /api/productos/search: cada entrada se invalida además al cambiar
+    # el catálogo o la taxonomía (SQLite); el TTL es el de los navegadores también
+    SEARCH_CACHE_TTL = 30.0
+    SEARCH_CACHE_MAX = 1000  # búsquedas guardadas
+    SEARCH_BROWSER_TTL = 5  # segundos de Cache-Control en la respuesta
+    
+    # Índice de códigos de barras en memoria (escaneos de los POS)
+    CODIGOS_CHECK_INTERVAL = 0.5  # segundos entre lecturas de la versión del catálogo
     
     # Configuración de moneda
     CURRENCY = {
@@ -93,6 +93,7 @@ def init_admin_database():
         ultima_sincronizacion DATETIME,
         ultimo_error TEXT,
         activo INTEGER DEFAULT 1,
+        version_productos INTEGER DEFAULT 0,
         fecha_registro DATETIME DEFAULT CURRENT_TIMESTAMP
     )
     """)
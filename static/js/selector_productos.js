@@ -0,0 +1,199 @@
+// Selector de productos con búsqueda en el servidor (/api/productos/search).
+// Reemplaza las listas con todo el catálogo embebido en la página: se piden
+// de a una página de resultados mientras se escribe.
+
+class BuscadorProductos {
+    constructor(opciones = {}) {
+        this.url = opciones.url || '/api/productos/search';
+        this.limite = opciones.limite || 20;
+        this.conStock = !!opciones.conStock;
+        this.demora = opciones.demora ?? 200;
+        this._timer = null;
+        this._controller = null;
+    }
+
+    // Pide una página; cancela la búsqueda anterior si todavía no respondió
+    buscar(texto, pagina = 1) {
+        if (this._controller) {
+            this._controller.abort();
+        }
+        this._controller = new AbortController();
+        const params = new URLSearchParams({q: texto, limite: this.limite, pagina: pagina});
+        if (this.conStock) {
+            params.set('con_stock', '1');
+        }
+        return fetch(`${this.url}?${params}`, {signal: this._controller.signal, credentials: 'same-origin'})
+            .then(response => {
+                if (!response.ok) {
+                    throw new Error(`Error ${response.status} buscando productos`);
+                }
+                return response.json();
+            })
+            .then(respuesta => ({productos: respuesta.data, pagina: respuesta.pagina, mas: respuesta.mas}));
+    }
+
+    // Como buscar, pero espera a que se deje de escribir
+    buscarDemorado(texto, callback) {
+        clearTimeout(this._timer);
+        this._timer = setTimeout(() => {
+            this.buscar(texto)
+                .then(callback)
+                .catch(error => {
+                    if (error.name !== 'AbortError') {
+                        console.error(error);
+                    }
+                });
+        }, this.demora);
+    }
+}
+
+class SelectorProductos {
+    // input: campo de texto donde se escribe; opciones.onSelect(producto) al elegir
+    constructor(input, opciones = {}) {
+        this.input = input;
+        this.onSelect = opciones.onSelect || (() => {});
+        this.onClear = opciones.onClear || (() => {});
+        this.buscador = new BuscadorProductos(opciones);
+        this.productos = [];
+        this.activo = -1;
+        this.texto = '';
+        this.pagina = 1;
+
+        this.menu = document.createElement('div');
+        this.menu.className = 'list-group shadow-sm selector-productos-menu';
+        // Por encima de los modales de Bootstrap (z-index 1055)
+        this.menu.style.cssText = 'position: absolute; z-index: 1070; max-height: 320px; overflow-y: auto; display: none;';
+        document.body.appendChild(this.menu);
+
+        input.setAttribute('autocomplete', 'off');
+        input.addEventListener('input', () => this._escribir());
+        input.addEventListener('keydown', evento => this._tecla(evento));
+        input.addEventListener('blur', () => setTimeout(() => this.cerrar(), 150));
+        input.selectorProductos = this;
+    }
+
+    _escribir() {
+        this.onClear();
+        this.texto = this.input.value.trim();
+        if (!this.texto) {
+            this.cerrar();
+            return;
+        }
+        this.buscador.buscarDemorado(this.texto, resultado => {
+            this.productos = resultado.productos;
+            this.pagina = resultado.pagina;
+            this.activo = this.productos.length ? 0 : -1;
+            this._mostrar(resultado.mas);
+        });
+    }
+
+    _masResultados() {
+        this.buscador.buscar(this.texto, this.pagina + 1).then(resultado => {
+            this.productos = this.productos.concat(resultado.productos);
+            this.pagina = resultado.pagina;
+            this._mostrar(resultado.mas);
+            this.input.focus();
+        }).catch(error => {
+            if (error.name !== 'AbortError') {
+                console.error(error);
+            }
+        });
+    }
+
+    _tecla(evento) {
+        if (this.menu.style.display === 'none') {
+            return;
+        }
+        if (evento.key === 'ArrowDown' || evento.key === 'ArrowUp') {
+            evento.preventDefault();
+            const paso = evento.key === 'ArrowDown' ? 1 : -1;
+            this.activo = Math.max(0, Math.min(this.productos.length - 1, this.activo + paso));
+            this._resaltar();
+        } else if (evento.key === 'Enter') {
+            // Enter elige el resaltado (el scanner de códigos termina con Enter)
+            evento.preventDefault();
+            if (this.activo >= 0) {
+                this.elegir(this.productos[this.activo]);
+            }
+        } else if (evento.key === 'Escape') {
+            this.cerrar();
+        }
+    }
+
+    _mostrar(mas) {
+        this.menu.innerHTML = '';
+        if (!this.productos.length) {
+            const vacio = document.createElement('div');
+            vacio.className = 'list-group-item text-muted small';
+            vacio.textContent = 'Sin resultados';
+            this.menu.appendChild(vacio);
+        }
+        this.productos.forEach((producto, indice) => {
+            const item = document.createElement('button');
+            item.type = 'button';
+            item.className = 'list-group-item list-group-item-action py-1';
+            const nombre = document.createElement('div');
+            nombre.textContent = `${producto.codigo} - ${producto.nombre}`;
+            const detalle = document.createElement('small');
+            detalle.className = 'text-muted';
+            detalle.textContent = SelectorProductos.detalle(producto);
+            item.append(nombre, detalle);
+            // mousedown: se dispara antes del blur del input
+            item.addEventListener('mousedown', evento => {
+                evento.preventDefault();
+                this.elegir(producto);
+            });
+            item.addEventListener('mouseenter', () => {
+                this.activo = indice;
+                this._resaltar();
+            });
+            this.menu.appendChild(item);
+        });
+        if (mas) {
+            const boton = document.createElement('button');
+            boton.type = 'button';
+            boton.className = 'list-group-item list-group-item-action text-center text-primary small';
+            boton.textContent = 'Más resultados…';
+            boton.addEventListener('mousedown', evento => {
+                evento.preventDefault();
+                this._masResultados();
+            });
+            this.menu.appendChild(boton);
+        }
+        const rect = this.input.getBoundingClientRect();
+        this.menu.style.left = `${rect.left + window.scrollX}px`;
+        this.menu.style.top = `${rect.bottom + window.scrollY}px`;
+        this.menu.style.width = `${Math.max(rect.width, 320)}px`;
+        this.menu.style.display = 'block';
+        this._resaltar();
+    }
+
+    _resaltar() {
+        this.menu.querySelectorAll('.list-group-item-action').forEach((item, indice) => {
+            item.classList.toggle('active', indice === this.activo);
+        });
+    }
+
+    elegir(producto) {
+        this.input.value = `${producto.codigo} - ${producto.nombre}`;
+        this.cerrar();
+        this.onSelect(producto);
+    }
+
+    cerrar() {
+        this.menu.style.display = 'none';
+    }
+
+    destruir() {
+        this.menu.remove();
+        delete this.input.selectorProductos;
+    }
+
+    // Marca, subcategoría, versión y stock en una línea
+    static detalle(producto) {
+        const partes = [producto.marca, producto.subcategoria, producto.version].filter(Boolean);
+        const stock = producto.es_pesable ? `${Number(producto.stock || 0).toFixed(3)} kg` : `${producto.stock || 0} u.`;
+        partes.push(`$${Number(producto.precio_venta || 0).toFixed(2)}`, `stock ${stock}`);
+        return partes.join(' · ');
+    }
+}
@@ -0,0 +1,306 @@
+import asyncio
+import io
+import sys
+import threading
+import time
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Dict, Any, Callable, List, Tuple
+from urllib.parse import unquote
+
+logger = logging.getLogger(__name__)
+
+# ----------------------------------------------------------------------
+# Ejecutor de base de datos no bloqueante
+# ----------------------------------------------------------------------
+class DBExecutor:
+    """Pocos hilos con conexión del pool para las lecturas del event loop.
+
+    Las corrutinas esperan el resultado sin ocupar un hilo; solo hay tantas
+    consultas en curso como workers, el resto espera en la cola del ejecutor.
+    """
+
+    def __init__(self, pool, workers: int = 4):
+        self.pool = pool
+        self.workers = workers
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='db-async')
+        self._lock = threading.Lock()
+        self._stats = {'submitted': 0, 'completed': 0, 'failed': 0, 'in_flight': 0,
+                       'max_in_flight': 0, 'queue_wait_total': 0.0}
+
+    def _call(self, fn: Callable, args, submitted: float):
+        with self._lock:
+            self._stats['queue_wait_total'] += time.monotonic() - submitted
+        conn = self.pool.acquire()
+        try:
+            return fn(conn, *args)
+        finally:
+            conn.close()
+
+    async def run(self, fn: Callable, *args):
+        """Ejecuta fn(conn, *args) en un worker y espera el resultado"""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            self._stats['submitted'] += 1
+            self._stats['in_flight'] += 1
+            self._stats['max_in_flight'] = max(self._stats['max_in_flight'], self._stats['in_flight'])
+        try:
+            result = await loop.run_in_executor(self._executor, self._call, fn, args, time.monotonic())
+        except Exception:
+            with self._lock:
+                self._stats['failed'] += 1
+            raise
+        finally:
+            with self._lock:
+                self._stats['in_flight'] -= 1
+        with self._lock:
+            self._stats['completed'] += 1
+        return result
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+        done = stats['completed'] + stats['failed']
+        stats['workers'] = self.workers
+        stats['avg_queue_wait_ms'] = round(stats['queue_wait_total'] / done * 1000, 2) if done else 0
+        stats['queue_wait_total'] = round(stats['queue_wait_total'], 4)
+        return stats
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False)
+
+async def run_write(writer, fn: Callable, *args):
+    """Encola un trabajo en el escritor único y espera su commit sin bloquear el loop"""
+    return await asyncio.wrap_future(writer.submit(fn, *args))
+
+# ----------------------------------------------------------------------
+# Helpers ASGI
+# ----------------------------------------------------------------------
+async def read_body(receive) -> bytes:
+    body = b''
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            break
+        body += message.get('body', b'')
+        if not message.get('more_body'):
+            break
+    return body
+
+async def send_response(send, status: int, body: bytes,
+                        content_type: str = 'application/json',
+                        headers: Optional[List[Tuple[bytes, bytes]]] = None):
+    response_headers = [(b'content-type', content_type.encode('latin-1')),
+                        (b'content-length', str(len(body)).encode('latin-1'))]
+    if headers:
+        response_headers.extend(headers)
+    await send({'type': 'http.response.start', 'status': status, 'headers': response_headers})
+    await send({'type': 'http.response.body', 'body': body})
+
+class WSGIFallback:
+    """Sirve una app WSGI (Flask) desde ASGI usando un pool de hilos acotado"""
+
+    def __init__(self, wsgi_app, workers: int = 8):
+        self.wsgi_app = wsgi_app
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='wsgi')
+
+    def _environ(self, scope, body: bytes) -> Dict[str, Any]:
+        server = scope.get('server') or ('localhost', 80)
+        client = scope.get('client') or ('', 0)
+        environ = {
+            'REQUEST_METHOD': scope['method'],
+            'SCRIPT_NAME': scope.get('root_path', ''),
+            'PATH_INFO': scope['path'].encode('utf-8').decode('latin-1'),
+            'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+            'SERVER_NAME': str(server[0]),
+            'SERVER_PORT': str(server[1]),
+            'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+            'REMOTE_ADDR': client[0],
+            'wsgi.version': (1, 0),
+            'wsgi.url_scheme': scope.get('scheme', 'http'),
+            'wsgi.input': io.BytesIO(body),
+            'wsgi.errors': sys.stderr,
+            'wsgi.multithread': True,
+            'wsgi.multiprocess': False,
+            'wsgi.run_once': False,
+        }
+        for name, value in scope.get('headers', []):
+            name = name.decode('latin-1').upper().replace('-', '_')
+            value = value.decode('latin-1')
+            if name == 'CONTENT_TYPE':
+                environ['CONTENT_TYPE'] = value
+            elif name == 'CONTENT_LENGTH':
+                environ['CONTENT_LENGTH'] = value
+            else:
+                key = f'HTTP_{name}'
+                environ[key] = f"{environ[key]},{value}" if key in environ else value
+        return environ
+
+    def _run(self, environ):
+        result = {}
+
+        def start_response(status, headers, exc_info=None):
+            result['status'] = int(status.split(' ', 1)[0])
+            result['headers'] = headers
+            return lambda data: None
+
+        iterable = self.wsgi_app(environ, start_response)
+        try:
+            body = b''.join(iterable)
+        finally:
+            if hasattr(iterable, 'close'):
+                iterable.close()
+        return result['status'], result['headers'], body
+
+    async def __call__(self, scope, receive, send):
+        body = await read_body(receive)
+        loop = asyncio.get_running_loop()
+        status, headers, content = await loop.run_in_executor(
+            self._executor, self._run, self._environ(scope, body))
+        await send({
+            'type': 'http.response.start',
+            'status': status,
+            'headers': [(k.lower().encode('latin-1'), v.encode('latin-1')) for k, v in headers],
+        })
+        await send({'type': 'http.response.body', 'body': content})
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False)
+
+# ----------------------------------------------------------------------
+# Servidor HTTP/1.1 mínimo sobre asyncio
+# ----------------------------------------------------------------------
+async def _handle_connection(app, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+    sockname = writer.get_extra_info('sockname') or ('', 0)
+    peername = writer.get_extra_info('peername') or ('', 0)
+    try:
+        while True:
+            request_line = await reader.readline()
+            if not request_line:
+                break
+            try:
+                method, target, version = request_line.decode('latin-1').rstrip('\r\n').split(' ', 2)
+            except ValueError:
+                break
+
+            headers = []
+            while True:
+                line = await reader.readline()
+                if line in (b'\r\n', b'\n', b''):
+                    break
+                name, _, value = line.decode('latin-1').partition(':')
+                headers.append((name.strip().lower().encode('latin-1'), value.strip().encode('latin-1')))
+            header_map = dict(headers)
+
+            if header_map.get(b'transfer-encoding', b'').lower() == b'chunked':
+                writer.write(b'HTTP/1.1 411 Length Required\r\ncontent-length: 0\r\nconnection: close\r\n\r\n')
+                await writer.drain()
+                break
+            length = int(header_map.get(b'content-length', b'0') or 0)
+            body = await reader.readexactly(length) if length else b''
+
+            path, _, query = target.partition('?')
+            scope = {
+                'type': 'http',
+                'asgi': {'version': '3.0'},
+                'http_version': version.split('/', 1)[-1],
+                'method': method.upper(),
+                'scheme': 'http',
+                'path': unquote(path),
+                'raw_path': path.encode('latin-1'),
+                'query_string': query.encode('latin-1'),
+                'root_path': '',
+                'headers': headers,
+                'server': sockname[:2],
+                'client': peername[:2],
+            }
+            keep_alive = (version == 'HTTP/1.1' and header_map.get(b'connection', b'').lower() != b'close')
+            await _run_app(app, scope, body, writer, keep_alive)
+            if not keep_alive:
+                break
+    except (asyncio.IncompleteReadError, ConnectionError):
+        pass
+    finally:
+        writer.close()
+
+async def _run_app(app, scope, body: bytes, writer: asyncio.StreamWriter, keep_alive: bool):
+    state = {'started': False, 'chunked': False, 'done': False}
+    received = False
+
+    async def receive():
+        nonlocal received
+        if not received:
+            received = True
+            return {'type': 'http.request', 'body': body, 'more_body': False}
+        # Sin más cuerpo: se espera hasta que se cierre la conexión
+        await asyncio.Event().wait()
+
+    async def send(message):
+        if message['type'] == 'http.response.start':
+            state['status'] = message['status']
+            state['headers'] = list(message.get('headers', []))
+            return
+        if message['type'] != 'http.response.body' or state['done']:
+            return
+        chunk = message.get('body', b'')
+        more = message.get('more_body', False)
+        if not state['started']:
+            state['started'] = True
+            headers = state['headers']
+            names = {k.lower() for k, _ in headers}
+            if not more and b'content-length' not in names:
+                headers.append((b'content-length', str(len(chunk)).encode('latin-1')))
+            elif more and b'content-length' not in names:
+                state['chunked'] = True
+                headers.append((b'transfer-encoding', b'chunked'))
+            headers.append((b'connection', b'keep-alive' if keep_alive else b'close'))
+            head = f"HTTP/1.1 {state['status']} {_reason(state['status'])}\r\n".encode('latin-1')
+            head += b''.join(k + b': ' + v + b'\r\n' for k, v in headers) + b'\r\n'
+            writer.write(head)
+        if state['chunked']:
+            if chunk:
+                writer.write(f"{len(chunk):x}\r\n".encode('latin-1') + chunk + b'\r\n')
+            if not more:
+                writer.write(b'0\r\n\r\n')
+        else:
+            writer.write(chunk)
+        if not more:
+            state['done'] = True
+        await writer.drain()
+
+    try:
+        await app(scope, receive, send)
+    except Exception:
+        logger.exception(f"Error atendiendo {scope['method']} {scope['path']}")
+        if not state['started']:
+            state['headers'] = []
+            state['status'] = 500
+            await send({'type': 'http.response.start', 'status': 500, 'headers': []})
+            await send({'type': 'http.response.body', 'body': b''})
+
+_REASONS = {200: 'OK', 201: 'Created', 204: 'No Content', 301: 'Moved Permanently', 302: 'Found',
+            304: 'Not Modified', 400: 'Bad Request', 401: 'Unauthorized', 403: 'Forbidden',
+            404: 'Not Found', 405: 'Method Not Allowed', 409: 'Conflict', 411: 'Length Required',
+            413: 'Payload Too Large', 415: 'Unsupported Media Type', 500: 'Internal Server Error',
+            503: 'Service Unavailable'}
+
+def _reason(status: int) -> str:
+    return _REASONS.get(status, 'OK' if status < 400 else 'Error')
+
+async def _serve_forever(app, host: str, port: int):
+    server = await asyncio.start_server(lambda r, w: _handle_connection(app, r, w), host, port)
+    logger.info(f"Servidor asyncio escuchando en {host}:{port}")
+    async with server:
+        await server.serve_forever()
+
+def serve(app, host: str = '0.0.0.0', port: int = 5000):
+    """Sirve una app ASGI: con uvicorn si está instalado, si no con el servidor asyncio propio"""
+    try:
+        import uvicorn
+    except ImportError:
+        uvicorn = None
+
+    if uvicorn is not None:
+        uvicorn.run(app, host=host, port=port, log_level='info')
+    else:
+        asyncio.run(_serve_forever(app, host, port))
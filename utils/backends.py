@@ -0,0 +1,94 @@
+import logging
+from typing import Iterator
+
+from flask import current_app
+
+from utils import pool as db_pool
+from utils import storage
+from utils import writer as db_writer
+from utils import migrations
+from utils import pg
+
+logger = logging.getLogger(__name__)
+
+SQLITE = 'sqlite'
+POSTGRESQL = pg.DIALECT
+
+def dialect(conn) -> str:
+    """Dialecto SQL de una conexión ('sqlite' o 'postgresql')"""
+    return getattr(conn, 'dialect', SQLITE)
+
+class SQLiteBackend:
+    """Archivo SQLite: pool con WAL, migraciones y escritor único"""
+
+    name = SQLITE
+
+    def __init__(self, app):
+        self.db_path = app.config['DATABASE_PATH']
+        # Pool de conexiones compartido con el blueprint de la API
+        self.pool = db_pool.init_app(app)
+        # Modo WAL y checkpoints en segundo plano
+        storage.init_app(app)
+        # Migraciones de esquema versionadas (PRAGMA user_version)
+        migrations.init_app(app)
+        # Hilo escritor único: serializa las escrituras con commit agrupado
+        self.writer = db_writer.init_app(app)
+
+    def get_connection(self):
+        return db_pool.get_connection(self.db_path)
+
+    def iter_rows(self, conn, sql: str, params=()) -> Iterator:
+        # sqlite3 ya entrega las filas a medida que avanza el cursor
+        return iter(conn.execute(sql, params))
+
+class PostgresBackend:
+    """PostgreSQL: pool de conexiones, escrituras concurrentes y cursores del servidor"""
+
+    name = POSTGRESQL
+
+    def __init__(self, app):
+        self.pool = pg.PgPool(
+            app.config['DATABASE_URL'],
+            minconn=app.config.get('PG_POOL_MIN', 1),
+            maxconn=app.config.get('DB_POOL_SIZE', 10),
+            timeout=app.config.get('DB_POOL_TIMEOUT', 30),
+            itersize=app.config.get('PG_ITERSIZE', 2000),
+        )
+        self.writer = pg.PgWriter(self.pool, workers=app.config.get('PG_WRITER_WORKERS', 4))
+        app.extensions['db_pool'] = self.pool
+        app.extensions['db_writer'] = self.writer
+        app.teardown_appcontext(pg.release_context_connection)
+
+    def get_connection(self):
+        return self.pool.get_connection()
+
+    def iter_rows(self, conn, sql: str, params=()) -> Iterator:
+        return pg.iter_rows(conn, sql, params)
+
+_BACKENDS = {SQLITE: SQLiteBackend, POSTGRESQL: PostgresBackend}
+
+def init_app(app):
+    """Crea el backend elegido por DB_BACKEND y lo registra en la app"""
+    name = app.config.get('DB_BACKEND', SQLITE).lower()
+    if name in ('postgres', 'pg'):
+        name = POSTGRESQL
+    try:
+        backend_class = _BACKENDS[name]
+    except KeyError:
+        raise ValueError(f"DB_BACKEND desconocido: {name}") from None
+
+    backend = backend_class(app)
+    app.extensions['db_backend'] = backend
+    logger.info(f"Backend de base de datos: {backend.name}")
+    return backend
+
+def get_backend():
+    return current_app.extensions['db_backend']
+
+def get_connection():
+    """Conexión del backend de la app; dentro de un request se reutiliza hasta el teardown"""
+    return get_backend().get_connection()
+
+def iter_rows(conn, sql: str, params=()) -> Iterator:
+    """Recorre un resultado grande sin cargarlo entero en el cliente (reportes)"""
+    return get_backend().iter_rows(conn, sql, params)
@@ -0,0 +1,139 @@
+import re
+import sqlite3
+import threading
+import time
+import logging
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional, Tuple
+
+from utils import backends
+from utils import queries
+from utils import taxonomia
+
+logger = logging.getLogger(__name__)
+
+# Resultados por página de búsqueda
+LIMITE = 20
+MAX_LIMITE = 100
+# Términos que se usan de la consulta (el resto se ignora)
+MAX_TERMINOS = 8
+# Coincidencias que se ordenan por relevancia: con un prefijo que aparece en
+# todo el catálogo se rankean las primeras CANDIDATOS por id que pasan el
+# filtro de stock (el código idéntico va siempre, aparte)
+CANDIDATOS = 1000
+
+# Caché de respuestas: segundos de vida y cantidad de búsquedas guardadas
+CACHE_TTL = 30.0
+CACHE_MAX = 1000
+
+_TERMINO = re.compile(r'\w+', re.UNICODE)
+
+def terminos(texto: str) -> List[str]:
+    """Palabras de la consulta en minúsculas (sin operadores ni comillas de FTS5)"""
+    return [t.lower() for t in _TERMINO.findall(texto or '')][:MAX_TERMINOS]
+
+def consulta_fts(lista: List[str]) -> str:
+    """Cada término como prefijo entre comillas: todos tienen que aparecer"""
+    return ' '.join(f'"{t}"*' for t in lista)
+
+class SearchCache:
+    """Búsquedas recientes por (texto, página, límite, con_stock).
+
+    Cada entrada guarda la versión del catálogo y la taxonomía con la que se
+    armó: un cambio de precio, stock o nombre la invalida en la próxima
+    lectura. El TTL acota la vida de las entradas cuando no hay versión
+    (PostgreSQL) y el LRU, la memoria.
+    """
+
+    def __init__(self, ttl: float = CACHE_TTL, max_entradas: int = CACHE_MAX):
+        self.ttl = ttl
+        self.max_entradas = max_entradas
+        self._lock = threading.Lock()
+        self._entradas: 'OrderedDict[tuple, Tuple[float, Optional[int], Dict[str, Any]]]' = OrderedDict()
+        self._stats = {'aciertos': 0, 'fallos': 0}
+
+    def get(self, clave: tuple, version: Optional[int]) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entrada = self._entradas.get(clave)
+            if entrada is None or entrada[0] < time.monotonic() or entrada[1] != version:
+                self._stats['fallos'] += 1
+                return None
+            self._entradas.move_to_end(clave)
+            self._stats['aciertos'] += 1
+            return entrada[2]
+
+    def put(self, clave: tuple, version: Optional[int], resultado: Dict[str, Any]):
+        with self._lock:
+            self._entradas[clave] = (time.monotonic() + self.ttl, version, resultado)
+            self._entradas.move_to_end(clave)
+            while len(self._entradas) > self.max_entradas:
+                self._entradas.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entradas.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return dict(self._stats, entradas=len(self._entradas), ttl=self.ttl)
+
+_cache = SearchCache()
+
+def _version(conn) -> Optional[int]:
+    if backends.dialect(conn) != backends.SQLITE:
+        return None
+    try:
+        row = queries.fetchone(conn, 'busqueda.version')
+    except sqlite3.OperationalError:
+        return None
+    return row[0] if row else None
+
+def _filas(conn, texto: str, lista: List[str], params: Dict[str, Any]) -> list:
+    if backends.dialect(conn) == backends.SQLITE:
+        try:
+            return queries.fetchall(conn, 'productos.buscar', dict(
+                params, consulta=consulta_fts(lista), candidatos=CANDIDATOS))
+        except sqlite3.OperationalError as e:
+            # Base sin la migración 8 o SQLite sin FTS5
+            logger.debug(f"Búsqueda FTS no disponible: {e}")
+    return queries.fetchall(conn, 'productos.buscar_like', dict(
+        params, prefijo=texto + '%', patron='%' + '%'.join(lista) + '%'))
+
+def buscar(conn, texto: str, limite: int = LIMITE, pagina: int = 1,
+           con_stock: bool = False) -> Dict[str, Any]:
+    """Página de productos vigentes que coinciden con el texto, los más relevantes primero.
+
+    Cada palabra se busca como prefijo en nombre, código, marca, subcategoría
+    y versión (sin distinguir acentos); un código idéntico va primero.
+    Retorna {productos, pagina, mas}; con_stock deja afuera los que no tienen.
+    """
+    texto = (texto or '').strip()
+    lista = terminos(texto)
+    limite = max(1, min(limite, MAX_LIMITE))
+    pagina = max(1, min(pagina, CANDIDATOS // limite or 1))
+    if not lista:
+        return {'productos': [], 'pagina': pagina, 'mas': False}
+
+    clave = (texto, limite, pagina, bool(con_stock))
+    version = _version(conn)
+    resultado = _cache.get(clave, version)
+    if resultado is not None:
+        return resultado
+
+    filas = _filas(conn, texto, lista, {
+        'codigo': texto, 'con_stock': 1 if con_stock else 0,
+        'limite': limite + 1, 'offset': (pagina - 1) * limite})
+    productos = [dict(fila) for fila in filas[:limite]]
+    for producto in productos:
+        producto['categoria'] = taxonomia.nombre(conn, 'categorias', producto['categoria_id'])
+    resultado = {'productos': productos, 'pagina': pagina, 'mas': len(filas) > limite}
+    _cache.put(clave, version, resultado)
+    return resultado
+
+def stats() -> Dict[str, Any]:
+    return _cache.stats()
+
+def init_app(app):
+    _cache.ttl = app.config.get('SEARCH_CACHE_TTL', CACHE_TTL)
+    _cache.max_entradas = app.config.get('SEARCH_CACHE_MAX', CACHE_MAX)
+    _cache.clear()
@@ -0,0 +1,140 @@
+import sys
+import threading
+from datetime import datetime
+from typing import Dict, Any, List, Tuple, Optional, Callable
+
+from flask import current_app, request
+
+from utils import backends
+from utils import compression
+from utils import queries
+from utils import serializer
+from utils.serializer import to_dicts
+
+PROTOCOL_VERSION = '1.1.0'
+
+# Tamaño máximo de una página del feed incremental (?limite=)
+FEED_LIMIT = 1000
+
+def version_actual(conn) -> Optional[int]:
+    """Último valor de la secuencia de cambios del catálogo.
+
+    None con backends sin los triggers que la mantienen (PostgreSQL):
+    ahí cada envío es completo y las listas no llevan ETag.
+    """
+    if backends.dialect(conn) != backends.SQLITE:
+        return None
+    row = queries.fetchone(conn, 'catalogo.version')
+    return row[0] if row else 0
+
+def cambios(conn, desde: int, hasta: Optional[int]) -> Tuple[List[Dict[str, Any]], List[int]]:
+    """Productos cambiados en (desde, hasta]: vigentes y tombstones (ids inactivos o eliminados)"""
+    params = {'desde': desde, 'hasta': sys.maxsize if hasta is None else hasta}
+    columns, rows = queries.fetch_rows(conn, 'productos.cambios', params)
+    return separar(columns, rows)
+
+def separar(columns, rows) -> Tuple[List[Dict[str, Any]], List[int]]:
+    """Divide filas de productos en vigentes (dicts) e ids dados de baja"""
+    activo, eliminado = columns.index('activo'), columns.index('eliminado')
+    vigentes = [row for row in rows if row[activo] == 1 and row[eliminado] == 0]
+    eliminados = [row[0] for row in rows if not (row[activo] == 1 and row[eliminado] == 0)]
+    return to_dicts(columns, vigentes), eliminados
+
+def payload(conn, desde: int, hasta: Optional[int]) -> Dict[str, Any]:
+    """Cuerpo del push al POS con los cambios desde su última versión confirmada.
+
+    Con desde = 0 (POS nuevo o sin confirmar nunca) se envía el catálogo
+    completo de productos vigentes, como antes de la sincronización
+    incremental.
+    """
+    if hasta is None or desde > hasta:
+        # Sin secuencia, o la base se restauró a una versión anterior: se reenvía todo
+        desde = 0
+    productos, eliminados = cambios(conn, desde, hasta)
+    return armar(productos, eliminados, desde, hasta)
+
+def armar(productos, eliminados, desde: int, hasta: Optional[int]) -> Dict[str, Any]:
+    """Cuerpo del push; desde = 0 es el catálogo completo (sin tombstones)"""
+    return {
+        'productos': productos,
+        'eliminados': [] if desde == 0 else eliminados,
+        'completo': desde == 0,
+        'desde': desde,
+        'hasta': hasta,
+        'timestamp': datetime.now().isoformat(),
+        'version': PROTOCOL_VERSION,
+    }
+
+def feed(conn, since: int, limite: int = FEED_LIMIT) -> Dict[str, Any]:
+    """Página del feed incremental: cambios posteriores al cursor y el cursor siguiente.
+
+    since = 0, un cursor adelantado o un backend sin secuencia devuelven el
+    catálogo completo; mas = True indica que hay que volver a pedir con el
+    cursor devuelto.
+    """
+    hasta = version_actual(conn)
+    if hasta is None or since <= 0 or since > hasta:
+        productos, _ = cambios(conn, 0, hasta)
+        return {'productos': productos, 'eliminados': [], 'completo': True,
+                'cursor': hasta or 0, 'mas': False}
+
+    productos, eliminados, cursor, mas = [], [], hasta, False
+    if since < hasta:
+        # Cada cambio tiene su propia versión: el cursor de la última fila no repite ni salta filas
+        columns, rows = queries.fetch_rows(conn, 'productos.cambios_pagina',
+                                           {'desde': since, 'hasta': hasta, 'limite': limite})
+        productos, eliminados = separar(columns, rows)
+        if len(rows) == limite:
+            cursor, mas = rows[-1][columns.index('version_sincronizacion')], True
+    return {'productos': productos, 'eliminados': eliminados, 'completo': False,
+            'cursor': cursor, 'mas': mas}
+
+# ----------------------------------------------------------------------
+# Listas completas con ETag
+# ----------------------------------------------------------------------
+_cuerpos_lock = threading.Lock()
+_cuerpos: Dict[tuple, Tuple[int, bytes]] = {}
+
+def etag(version: Optional[int], *partes) -> Optional[str]:
+    """ETag fuerte de una lista del catálogo en una versión (None sin secuencia)"""
+    if version is None:
+        return None
+    return '"' + '-'.join(str(p) for p in (*partes, version)) + '"'
+
+def etag_coincide(if_none_match: Optional[str], tag: str) -> bool:
+    """Compara If-None-Match con el ETag actual (comparación débil, RFC 9110)"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == '*':
+        return True
+    for candidato in if_none_match.split(','):
+        candidato = candidato.strip()
+        if candidato.startswith('W/'):
+            candidato = candidato[2:]
+        if compression.strip_etag_encoding(candidato) == tag:
+            return True
+    return False
+
+def cuerpo_por_version(clave: tuple, version: int, construir: Callable[[], Any]) -> bytes:
+    """Cuerpo de una lista completa; se arma una sola vez por versión del catálogo"""
+    with _cuerpos_lock:
+        cache = _cuerpos.get(clave)
+    if cache and cache[0] == version:
+        return cache[1]
+    body = construir()
+    if isinstance(body, str):
+        body = body.encode('utf-8')
+    with _cuerpos_lock:
+        _cuerpos[clave] = (version, body)
+    return body
+
+def respuesta_lista(conn, clave: tuple, construir: Callable[[], Any]):
+    """Respuesta de una lista completa del catálogo: 304 si el POS ya tiene esta versión"""
+    version = version_actual(conn)
+    tag = etag(version, *clave)
+    if tag is None:
+        return serializer.json_response(construir())
+    headers = {'ETag': tag, 'Cache-Control': 'no-cache'}
+    if etag_coincide(request.headers.get('If-None-Match'), tag):
+        return current_app.response_class(status=304, headers=headers)
+    return serializer.json_response(cuerpo_por_version(clave, version, construir), headers=headers)
@@ -0,0 +1,230 @@
+import threading
+import time
+import logging
+from typing import Callable, Dict, Any, Iterable, List, Optional, Set
+
+from utils import catalog_sync
+from utils import queries
+from utils import taxonomia
+
+logger = logging.getLogger(__name__)
+
+# Segundos entre lecturas de la versión del catálogo (cambios de otros procesos)
+CHECK_INTERVAL = 0.5
+# Códigos por consulta de lote (/api/productos/codigos)
+MAX_LOTE = 500
+
+# Columnas del registro compacto (tupla) de cada producto en el índice
+_ID, _CODIGO, _NOMBRE, _PRECIO, _STOCK, _PESABLE, _UNIDAD, _CATEGORIA, _MARCA = range(9)
+
+class CodeIndex:
+    """Código de barras -> producto vigente, en memoria.
+
+    Se carga entero la primera vez y después se pone al día en O(cambios)
+    con los productos cuya versión de sincronización es posterior a la del
+    índice. Las escrituras de la app llaman a notificar() después del commit
+    para que el próximo escaneo ya las vea; la versión además se relee cada
+    check_interval segundos para los cambios de otros procesos. Sin
+    secuencia de cambios (PostgreSQL) solo valen las notificaciones:
+    notificar(ids) relee esos productos y notificar() sin ids, todo.
+
+    Los productos se guardan como tuplas; los nombres de categoría y marca
+    salen del caché de utils.taxonomia al armar la respuesta.
+    """
+
+    def __init__(self, get_connection: Callable, check_interval: float = CHECK_INTERVAL):
+        self.get_connection = get_connection
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._por_codigo: Dict[str, tuple] = {}
+        self._codigo_de: Dict[int, str] = {}
+        self._categorias: Dict[Any, str] = {}
+        self._marcas: Dict[Any, str] = {}
+        self._version: Optional[int] = None
+        self._cargado = False
+        self._verificado = 0.0
+        # Notificaciones pendientes: ids a releer y/o recarga completa
+        self._sucio = False
+        self._pendientes: Set[int] = set()
+        self._recargar = False
+        self._stats = {'aciertos': 0, 'fallos': 0, 'cargas': 0, 'actualizaciones': 0}
+
+    # ------------------------------------------------------------------
+    # Mantenimiento
+    # ------------------------------------------------------------------
+    def notificar(self, ids: Optional[Iterable[int]] = None):
+        """Llamar después de confirmar una escritura en productos"""
+        with self._lock:
+            if ids is None:
+                self._recargar = True
+            else:
+                self._pendientes.update(ids)
+            self._sucio = True
+
+    def _poner(self, fila: tuple):
+        id_producto, codigo = fila[_ID], fila[_CODIGO]
+        anterior = self._codigo_de.get(id_producto)
+        if anterior is not None and anterior != codigo:
+            self._quitar(id_producto)
+        if codigo:
+            self._por_codigo[codigo] = fila
+            self._codigo_de[id_producto] = codigo
+
+    def _quitar(self, id_producto: int):
+        codigo = self._codigo_de.pop(id_producto, None)
+        fila = self._por_codigo.get(codigo)
+        if fila is not None and fila[_ID] == id_producto:
+            del self._por_codigo[codigo]
+
+    def _aplicar(self, columns, rows):
+        activo, eliminado = columns.index('activo'), columns.index('eliminado')
+        for row in rows:
+            if row[activo] == 1 and row[eliminado] == 0:
+                self._poner(tuple(row[:activo]))
+            else:
+                self._quitar(row[_ID])
+
+    def _cargar(self, conn):
+        _, rows = queries.fetch_rows(conn, 'codigos.vigentes')
+        por_codigo = {row[_CODIGO]: tuple(row) for row in rows if row[_CODIGO]}
+        # Se reemplazan enteros: las lecturas en curso siguen con los anteriores
+        self._por_codigo = por_codigo
+        self._codigo_de = {fila[_ID]: codigo for codigo, fila in por_codigo.items()}
+        self._stats['cargas'] += 1
+
+    def _actualizar(self, conn):
+        recargar, pendientes = self._recargar, self._pendientes
+        self._sucio, self._recargar, self._pendientes = False, False, set()
+        try:
+            # La versión se lee antes que las filas: lo que cambie en el medio se vuelve a aplicar
+            version = catalog_sync.version_actual(conn)
+            if not self._cargado or (version is None and recargar) or \
+                    (version is not None and (self._version is None or version < self._version)):
+                self._cargar(conn)
+            elif version is not None and version > self._version:
+                self._aplicar(*queries.fetch_rows(conn, 'codigos.cambios',
+                                                  {'desde': self._version, 'hasta': version}))
+                self._stats['actualizaciones'] += 1
+            elif version is None and pendientes:
+                for id_producto in pendientes:
+                    columns, rows = queries.fetch_rows(conn, 'codigos.producto', {'id_producto': id_producto})
+                    if rows:
+                        self._aplicar(columns, rows)
+                    else:
+                        self._quitar(id_producto)
+                self._stats['actualizaciones'] += 1
+            self._categorias = taxonomia.nombres(conn, 'categorias')
+            self._marcas = taxonomia.nombres(conn, 'marcas')
+        except Exception:
+            # Se reintenta en el próximo escaneo
+            self._sucio, self._recargar = True, self._recargar or recargar
+            self._pendientes |= pendientes
+            raise
+        self._version = version
+        self._cargado = True
+        self._verificado = time.monotonic()
+
+    def actualizar(self, conn=None):
+        """Pone el índice al día con la base (abre una conexión si no se pasa)"""
+        # Con el índice cargado y sin notificaciones, un solo hilo relee la
+        # versión y los demás siguen con lo que hay (atrasado a lo sumo un intervalo)
+        if not self._lock.acquire(blocking=not self._cargado or self._sucio):
+            return
+        try:
+            propia = conn is None
+            if propia:
+                conn = self.get_connection()
+            try:
+                self._actualizar(conn)
+            finally:
+                if propia:
+                    conn.close()
+        finally:
+            self._lock.release()
+
+    def vencido(self) -> bool:
+        """True si hay notificaciones pendientes o pasó check_interval desde la última lectura"""
+        return self._sucio or not self._cargado or time.monotonic() - self._verificado >= self.check_interval
+
+    def _al_dia(self):
+        if self.vencido():
+            try:
+                self.actualizar()
+            except Exception as e:
+                if not self._cargado:
+                    raise
+                logger.warning(f"No se pudo actualizar el índice de códigos: {e}")
+
+    # ------------------------------------------------------------------
+    # Consultas
+    # ------------------------------------------------------------------
+    def _registro(self, fila: tuple) -> Dict[str, Any]:
+        """Mismas claves que la consulta productos.api_por_codigo"""
+        return {
+            'id_producto': fila[_ID],
+            'codigo': fila[_CODIGO],
+            'nombre': fila[_NOMBRE],
+            'marca': self._marcas.get(fila[_MARCA]),
+            'precio_venta': fila[_PRECIO],
+            'stock': fila[_STOCK],
+            'es_pesable': fila[_PESABLE],
+            'unidad_medida': fila[_UNIDAD],
+            'categoria_nombre': self._categorias.get(fila[_CATEGORIA]),
+        }
+
+    def get(self, codigo: str) -> Optional[Dict[str, Any]]:
+        """Producto vigente con ese código, o None"""
+        self._al_dia()
+        fila = self._por_codigo.get(codigo)
+        if fila is None:
+            self._stats['fallos'] += 1
+            return None
+        self._stats['aciertos'] += 1
+        return self._registro(fila)
+
+    def get_many(self, codigos: Iterable[str]) -> Dict[str, Optional[Dict[str, Any]]]:
+        """Código -> producto (None si no existe) para un lote de escaneos"""
+        self._al_dia()
+        por_codigo = self._por_codigo
+        resultado = {}
+        for codigo in codigos:
+            fila = por_codigo.get(codigo)
+            resultado[codigo] = None if fila is None else self._registro(fila)
+        encontrados = sum(1 for producto in resultado.values() if producto is not None)
+        self._stats['aciertos'] += encontrados
+        self._stats['fallos'] += len(resultado) - encontrados
+        return resultado
+
+    def __len__(self) -> int:
+        return len(self._por_codigo)
+
+    def stats(self) -> Dict[str, Any]:
+        return dict(self._stats, productos=len(self._por_codigo), version=self._version)
+
+_index: Optional[CodeIndex] = None
+
+def producto(codigo: str) -> Optional[Dict[str, Any]]:
+    """Producto vigente por código de barras desde el índice en memoria"""
+    return _index.get(codigo)
+
+def productos(codigos: List[str]) -> Dict[str, Optional[Dict[str, Any]]]:
+    """Lote de códigos (sin repetir) -> producto o None"""
+    return _index.get_many(dict.fromkeys(codigos))
+
+def notificar(ids: Optional[Iterable[int]] = None):
+    """Avisar después del commit de una escritura en productos (ids: los afectados, si se conocen)"""
+    if _index is not None:
+        _index.notificar(ids)
+
+def stats() -> Dict[str, Any]:
+    return _index.stats() if _index is not None else {}
+
+def init_app(app):
+    """Índice de códigos de barras para /api/productos/<codigo> y los lotes de escaneos"""
+    global _index
+    _index = CodeIndex(
+        get_connection=lambda: app.extensions['db_backend'].get_connection(),
+        check_interval=app.config.get('CODIGOS_CHECK_INTERVAL', CHECK_INTERVAL),
+    )
+    app.extensions['code_index'] = _index
+    return _index
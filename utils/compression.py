@@ -0,0 +1,192 @@
+import gzip
+import io
+import logging
+import zlib
+from typing import Optional, List, Tuple
+
+from flask import current_app, request
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+
+GZIP = 'gzip'
+ZSTD = 'zstd'
+IDENTITY = 'identity'
+
+# Cuerpos chicos no compensan: el encabezado y la CPU cuestan más que lo que se ahorra
+MIN_SIZE = 1024
+# Tope del cuerpo descomprimido de un request (protege de bombas de compresión)
+MAX_DECOMPRESSED = 64 * 1024 * 1024
+
+GZIP_LEVEL = 6
+ZSTD_LEVEL = 3
+
+# Cuerpos que se leen por líneas: el middleware no los descomprime en memoria,
+# el endpoint los decodifica en streaming con open_stream()
+STREAM_TYPES = ('application/x-ndjson', 'application/jsonl')
+
+# Errores de un cuerpo comprimido cortado o corrupto al leerlo en streaming
+STREAM_ERRORS = (OSError, EOFError, zlib.error) + ((zstandard.ZstdError,) if zstandard is not None else ())
+
+class UnsupportedEncodingError(ValueError):
+    """Content-Encoding que este servidor no sabe decodificar"""
+
+class PayloadTooLargeError(ValueError):
+    """El cuerpo descomprimido supera MAX_DECOMPRESSED"""
+
+def available() -> List[str]:
+    """Codificaciones soportadas, en orden de preferencia"""
+    return [ZSTD, GZIP] if zstandard is not None else [GZIP]
+
+def accept_encoding_header() -> str:
+    """Valor para anunciar lo que se acepta (Accept-Encoding, RFC 7694)"""
+    return ', '.join(available())
+
+def compress(body: bytes, encoding: str) -> bytes:
+    if encoding == GZIP:
+        return gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+    if encoding == ZSTD and zstandard is not None:
+        return zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(body)
+    if encoding in ('', IDENTITY):
+        return body
+    raise UnsupportedEncodingError(encoding)
+
+def decompress(body: bytes, encoding: str, max_size: int = MAX_DECOMPRESSED) -> bytes:
+    """Decodifica un cuerpo sin pasar de max_size bytes"""
+    encoding = (encoding or '').strip().lower()
+    if encoding in ('', IDENTITY):
+        return body
+    if encoding in (GZIP, 'x-gzip'):
+        decoder = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        data = decoder.decompress(body, max_size + 1)
+    elif encoding == ZSTD and zstandard is not None:
+        reader = zstandard.ZstdDecompressor().stream_reader(io.BytesIO(body))
+        data = reader.read(max_size + 1)
+    else:
+        raise UnsupportedEncodingError(encoding)
+    if len(data) > max_size:
+        raise PayloadTooLargeError(f"Cuerpo descomprimido mayor a {max_size} bytes")
+    return data
+
+def open_stream(stream, encoding: Optional[str]):
+    """Lector binario (con readline) que decodifica stream a medida que se lee"""
+    encoding = (encoding or '').strip().lower()
+    if encoding in ('', IDENTITY):
+        return stream
+    if encoding in (GZIP, 'x-gzip'):
+        return gzip.GzipFile(fileobj=stream, mode='rb')
+    if encoding == ZSTD and zstandard is not None:
+        return io.BufferedReader(zstandard.ZstdDecompressor().stream_reader(stream, read_across_frames=True))
+    raise UnsupportedEncodingError(encoding)
+
+def etag_for(etag: str, encoding: str) -> str:
+    """ETag de la representación comprimida: "x" pasa a ser "x-gzip" """
+    return etag[:-1] + '-' + encoding + '"' if etag.endswith('"') else etag
+
+def strip_etag_encoding(etag: str) -> str:
+    """Inversa de etag_for, para comparar If-None-Match"""
+    for encoding in (GZIP, ZSTD):
+        sufijo = '-' + encoding + '"'
+        if etag.endswith(sufijo):
+            return etag[:-len(sufijo)] + '"'
+    return etag
+
+def choose_encoding(accept_encoding: Optional[str]) -> Optional[str]:
+    """Mejor codificación aceptada por el cliente, o None para enviar sin comprimir"""
+    if not accept_encoding:
+        return None
+    aceptadas = {}
+    for parte in accept_encoding.split(','):
+        nombre, _, params = parte.strip().partition(';')
+        q = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        aceptadas[nombre.strip().lower()] = q
+    for encoding in available():
+        if aceptadas.get(encoding, aceptadas.get('*', 0)) > 0:
+            return encoding
+    return None
+
+def encode_body(body: bytes, accept_encoding: Optional[str],
+                min_size: int = MIN_SIZE) -> Tuple[bytes, Optional[str]]:
+    """Comprime body según Accept-Encoding; retorna (cuerpo, codificación o None)"""
+    if len(body) < min_size:
+        return body, None
+    encoding = choose_encoding(accept_encoding)
+    if encoding is None:
+        return body, None
+    return compress(body, encoding), encoding
+
+# ----------------------------------------------------------------------
+# Integración con la app
+# ----------------------------------------------------------------------
+class DecompressMiddleware:
+    """WSGI: decodifica los cuerpos con Content-Encoding antes de llegar a Flask"""
+
+    def __init__(self, wsgi_app, max_size: int = MAX_DECOMPRESSED):
+        self.wsgi_app = wsgi_app
+        self.max_size = max_size
+
+    def __call__(self, environ, start_response):
+        encoding = environ.get('HTTP_CONTENT_ENCODING', '').strip().lower()
+        content_type = environ.get('CONTENT_TYPE', '').split(';', 1)[0].strip().lower()
+        if encoding and encoding != IDENTITY and content_type not in STREAM_TYPES:
+            try:
+                length = int(environ.get('CONTENT_LENGTH') or 0)
+                body = decompress(environ['wsgi.input'].read(length), encoding, self.max_size)
+            except UnsupportedEncodingError:
+                return self._error(start_response, '415 Unsupported Media Type',
+                                   b'{"error":"Content-Encoding no soportado"}')
+            except PayloadTooLargeError:
+                return self._error(start_response, '413 Payload Too Large',
+                                   b'{"error":"Cuerpo demasiado grande"}')
+            except (OSError, EOFError, zlib.error, ValueError) as e:
+                logger.warning(f"Cuerpo comprimido inválido ({encoding}): {e}")
+                return self._error(start_response, '400 Bad Request',
+                                   '{"error":"Cuerpo comprimido inválido"}'.encode('utf-8'))
+            environ['wsgi.input'] = io.BytesIO(body)
+            environ['CONTENT_LENGTH'] = str(len(body))
+            del environ['HTTP_CONTENT_ENCODING']
+        return self.wsgi_app(environ, start_response)
+
+    def _error(self, start_response, status: str, body: bytes):
+        start_response(status, [('Content-Type', 'application/json'),
+                                ('Content-Length', str(len(body))),
+                                ('Accept-Encoding', accept_encoding_header())])
+        return [body]
+
+def compress_response(response):
+    """after_request: comprime las respuestas JSON de /api/ que el cliente acepta comprimidas"""
+    if not request.path.startswith('/api/'):
+        return response
+    response.headers['Accept-Encoding'] = accept_encoding_header()
+    if (response.direct_passthrough or response.status_code < 200 or response.status_code in (204, 304)
+            or response.mimetype != 'application/json' or 'Content-Encoding' in response.headers):
+        return response
+    response.vary.add('Accept-Encoding')
+    body, encoding = encode_body(response.get_data(), request.headers.get('Accept-Encoding'),
+                                 current_app.config.get('COMPRESSION_MIN_SIZE', MIN_SIZE))
+    if encoding:
+        response.set_data(body)
+        response.headers['Content-Encoding'] = encoding
+        # El ETag identifica la representación: la comprimida es otra
+        etag = response.headers.get('ETag')
+        if etag:
+            response.headers['ETag'] = etag_for(etag, encoding)
+    return response
+
+def init_app(app):
+    """Compresión gzip/zstd negociada por cabeceras en ambos sentidos para la API"""
+    if not app.config.get('COMPRESSION_ENABLED', True):
+        return
+    app.wsgi_app = DecompressMiddleware(app.wsgi_app, app.config.get('COMPRESSION_MAX_SIZE', MAX_DECOMPRESSED))
+    app.after_request(compress_response)
+    logger.info(f"Compresión de la API: {accept_encoding_header()}")
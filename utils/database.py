@@ -1,18 +1,20 @@
-import sqlite3
 import logging
 from contextlib import contextmanager
 from flask import current_app
 from typing import Optional, List, Dict, Any
+from utils.backends import get_connection
+from utils import codigos
+from utils import queries
+from utils.serializer import fetch_rows, to_dicts
 
 logger = logging.getLogger(__name__)
 
 @contextmanager
 def get_db_connection():
-    """Context manager para conexiones a la base de datos"""
+    """Context manager para conexiones del backend configurado"""
     conn = None
     try:
-        conn = sqlite3.connect(current_app.config['DATABASE_PATH'])
-        conn.row_factory = sqlite3.Row
+        conn = get_connection()
         yield conn
     except Exception as e:
         logger.error(f"Error en conexión a BD: {e}")
@@ -27,14 +29,22 @@ def execute_query(query: str, params: tuple = ()) -> List[Dict[str, Any]]:
     """Ejecuta una consulta SELECT y retorna los resultados"""
     try:
         with get_db_connection() as conn:
-            cursor = conn.cursor()
-            cursor.execute(query, params)
-            results = cursor.fetchall()
-            return [dict(row) for row in results]
+            columns, rows = fetch_rows(conn, query, params)
+            return to_dicts(columns, rows)
     except Exception as e:
         logger.error(f"Error ejecutando query: {e}")
         raise
 
+def execute_named_query(name: str, params=()) -> List[Dict[str, Any]]:
+    """Ejecuta una consulta del registro por nombre y retorna los resultados"""
+    try:
+        with get_db_connection() as conn:
+            columns, rows = queries.fetch_rows(conn, name, params)
+            return to_dicts(columns, rows)
+    except Exception as e:
+        logger.error(f"Error ejecutando query {name}: {e}")
+        raise
+
 def execute_update(query: str, params: tuple = ()) -> int:
     """Ejecuta una consulta UPDATE/INSERT/DELETE y retorna filas afectadas"""
     try:
@@ -48,15 +58,8 @@ def execute_update(query: str, params: tuple = ()) -> int:
         raise
 
 def get_product_by_code(codigo: str) -> Optional[Dict[str, Any]]:
-    """Obtiene un producto por código"""
-    query = """
-    SELECT p.*, c.nombre as categoria_nombre 
-    FROM productos p 
-    LEFT JOIN categorias c ON p.categoria_id = c.id_categoria 
-    WHERE p.codigo = ? AND p.activo = 1 AND p.eliminado = 0
-    """
-    results = execute_query(query, (codigo,))
-    return results[0] if results else None
+    """Obtiene un producto vigente por código desde el índice en memoria (ver utils.codigos)"""
+    return codigos.producto(codigo)
 
 def get_products_by_category(categoria_id: int) -> List[Dict[str, Any]]:
     """Obtiene productos por categoría"""
@@ -91,6 +94,7 @@ def update_product_stock(producto_id: int, cantidad: float, operation: str = 'ad
             raise ValueError("Operación debe ser 'add' o 'subtract'")
         
         execute_update(query, (cantidad, producto_id))
+        codigos.notificar([producto_id])
         return True
     except Exception as e:
         logger.error(f"Error actualizando stock: {e}")
@@ -152,6 +156,10 @@ def backup_database() -> bool:
         import shutil
         from datetime import datetime
         
+        if current_app.config.get('DB_BACKEND', 'sqlite') != 'sqlite':
+            logger.error("El backup por copia de archivo solo aplica a SQLite (usar pg_dump)")
+            return False
+        
         source_path = current_app.config['DATABASE_PATH']
         backup_path = f"backups/db_backup_{datetime.now().strftime('%Y%m%d_%H%M%S')}.db"
         
@@ -0,0 +1,176 @@
+import threading
+import logging
+from typing import Callable, Iterator, Optional, Tuple
+
+from utils import catalog_sync
+from utils import serializer
+
+logger = logging.getLogger(__name__)
+
+# Nombre del evento SSE de cambios del catálogo
+EVENTO_CATALOGO = 'catalogo'
+
+class TooManySubscribersError(RuntimeError):
+    """Se alcanzó EVENTS_MAX_SUBSCRIBERS: cada suscripción ocupa un hilo del servidor"""
+
+def formato_sse(evento: str, id_evento: int, data: bytes) -> bytes:
+    return f"id: {id_evento}\nevent: {evento}\n".encode('utf-8') + b"data: " + data + b"\n\n"
+
+class _Suscripcion:
+    """Stream SSE de un POS; close() (lo llama el servidor WSGI) devuelve el
+    cupo una sola vez, aunque el generador nunca haya empezado"""
+
+    def __init__(self, stream: Iterator[bytes], liberar: Callable[[], None]):
+        self._stream = stream
+        self._liberar = liberar
+        self._cerrada = False
+
+    def __iter__(self):
+        return self
+
+    def __next__(self) -> bytes:
+        return next(self._stream)
+
+    def close(self):
+        if self._cerrada:
+            return
+        self._cerrada = True
+        try:
+            self._stream.close()
+        finally:
+            self._liberar()
+
+class CatalogEvents:
+    """Avisa a los POS suscriptos cuando cambia el catálogo.
+
+    Un solo hilo consulta la secuencia de cambios (la mantienen los triggers
+    de productos, así que cubre ventas, lotes, ediciones y cualquier otro
+    camino) cada `interval` segundos. Cuando avanza arma una vez la página
+    del feed desde la versión anterior y despierta a todas las suscripciones.
+    Un POS que estaba en esa versión recibe los cambios en el evento; uno
+    atrasado recibe resync=true y completa con /api/productos/cambios.
+    """
+
+    def __init__(self, get_connection: Callable, interval: float = 0.5, max_productos: int = 200,
+                 max_subscribers: int = 50, heartbeat: float = 15.0):
+        self.get_connection = get_connection
+        self.interval = interval
+        self.max_productos = max_productos
+        self.max_subscribers = max_subscribers
+        self.heartbeat = heartbeat
+        self._cond = threading.Condition()
+        self._version: Optional[int] = None
+        # (desde, hasta, cuerpo del evento) del último avance de la secuencia
+        self._evento: Optional[Tuple[int, int, bytes]] = None
+        self._subscribers = 0
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._poll_lock = threading.Lock()
+
+    # ------------------------------------------------------------------
+    # Detección de cambios
+    # ------------------------------------------------------------------
+    def poll(self):
+        """Lee la versión del catálogo y publica el evento si avanzó"""
+        with self._poll_lock:
+            self._poll()
+
+    def _poll(self):
+        conn = self.get_connection()
+        try:
+            version = catalog_sync.version_actual(conn)
+            if version is None or version == self._version:
+                return
+            desde, evento = self._version, None
+            if desde is not None and desde < version:
+                pagina = catalog_sync.feed(conn, desde, self.max_productos)
+                # Cambios masivos no van en el evento: el POS los pagina con el feed
+                if not pagina['mas']:
+                    version = pagina['cursor']
+                    evento = (desde, version, serializer.dumps(dict(pagina, desde=desde)))
+        finally:
+            conn.close()
+        with self._cond:
+            self._version, self._evento = version, evento
+            self._cond.notify_all()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.poll()
+            except Exception as e:
+                logger.warning(f"Error leyendo la versión del catálogo: {e}")
+
+    def start(self):
+        with self._cond:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='catalog-events', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        with self._cond:
+            self._cond.notify_all()
+
+    # ------------------------------------------------------------------
+    # Suscripciones
+    # ------------------------------------------------------------------
+    def subscribe(self, ultimo: Optional[int]) -> Iterator[bytes]:
+        """Stream SSE para un POS al día hasta la versión ultimo (None: desde ahora)"""
+        # El cupo se toma acá y no al empezar a iterar: cuenta también las
+        # conexiones aceptadas que el servidor todavía no empezó a atender
+        with self._cond:
+            if self._subscribers >= self.max_subscribers:
+                raise TooManySubscribersError(f"Máximo de {self.max_subscribers} suscripciones")
+            self._subscribers += 1
+        try:
+            self.start()
+            if self._version is None:
+                self.poll()
+        except Exception:
+            self._liberar()
+            raise
+        return _Suscripcion(self._stream(ultimo), self._liberar)
+
+    def _liberar(self):
+        with self._cond:
+            self._subscribers -= 1
+
+    def _stream(self, ultimo: Optional[int]) -> Iterator[bytes]:
+        yield b"retry: 3000\n\n"
+        if ultimo is None:
+            ultimo = self._version
+        while not self._stop.is_set():
+            with self._cond:
+                self._cond.wait_for(lambda: self._version != ultimo or self._stop.is_set(),
+                                    timeout=self.heartbeat)
+                version, evento = self._version, self._evento
+            if version is None or version == ultimo:
+                # Comentario SSE: mantiene viva la conexión a través de proxies
+                yield b": ping\n\n"
+                continue
+            if evento is not None and evento[0] == ultimo and evento[1] == version:
+                data = evento[2]
+            else:
+                data = serializer.dumps({'resync': True, 'desde': ultimo, 'cursor': version})
+            yield formato_sse(EVENTO_CATALOGO, version, data)
+            ultimo = version
+
+    def stats(self):
+        with self._cond:
+            return {'version': self._version, 'suscriptores': self._subscribers,
+                    'activo': self._thread is not None and self._thread.is_alive()}
+
+def init_app(app):
+    """Canal de eventos del catálogo para los POS (/api/eventos)"""
+    events = CatalogEvents(
+        get_connection=lambda: app.extensions['db_backend'].get_connection(),
+        interval=app.config.get('EVENTS_POLL_INTERVAL', 0.5),
+        max_productos=app.config.get('EVENTS_MAX_PRODUCTOS', 200),
+        max_subscribers=app.config.get('EVENTS_MAX_SUBSCRIBERS', 50),
+        heartbeat=app.config.get('EVENTS_HEARTBEAT', 15),
+    )
+    app.extensions['catalog_events'] = events
+    return events
@@ -0,0 +1,374 @@
+import json
+import logging
+from collections import defaultdict
+from numbers import Number
+from typing import Dict, Any, Callable, Iterator, List, Optional, Tuple
+
+from utils.compression import STREAM_ERRORS
+
+logger = logging.getLogger(__name__)
+
+# Estados por venta en la respuesta al POS
+INSERTADA = 'insertada'
+DUPLICADA = 'duplicada'
+CONFLICTO = 'conflicto'
+INVALIDA = 'invalida'
+
+# NDJSON: ventas por transacción, tope de una línea y errores detallados en el resumen
+CHUNK_SIZE = 500
+MAX_LINE = 1024 * 1024
+MAX_ERRORES = 100
+
+# Máximo de parámetros por consulta IN (SQLITE_MAX_VARIABLE_NUMBER es 999 en versiones viejas)
+_CHUNK = 500
+
+# Columnas de ventas según el esquema (setup_db.py o setup_database.py):
+# (candidatas, campo del POS) o (candidatas, None, expresión SQL)
+_VENTA_COLUMNAS = [
+    (('total', 'total_venta'), 'total'),
+    (('usuario_id', 'id_usuario'), 'id_usuario'),
+    (('cliente_id', 'id_cliente'), 'cliente_id'),
+    (('fecha_venta',), 'fecha_venta'),
+    (('metodo_pago',), 'metodo_pago'),
+    (('sincronizado',), None, '1'),
+    (('fecha_sincronizacion',), None, 'CURRENT_TIMESTAMP'),
+]
+_DETALLE_TABLAS = [('detalles_venta', 'venta_id', 'producto_id'),
+                   ('ventas_detalles', 'id_venta', 'id_producto')]
+
+# Ruta de la base -> (INSERT de ventas, campos del POS, INSERT de detalles)
+_SENTENCIAS: Dict[str, Tuple[str, List[Optional[str]], str]] = {}
+
+class IdentidadPOSError(ValueError):
+    """El request no identifica a un POS registrado y activo"""
+
+def _chunks(values: list, size: int = _CHUNK):
+    for i in range(0, len(values), size):
+        yield values[i:i + size]
+
+def _table_columns(conn, table: str) -> List[str]:
+    return [row[1] for row in conn.execute(f"PRAGMA table_info({table})").fetchall()]
+
+# ----------------------------------------------------------------------
+# Validación (fuera del escritor)
+# ----------------------------------------------------------------------
+def pos_del_request(conn, headers, data: Optional[dict] = None) -> int:
+    """POS que envía las ventas: cabecera X-POS-Id o campo id_cliente_pos.
+
+    Es la clave de idempotencia junto con el id_venta local, así que no
+    tiene valor por defecto (la tienda no sirve: varias terminales comparten
+    tienda y numeran sus ventas desde 1). Tiene que existir y estar activo
+    en clientes_pos.
+    """
+    value = headers.get('X-POS-Id')
+    if value is None and data:
+        value = data.get('id_cliente_pos')
+    if value is None:
+        raise IdentidadPOSError('Falta la identificación del POS (cabecera X-POS-Id)')
+    try:
+        id_cliente_pos = int(value)
+    except (TypeError, ValueError):
+        raise IdentidadPOSError(f'POS inválido: {value}') from None
+    if conn.execute("SELECT 1 FROM clientes_pos WHERE id_cliente = ? AND activo = 1",
+                    (id_cliente_pos,)).fetchone() is None:
+        raise IdentidadPOSError(f'POS no registrado o inactivo: {id_cliente_pos}')
+    return id_cliente_pos
+
+def _error_venta(venta) -> Optional[str]:
+    if not isinstance(venta, dict):
+        return 'Formato de venta inválido'
+    for campo in ('id_venta', 'fecha_venta', 'total', 'id_usuario'):
+        if venta.get(campo) is None:
+            return f'Campo requerido: {campo}'
+    if not isinstance(venta['id_venta'], int):
+        return 'id_venta debe ser entero'
+    if not isinstance(venta['total'], Number):
+        return 'total debe ser numérico'
+    items = venta.get('items')
+    if not isinstance(items, list) or not items:
+        return 'La venta no tiene items'
+    for item in items:
+        if not isinstance(item, dict) or not isinstance(item.get('id_producto'), int):
+            return 'Item sin id_producto'
+        if not isinstance(item.get('cantidad'), Number) or item['cantidad'] <= 0:
+            return f"Cantidad inválida para el producto {item['id_producto']}"
+        if not isinstance(item.get('precio_unitario'), Number):
+            return f"Precio inválido para el producto {item['id_producto']}"
+    return None
+
+def productos_existentes(conn, ids) -> set:
+    """Ids de producto que existen en el catálogo, consultados por tandas"""
+    ids = list(ids)
+    existentes = set()
+    for chunk in _chunks(ids):
+        placeholders = ', '.join('?' * len(chunk))
+        existentes.update(row[0] for row in conn.execute(
+            f"SELECT id_producto FROM productos WHERE id_producto IN ({placeholders})", chunk))
+    return existentes
+
+def validar_lote(conn, ventas: List[Any]) -> Tuple[List[dict], Dict[int, Dict[str, Any]]]:
+    """Separa las ventas válidas; retorna (válidas, {posición: resultado de las inválidas})"""
+    invalidas = {}
+    candidatas = []
+    for posicion, venta in enumerate(ventas):
+        error = _error_venta(venta)
+        if error:
+            invalidas[posicion] = {'id_venta': venta.get('id_venta') if isinstance(venta, dict) else None,
+                                   'estado': INVALIDA, 'error': error}
+        else:
+            candidatas.append((posicion, venta))
+
+    existentes = productos_existentes(
+        conn, {item['id_producto'] for _, venta in candidatas for item in venta['items']})
+    validas = []
+    for posicion, venta in candidatas:
+        faltantes = sorted({item['id_producto'] for item in venta['items']} - existentes)
+        if faltantes:
+            invalidas[posicion] = {'id_venta': venta['id_venta'], 'estado': INVALIDA,
+                                   'error': f"Productos inexistentes: {faltantes}"}
+        else:
+            validas.append(dict(venta, _posicion=posicion))
+    return validas, invalidas
+
+# ----------------------------------------------------------------------
+# Ingesta (trabajo del escritor: una sola transacción)
+# ----------------------------------------------------------------------
+def _insert_venta_sql(conn) -> Tuple[str, List[Optional[str]]]:
+    """INSERT de ventas para el esquema actual y los campos del POS en orden"""
+    existentes = set(_table_columns(conn, 'ventas'))
+    columnas, valores, campos = ['id_venta'], ['?'], [None]
+    for definicion in _VENTA_COLUMNAS:
+        candidatas, campo = definicion[0], definicion[1]
+        columna = next((c for c in candidatas if c in existentes), None)
+        if columna is None:
+            continue
+        columnas.append(columna)
+        if campo is None:
+            valores.append(definicion[2])
+        else:
+            valores.append('?')
+            campos.append(campo)
+    sql = f"INSERT INTO ventas ({', '.join(columnas)}) VALUES ({', '.join(valores)})"
+    return sql, campos
+
+def _detalle_sql(conn) -> str:
+    for tabla, col_venta, col_producto in _DETALLE_TABLAS:
+        if _table_columns(conn, tabla):
+            return (f"INSERT INTO {tabla} ({col_venta}, {col_producto}, cantidad, precio_unitario, subtotal) "
+                    f"VALUES (?, ?, ?, ?, ?)")
+    raise RuntimeError("No existe tabla de detalles de venta")
+
+def _db_path(conn) -> str:
+    path = getattr(conn, 'db_path', None)
+    if path is None:
+        path = conn.execute("PRAGMA database_list").fetchone()[2]
+    return path
+
+def _sentencias(conn) -> Tuple[str, List[Optional[str]], str]:
+    """INSERTs de ventas y detalles para el esquema de la base, armados una vez por archivo"""
+    # El esquema solo cambia con las migraciones, que corren antes de levantar los escritores
+    path = _db_path(conn)
+    sentencias = _SENTENCIAS.get(path)
+    if sentencias is None:
+        venta_sql, campos = _insert_venta_sql(conn)
+        sentencias = _SENTENCIAS[path] = (venta_sql, campos, _detalle_sql(conn))
+    return sentencias
+
+def _proximo_id(conn) -> int:
+    """Primer id libre de ventas respetando sqlite_sequence (ids por tienda en modo shard)"""
+    return conn.execute("""
+        SELECT MAX(
+            COALESCE((SELECT seq FROM sqlite_sequence WHERE name = 'ventas'), 0),
+            COALESCE((SELECT MAX(id_venta) FROM ventas), 0)
+        ) + 1
+    """).fetchone()[0]
+
+def _misma_huella(fecha_venta, total, venta: dict) -> bool:
+    """True si la venta coincide con la recibida antes (sin huella, mapeos previos a la migración 10)"""
+    if fecha_venta is None and total is None:
+        return True
+    return str(venta['fecha_venta']) == fecha_venta and abs(venta['total'] - total) < 0.005
+
+def _conflicto(id_pos: int, id_venta_admin: Optional[int]) -> Dict[str, Any]:
+    return {'id_venta': id_pos, 'estado': CONFLICTO, 'id_venta_admin': id_venta_admin,
+            'error': 'id_venta ya recibida de este POS con otra fecha o total'}
+
+def ingerir_ventas(conn, id_cliente_pos: int, ventas: List[dict]) -> Dict[int, Dict[str, Any]]:
+    """Inserta un lote validado de ventas del POS; retorna {posición: resultado}.
+
+    Idempotente por (id_cliente_pos, id_venta del POS): un lote reenviado
+    devuelve las ventas ya cargadas como duplicadas con su id del admin.
+    Si el id ya se recibió con otra fecha o total no es un reintento sino
+    otra venta con el mismo número: se informa como conflicto y no se carga.
+    Cabeceras, detalles y el mapeo van con executemany y el stock se
+    descuenta con un UPDATE por producto con la cantidad total del lote.
+    """
+    resultados: Dict[int, Dict[str, Any]] = {}
+
+    # Ya recibidas antes (reintentos del POS): id del POS -> (id del admin, fecha, total)
+    ids_pos = list({venta['id_venta'] for venta in ventas})
+    previas = {}
+    for chunk in _chunks(ids_pos):
+        placeholders = ', '.join('?' * len(chunk))
+        for id_pos, id_venta, fecha_venta, total in conn.execute(f"""
+            SELECT id_venta_pos, id_venta, fecha_venta, total FROM ventas_pos_recibidas
+            WHERE id_cliente_pos = ? AND id_venta_pos IN ({placeholders})
+        """, [id_cliente_pos, *chunk]):
+            previas[id_pos] = (id_venta, fecha_venta, total)
+
+    nuevas = []
+    en_lote: Dict[int, dict] = {}
+    for venta in ventas:
+        id_pos = venta['id_venta']
+        if id_pos in previas:
+            id_venta, fecha_venta, total = previas[id_pos]
+            if _misma_huella(fecha_venta, total, venta):
+                resultados[venta['_posicion']] = {'id_venta': id_pos, 'estado': DUPLICADA,
+                                                  'id_venta_admin': id_venta}
+            else:
+                resultados[venta['_posicion']] = _conflicto(id_pos, id_venta)
+        elif id_pos in en_lote:
+            # Repetida dentro del mismo lote: cuenta la primera (su id se completa al insertar)
+            primera = en_lote[id_pos]
+            if _misma_huella(str(primera['fecha_venta']), primera['total'], venta):
+                resultados[venta['_posicion']] = primera['duplicada']
+            else:
+                resultados[venta['_posicion']] = _conflicto(id_pos, None)
+                primera.setdefault('conflictos', []).append(resultados[venta['_posicion']])
+        else:
+            en_lote[id_pos] = venta
+            venta['duplicada'] = {'id_venta': id_pos, 'estado': DUPLICADA, 'id_venta_admin': None}
+            nuevas.append(venta)
+    if not nuevas:
+        return resultados
+
+    # Ids del admin reservados en bloque (el escritor es único: no hay carrera)
+    proximo = _proximo_id(conn)
+    venta_sql, campos, detalle_sql = _sentencias(conn)
+    cabeceras, mapeo, detalles = [], [], []
+    stock: Dict[int, float] = defaultdict(float)
+    for offset, venta in enumerate(nuevas):
+        id_venta = proximo + offset
+        venta.setdefault('metodo_pago', 'efectivo')
+        cabeceras.append([id_venta] + [venta.get(campo) for campo in campos[1:]])
+        mapeo.append((id_cliente_pos, venta['id_venta'], id_venta, str(venta['fecha_venta']), venta['total']))
+        for item in venta['items']:
+            detalles.append((id_venta, item['id_producto'], item['cantidad'], item['precio_unitario'],
+                             item['cantidad'] * item['precio_unitario']))
+            stock[item['id_producto']] += item['cantidad']
+        resultados[venta['_posicion']] = {'id_venta': venta['id_venta'], 'estado': INSERTADA,
+                                          'id_venta_admin': id_venta}
+        venta['duplicada']['id_venta_admin'] = id_venta
+        for conflicto in venta.get('conflictos', ()):
+            conflicto['id_venta_admin'] = id_venta
+
+    conn.executemany(venta_sql, cabeceras)
+    conn.executemany("""
+        INSERT INTO ventas_pos_recibidas (id_cliente_pos, id_venta_pos, id_venta, fecha_venta, total)
+        VALUES (?, ?, ?, ?, ?)
+    """, mapeo)
+    conn.executemany(detalle_sql, detalles)
+    conn.executemany("UPDATE productos SET stock = stock - ? WHERE id_producto = ?",
+                     [(cantidad, id_producto) for id_producto, cantidad in sorted(stock.items())])
+    logger.info(f"Lote del POS {id_cliente_pos}: {len(nuevas)} ventas, {len(detalles)} items, "
+                f"{len(stock)} productos")
+    return resultados
+
+def respuesta(ventas: List[Any], resultados: Dict[int, Dict[str, Any]]) -> Dict[str, Any]:
+    """Resumen y estado por venta, en el orden recibido"""
+    por_venta = [resultados[posicion] for posicion in range(len(ventas))]
+    conteo = defaultdict(int)
+    for resultado in por_venta:
+        conteo[resultado['estado']] += 1
+    return {
+        'ventas_recibidas': conteo[INSERTADA] + conteo[DUPLICADA],
+        'insertadas': conteo[INSERTADA],
+        'duplicadas': conteo[DUPLICADA],
+        'conflictos': conteo[CONFLICTO],
+        'invalidas': conteo[INVALIDA],
+        'resultados': por_venta,
+    }
+
+# ----------------------------------------------------------------------
+# Ingesta en streaming (NDJSON: una venta por línea)
+# ----------------------------------------------------------------------
+def leer_ndjson(stream, max_line: int = MAX_LINE) -> Iterator[Tuple[int, Any, Optional[str]]]:
+    """Itera (número de línea, objeto, error) leyendo de a una línea"""
+    numero = 0
+    while True:
+        linea = stream.readline(max_line + 1)
+        if not linea:
+            return
+        numero += 1
+        if len(linea) > max_line:
+            # Se descarta el resto de la línea sin acumularlo
+            while linea and not linea.endswith(b'\n'):
+                linea = stream.readline(max_line + 1)
+            yield numero, None, f'Línea mayor a {max_line} bytes'
+            continue
+        linea = linea.strip()
+        if not linea:
+            continue
+        try:
+            yield numero, json.loads(linea), None
+        except ValueError as e:
+            yield numero, None, f'JSON inválido: {e}'
+
+def ingerir_ndjson(stream, conn, escribir: Callable, id_cliente_pos: int,
+                   chunk_size: int = CHUNK_SIZE, max_line: int = MAX_LINE) -> Iterator[Dict[str, Any]]:
+    """Ingiere un backlog NDJSON de a chunk_size ventas y rinde el progreso de cada tanda.
+
+    Cada tanda es una transacción del escritor (escribir(fn, *args)), así que
+    lo confirmado sobrevive a un corte de la conexión; como la ingesta es
+    idempotente, el POS puede reenviar el backlog completo. Solo se retiene
+    la tanda en curso y los primeros MAX_ERRORES errores. El último elemento
+    tiene fin=True con los totales (y error si la lectura se cortó).
+    """
+    totales = {'lineas': 0, 'tandas': 0, INSERTADA: 0, DUPLICADA: 0, CONFLICTO: 0, INVALIDA: 0}
+    errores: List[Dict[str, Any]] = []
+
+    def registrar(linea: int, resultado: Dict[str, Any]):
+        totales[resultado['estado']] += 1
+        if resultado['estado'] in (INVALIDA, CONFLICTO) and len(errores) < MAX_ERRORES:
+            errores.append(dict(resultado, linea=linea))
+
+    def procesar(tanda: List[Tuple[int, Any]]) -> Dict[str, Any]:
+        ventas = [venta for _, venta in tanda]
+        validas, resultados = validar_lote(conn, ventas)
+        if validas:
+            resultados.update(escribir(ingerir_ventas, id_cliente_pos, validas))
+        for posicion, (linea, _) in enumerate(tanda):
+            registrar(linea, resultados[posicion])
+        totales['tandas'] += 1
+        return _progreso(totales, ultima_linea=tanda[-1][0])
+
+    tanda: List[Tuple[int, Any]] = []
+    try:
+        for linea, venta, error in leer_ndjson(stream, max_line):
+            totales['lineas'] = linea
+            if error:
+                registrar(linea, {'id_venta': None, 'estado': INVALIDA, 'error': error})
+                continue
+            tanda.append((linea, venta))
+            if len(tanda) >= chunk_size:
+                yield procesar(tanda)
+                tanda = []
+        if tanda:
+            yield procesar(tanda)
+    except STREAM_ERRORS as e:
+        # Cuerpo cortado o comprimido inválido: lo confirmado queda, la tanda en curso no
+        logger.warning(f"Ingesta NDJSON del POS {id_cliente_pos} interrumpida en la línea "
+                       f"{totales['lineas']}: {e}")
+        yield dict(_progreso(totales), fin=True, error=f'Lectura interrumpida: {e}', errores=errores)
+        return
+    yield dict(_progreso(totales), fin=True, errores=errores)
+
+def _progreso(totales: Dict[str, int], **extra) -> Dict[str, Any]:
+    return dict({
+        'lineas': totales['lineas'],
+        'tandas': totales['tandas'],
+        'insertadas': totales[INSERTADA],
+        'duplicadas': totales[DUPLICADA],
+        'conflictos': totales[CONFLICTO],
+        'invalidas': totales[INVALIDA],
+    }, **extra)
@@ -0,0 +1,108 @@
+import base64
+import binascii
+import json
+import logging
+from typing import Dict, Any, Optional
+
+from utils import queries
+from utils import taxonomia
+
+logger = logging.getLogger(__name__)
+
+# Productos por página del listado del admin
+LIMITE = 100
+MAX_LIMITE = 500
+
+ORDEN_DEFECTO = 'nombre'
+
+# Filtro del formulario -> parámetro de la consulta
+FILTROS = {
+    'filtro_categoria': 'categoria_id',
+    'filtro_subcategoria': 'subcategoria_id',
+    'filtro_marca': 'marca_id',
+    'filtro_version': 'version_id',
+}
+
+class CursorInvalido(ValueError):
+    """Cursor de paginación mal formado o de otro orden"""
+
+# ----------------------------------------------------------------------
+# Cursor: la clave de la última fila enviada, opaca para el cliente
+# ----------------------------------------------------------------------
+def codificar_cursor(orden: str, clave, id_producto: int) -> str:
+    data = json.dumps([orden, clave, id_producto], separators=(',', ':'), ensure_ascii=False)
+    return base64.urlsafe_b64encode(data.encode('utf-8')).decode('ascii').rstrip('=')
+
+def decodificar_cursor(cursor: str, orden: str):
+    """Retorna (clave, id_producto) del cursor; el orden tiene que coincidir"""
+    try:
+        data = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        orden_cursor, clave, id_producto = data
+    except (binascii.Error, UnicodeDecodeError, ValueError, TypeError):
+        raise CursorInvalido("Cursor inválido") from None
+    if orden_cursor != orden or not isinstance(id_producto, int) or isinstance(clave, (list, dict)):
+        raise CursorInvalido("El cursor corresponde a otro orden")
+    return clave, id_producto
+
+# ----------------------------------------------------------------------
+# Parámetros de la URL
+# ----------------------------------------------------------------------
+def _entero(valor) -> Optional[int]:
+    try:
+        return int(valor) if valor not in (None, '') else None
+    except (TypeError, ValueError):
+        return None
+
+def filtros_de(args) -> Dict[str, Any]:
+    """Filtros de la consulta desde request.args (vacío o inválido = sin filtro)"""
+    filtros = {param: _entero(args.get(nombre)) for nombre, param in FILTROS.items()}
+    filtros['es_pesable'] = {'si': 1, 'no': 0}.get(args.get('filtro_pesable', ''))
+    return filtros
+
+def orden_de(args):
+    """(orden, sentido) desde ?orden=precio&sentido=desc, con valores permitidos"""
+    orden = args.get('orden', ORDEN_DEFECTO)
+    if orden not in queries.ADMIN_ORDENES:
+        orden = ORDEN_DEFECTO
+    sentido = 'desc' if args.get('sentido') == 'desc' else 'asc'
+    return orden, sentido
+
+def limite_de(args) -> int:
+    limite = _entero(args.get('limite')) or LIMITE
+    return max(1, min(limite, MAX_LIMITE))
+
+# ----------------------------------------------------------------------
+# Página
+# ----------------------------------------------------------------------
+def pagina(conn, filtros: Dict[str, Any], orden: str = ORDEN_DEFECTO, sentido: str = 'asc',
+           cursor: Optional[str] = None, limite: int = LIMITE) -> Dict[str, Any]:
+    """Una página del listado de productos activos.
+
+    Retorna {productos, cursor, mas}: cursor es el punto de partida de la
+    página siguiente (None si no hay más). Los productos llevan los nombres
+    de categoría, subcategoría, marca y versión desde el caché de taxonomía.
+    """
+    nombre = f'productos.admin.{orden}.{sentido}'
+    params = dict(filtros, limite=limite + 1)
+    if cursor:
+        params['clave'], params['id_producto'] = decodificar_cursor(cursor, orden)
+        nombre += '.siguiente'
+    filas = queries.fetchall(conn, nombre, params)
+
+    mas = len(filas) > limite
+    filas = filas[:limite]
+    productos = []
+    for fila in filas:
+        producto = dict(fila)
+        producto.pop('clave')
+        producto['categoria'] = taxonomia.nombre(conn, 'categorias', fila['categoria_id'])
+        producto['subcategoria'] = taxonomia.nombre(conn, 'subcategorias', fila['subcategoria_id'])
+        producto['marca_nombre'] = taxonomia.nombre(conn, 'marcas', fila['marca_id'])
+        producto['version_nombre'] = taxonomia.nombre(conn, 'versiones', fila['version_id'])
+        productos.append(producto)
+
+    siguiente = None
+    if mas:
+        ultima = filas[-1]
+        siguiente = codificar_cursor(orden, ultima['clave'], ultima['id_producto'])
+    return {'productos': productos, 'cursor': siguiente, 'mas': mas}
@@ -0,0 +1,398 @@
+import sqlite3
+import logging
+from typing import List, Callable, Optional, Sequence
+
+logger = logging.getLogger(__name__)
+
+class Migration:
+    """Migración de esquema identificada por un número de versión"""
+
+    def __init__(self, version: int, descripcion: str, aplicar: Callable):
+        self.version = version
+        self.descripcion = descripcion
+        self.aplicar = aplicar
+
+MIGRATIONS: List[Migration] = []
+
+def migration(version: int, descripcion: str):
+    """Decorador que registra una migración"""
+    def decorator(fn):
+        MIGRATIONS.append(Migration(version, descripcion, fn))
+        MIGRATIONS.sort(key=lambda m: m.version)
+        return fn
+    return decorator
+
+# ----------------------------------------------------------------------
+# Helpers para esquemas heterogéneos (los scripts de setup no coinciden)
+# ----------------------------------------------------------------------
+def table_columns(conn, table: str) -> List[str]:
+    return [row[1] for row in conn.execute(f"PRAGMA table_info({table})").fetchall()]
+
+def create_index(conn, name: str, table: str, columns: Sequence[str],
+                 where: Optional[str] = None, unique: bool = False) -> bool:
+    """Crea un índice solo si la tabla y todas sus columnas existen"""
+    existing = table_columns(conn, table)
+    missing = [c for c in columns if c not in existing]
+    if not existing or missing:
+        logger.info(f"Índice {name} omitido: faltan {table}({', '.join(missing) or '*'})")
+        return False
+    sql = f"CREATE {'UNIQUE ' if unique else ''}INDEX IF NOT EXISTS {name} ON {table} ({', '.join(columns)})"
+    if where:
+        sql += f" WHERE {where}"
+    conn.execute(sql)
+    return True
+
+def add_column(conn, table: str, column: str, definition: str) -> bool:
+    """Agrega una columna si la tabla existe y aún no la tiene"""
+    existing = table_columns(conn, table)
+    if not existing or column in existing:
+        return False
+    conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+    return True
+
+# ----------------------------------------------------------------------
+# Migraciones
+# ----------------------------------------------------------------------
+@migration(1, "Índices de rendimiento para joins, filtros y reportes")
+def _indices_rendimiento(conn):
+    # Ventas: filtros por fecha y join con clientes (cubre SUM(total) de listar_clientes)
+    create_index(conn, 'idx_ventas_fecha', 'ventas', ['fecha_venta'])
+    create_index(conn, 'idx_ventas_cliente', 'ventas', ['cliente_id', 'total'])
+    create_index(conn, 'idx_ventas_eliminado_fecha', 'ventas', ['eliminado', 'fecha_venta'])
+
+    # Detalles de venta: índices cubrientes para los reportes agrupados por producto
+    # y para el detalle/conteo de ítems por venta
+    create_index(conn, 'idx_detalles_venta_venta', 'detalles_venta',
+                 ['venta_id', 'producto_id', 'cantidad', 'precio_unitario'])
+    create_index(conn, 'idx_detalles_venta_producto', 'detalles_venta',
+                 ['producto_id', 'venta_id', 'cantidad', 'precio_unitario'])
+
+    # Lotes: costo promedio por producto (reporte_ganancias) y detalle por lote
+    create_index(conn, 'idx_lotes_detalles_producto', 'lotes_detalles', ['id_producto', 'precio_compra'])
+    create_index(conn, 'idx_lotes_detalles_lote', 'lotes_detalles', ['id_lote'])
+
+    # Productos: índice parcial para el listado de activos ordenado por nombre
+    create_index(conn, 'idx_productos_activos', 'productos', ['activo', 'eliminado', 'nombre'],
+                 where='eliminado = 0')
+
+    conn.execute("ANALYZE")
+
+# Columnas que viajan al POS: cambiarlas avanza la secuencia del catálogo
+SYNC_COLUMNS = ('codigo', 'nombre', 'precio_venta', 'stock', 'categoria_id', 'subcategoria_id',
+                'marca_id', 'version_id', 'es_pesable', 'unidad_medida', 'activo', 'eliminado')
+
+_AVANZAR_PRODUCTO = """
+    UPDATE sync_secuencia SET valor = valor + 1 WHERE nombre = 'productos';
+    UPDATE productos
+    SET version_sincronizacion = (SELECT valor FROM sync_secuencia WHERE nombre = 'productos')
+    WHERE id_producto = NEW.id_producto;
+"""
+
+@migration(2, "Secuencia de cambios del catálogo para la sincronización incremental")
+def _secuencia_cambios(conn):
+    add_column(conn, 'productos', 'version_sincronizacion', 'INTEGER DEFAULT 1')
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS sync_secuencia (
+            nombre TEXT PRIMARY KEY,
+            valor INTEGER NOT NULL
+        )
+    """)
+    # Punto de partida: todo el catálogo en la versión 1 y cada POS en 0 (envío completo)
+    conn.execute("UPDATE productos SET version_sincronizacion = 1")
+    conn.execute("INSERT OR REPLACE INTO sync_secuencia (nombre, valor) VALUES ('productos', 1)")
+    if table_columns(conn, 'clientes_pos'):
+        add_column(conn, 'clientes_pos', 'version_productos', 'INTEGER DEFAULT 0')
+        conn.execute("UPDATE clientes_pos SET version_productos = 0")
+
+    columnas = [c for c in SYNC_COLUMNS if c in table_columns(conn, 'productos')]
+    conn.execute(f"CREATE TRIGGER IF NOT EXISTS trg_productos_version_insert "
+                 f"AFTER INSERT ON productos BEGIN {_AVANZAR_PRODUCTO} END")
+    # version_sincronizacion no está en la lista: el UPDATE del trigger no lo vuelve a disparar
+    conn.execute(f"CREATE TRIGGER IF NOT EXISTS trg_productos_version_update "
+                 f"AFTER UPDATE OF {', '.join(columnas)} ON productos BEGIN {_AVANZAR_PRODUCTO} END")
+    create_index(conn, 'idx_productos_version', 'productos', ['version_sincronizacion'])
+
+# Columnas de las listas completas (/api/productos) que no viajan en el delta:
+# también cambian la versión, que es el ETag de esas listas
+LIST_COLUMNS = SYNC_COLUMNS + ('precio_compra', 'venta_por_peso')
+
+@migration(3, "La versión del catálogo cubre todo lo que exponen las listas de productos")
+def _version_listas(conn):
+    columnas = [c for c in LIST_COLUMNS if c in table_columns(conn, 'productos')]
+    conn.execute("DROP TRIGGER IF EXISTS trg_productos_version_update")
+    conn.execute(f"CREATE TRIGGER trg_productos_version_update "
+                 f"AFTER UPDATE OF {', '.join(columnas)} ON productos BEGIN {_AVANZAR_PRODUCTO} END")
+
+    # Renombrar o borrar una categoría o marca cambia el JOIN de /api/productos:
+    # avanza la versión sin marcar productos (el delta solo lleva los ids)
+    avanzar = "UPDATE sync_secuencia SET valor = valor + 1 WHERE nombre = 'productos';"
+    for tabla in ('categorias', 'marcas'):
+        if 'nombre' not in table_columns(conn, tabla):
+            continue
+        conn.execute(f"CREATE TRIGGER IF NOT EXISTS trg_{tabla}_version_update "
+                     f"AFTER UPDATE OF nombre ON {tabla} BEGIN {avanzar} END")
+        conn.execute(f"CREATE TRIGGER IF NOT EXISTS trg_{tabla}_version_delete "
+                     f"AFTER DELETE ON {tabla} BEGIN {avanzar} END")
+
+# El outbox usa la misma secuencia: su clave es la versión del catálogo que
+# generó el cambio, y clientes_pos.version_productos es el ack de cada POS
+_ENCOLAR_PRODUCTO = """
+    INSERT INTO sync_outbox (version, id_producto, operacion)
+    VALUES ((SELECT valor FROM sync_secuencia WHERE nombre = 'productos'), NEW.id_producto, '{operacion}');
+"""
+
+@migration(4, "Outbox de sincronización con los POS, reintentos y dead letter")
+def _outbox_sincronizacion(conn):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS sync_outbox (
+            version INTEGER PRIMARY KEY,
+            id_producto INTEGER NOT NULL,
+            operacion TEXT NOT NULL,
+            creado TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS sync_entregas (
+            id_cliente INTEGER PRIMARY KEY,
+            intentos INTEGER NOT NULL DEFAULT 0,
+            proximo_intento TIMESTAMP,
+            ultimo_error TEXT
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS sync_outbox_fallidos (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            id_cliente INTEGER NOT NULL,
+            desde INTEGER NOT NULL,
+            hasta INTEGER NOT NULL,
+            intentos INTEGER NOT NULL,
+            error TEXT,
+            fecha TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            reintentado INTEGER DEFAULT 0
+        )
+    """)
+    # Misma definición que migracion_admin_web.py, más las métricas de entrega
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS sincronizacion_log (
+            id_log INTEGER PRIMARY KEY AUTOINCREMENT,
+            tipo_sincronizacion TEXT NOT NULL,
+            direccion TEXT NOT NULL,
+            registros_procesados INTEGER DEFAULT 0,
+            registros_exitosos INTEGER DEFAULT 0,
+            registros_fallidos INTEGER DEFAULT 0,
+            fecha_inicio TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            fecha_fin TIMESTAMP,
+            estado TEXT DEFAULT 'en_proceso',
+            error_mensaje TEXT,
+            usuario_id INTEGER
+        )
+    """)
+    add_column(conn, 'sincronizacion_log', 'id_cliente', 'INTEGER')
+    add_column(conn, 'sincronizacion_log', 'bytes_enviados', 'INTEGER')
+    add_column(conn, 'sincronizacion_log', 'duracion_ms', 'REAL')
+    add_column(conn, 'sincronizacion_log', 'lag_segundos', 'REAL')
+    create_index(conn, 'idx_sync_fecha', 'sincronizacion_log', ['fecha_inicio'])
+
+    # Lo anterior a esta versión no está en el outbox: quien esté más atrás recibe todo
+    conn.execute("""
+        INSERT OR REPLACE INTO sync_secuencia (nombre, valor)
+        SELECT 'outbox_purgado', valor FROM sync_secuencia WHERE nombre = 'productos'
+    """)
+
+    # Los triggers de la versión también encolan: el cambio y su entrada en el
+    # outbox se confirman en la misma transacción
+    columnas = [c for c in LIST_COLUMNS if c in table_columns(conn, 'productos')]
+    conn.execute("DROP TRIGGER IF EXISTS trg_productos_version_insert")
+    conn.execute("DROP TRIGGER IF EXISTS trg_productos_version_update")
+    conn.execute(f"CREATE TRIGGER trg_productos_version_insert AFTER INSERT ON productos "
+                 f"BEGIN {_AVANZAR_PRODUCTO} {_ENCOLAR_PRODUCTO.format(operacion='alta')} END")
+    conn.execute(f"CREATE TRIGGER trg_productos_version_update "
+                 f"AFTER UPDATE OF {', '.join(columnas)} ON productos "
+                 f"BEGIN {_AVANZAR_PRODUCTO} {_ENCOLAR_PRODUCTO.format(operacion='cambio')} END")
+
+# Mapeo (POS, id_venta del POS) -> id_venta del admin: hace idempotente la ingesta.
+# fecha_venta y total son la huella de la venta para distinguir un reintento de un conflicto
+VENTAS_RECIBIDAS_DDL = """
+    CREATE TABLE IF NOT EXISTS ventas_pos_recibidas (
+        id_cliente_pos INTEGER NOT NULL,
+        id_venta_pos INTEGER NOT NULL,
+        id_venta INTEGER NOT NULL,
+        recibido TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        fecha_venta TEXT,
+        total REAL,
+        PRIMARY KEY (id_cliente_pos, id_venta_pos)
+    ) WITHOUT ROWID
+"""
+
+def crear_ventas_recibidas(conn):
+    """Crea el mapeo de ventas recibidas o le agrega la huella si es anterior a la migración 10"""
+    conn.execute(VENTAS_RECIBIDAS_DDL)
+    add_column(conn, 'ventas_pos_recibidas', 'fecha_venta', 'TEXT')
+    add_column(conn, 'ventas_pos_recibidas', 'total', 'REAL')
+
+@migration(5, "Mapeo idempotente de ventas recibidas de los POS")
+def _ventas_pos_recibidas(conn):
+    conn.execute(VENTAS_RECIBIDAS_DDL)
+
+@migration(6, "Versión de la taxonomía para el caché en memoria")
+def _version_taxonomia(conn):
+    conn.execute("INSERT OR IGNORE INTO sync_secuencia (nombre, valor) VALUES ('taxonomia', 1)")
+    avanzar = "UPDATE sync_secuencia SET valor = valor + 1 WHERE nombre = 'taxonomia';"
+    for tabla in ('categorias', 'subcategorias', 'marcas', 'versiones'):
+        if not table_columns(conn, tabla):
+            continue
+        for evento in ('INSERT', 'UPDATE', 'DELETE'):
+            conn.execute(f"CREATE TRIGGER IF NOT EXISTS trg_{tabla}_taxonomia_{evento.lower()} "
+                         f"AFTER {evento} ON {tabla} BEGIN {avanzar} END")
+
+# Mismas expresiones que queries.ADMIN_ORDENES: el planner solo usa el índice
+# si la clave del ORDER BY y del seek coincide textualmente
+_ORDENES_ADMIN = {
+    'codigo': ('codigo', 'codigo'),
+    'precio': ('precio_venta', 'IFNULL(precio_venta, 0)'),
+    'stock': ('stock', 'IFNULL(stock, 0)'),
+}
+
+@migration(7, "Índices parciales para el listado del admin paginado por keyset")
+def _indices_listado_admin(conn):
+    # El orden por nombre ya lo cubre idx_productos_activos (migración 1)
+    columnas = table_columns(conn, 'productos')
+    for orden, (columna, expresion) in _ORDENES_ADMIN.items():
+        if columna not in columnas:
+            continue
+        conn.execute(f"CREATE INDEX IF NOT EXISTS idx_productos_admin_{orden} "
+                     f"ON productos ({expresion}, id_producto) WHERE activo = 1 AND eliminado = 0")
+    conn.execute("ANALYZE")
+
+# Índice de texto de los productos vigentes: rowid = id_producto y los
+# nombres de la taxonomía copiados (se reindexan al renombrar)
+PRODUCTOS_FTS_DDL = """
+    CREATE VIRTUAL TABLE IF NOT EXISTS productos_fts USING fts5(
+        nombre, codigo, marca, subcategoria, version,
+        tokenize = 'unicode61 remove_diacritics 2',
+        prefix = '2 3'
+    )
+"""
+
+_FTS_INDEXAR = """
+    INSERT INTO productos_fts (rowid, nombre, codigo, marca, subcategoria, version)
+    SELECT p.id_producto, p.nombre, p.codigo, m.nombre, s.nombre, v.nombre
+    FROM productos p
+    LEFT JOIN marcas m ON p.marca_id = m.id_marca
+    LEFT JOIN subcategorias s ON p.subcategoria_id = s.id_subcategoria
+    LEFT JOIN versiones v ON p.version_id = v.id_version
+    WHERE p.activo = 1 AND p.eliminado = 0 AND {where};
+"""
+
+# Columnas de productos que cambian el texto indexado (el stock no dispara nada)
+FTS_COLUMNS = ('nombre', 'codigo', 'marca_id', 'subcategoria_id', 'version_id', 'activo', 'eliminado')
+
+# Tabla de la taxonomía -> (id, columna de productos que la referencia)
+_FTS_TAXONOMIA = {
+    'marcas': ('id_marca', 'marca_id'),
+    'subcategorias': ('id_subcategoria', 'subcategoria_id'),
+    'versiones': ('id_version', 'version_id'),
+}
+
+@migration(8, "Índice FTS5 de productos para la búsqueda")
+def _busqueda_productos(conn):
+    faltan = [c for c in FTS_COLUMNS if c not in table_columns(conn, 'productos')]
+    faltan += [t for t in _FTS_TAXONOMIA if 'nombre' not in table_columns(conn, t)]
+    if faltan:
+        logger.info(f"Búsqueda FTS omitida: faltan {', '.join(faltan)}")
+        return
+    try:
+        conn.execute(PRODUCTOS_FTS_DDL)
+    except sqlite3.OperationalError as e:
+        # SQLite compilado sin FTS5: la búsqueda usa LIKE
+        logger.warning(f"Búsqueda FTS omitida: {e}")
+        return
+
+    quitar = "DELETE FROM productos_fts WHERE rowid = OLD.id_producto;"
+    conn.execute(f"CREATE TRIGGER IF NOT EXISTS trg_productos_fts_insert AFTER INSERT ON productos "
+                 f"BEGIN {_FTS_INDEXAR.format(where='p.id_producto = NEW.id_producto')} END")
+    conn.execute(f"CREATE TRIGGER IF NOT EXISTS trg_productos_fts_update "
+                 f"AFTER UPDATE OF {', '.join(FTS_COLUMNS)} ON productos "
+                 f"BEGIN {quitar} {_FTS_INDEXAR.format(where='p.id_producto = NEW.id_producto')} END")
+    conn.execute(f"CREATE TRIGGER IF NOT EXISTS trg_productos_fts_delete AFTER DELETE ON productos "
+                 f"BEGIN {quitar} END")
+
+    for tabla, (id_col, fk_col) in _FTS_TAXONOMIA.items():
+        reindexar = (f"DELETE FROM productos_fts WHERE rowid IN "
+                     f"(SELECT id_producto FROM productos WHERE {fk_col} = OLD.{id_col}); "
+                     + _FTS_INDEXAR.format(where=f"p.{fk_col} = OLD.{id_col}"))
+        conn.execute(f"CREATE TRIGGER IF NOT EXISTS trg_{tabla}_fts_update AFTER UPDATE OF nombre ON {tabla} "
+                     f"BEGIN {reindexar} END")
+        conn.execute(f"CREATE TRIGGER IF NOT EXISTS trg_{tabla}_fts_delete AFTER DELETE ON {tabla} "
+                     f"BEGIN {reindexar} END")
+
+    conn.execute("DELETE FROM productos_fts")
+    conn.execute(_FTS_INDEXAR.format(where='1'))
+
+# Un borrado físico no deja fila que leer en el delta: el trigger avanza la
+# versión y guarda el id con la versión que le tocó
+PRODUCTOS_BORRADOS_DDL = """
+    CREATE TABLE IF NOT EXISTS productos_borrados (
+        version INTEGER PRIMARY KEY,
+        id_producto INTEGER NOT NULL,
+        borrado TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+"""
+
+@migration(9, "Los borrados físicos de productos avanzan la versión del catálogo")
+def _borrados_productos(conn):
+    conn.execute(PRODUCTOS_BORRADOS_DDL)
+    conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_productos_version_delete AFTER DELETE ON productos BEGIN
+            UPDATE sync_secuencia SET valor = valor + 1 WHERE nombre = 'productos';
+            INSERT INTO productos_borrados (version, id_producto)
+            VALUES ((SELECT valor FROM sync_secuencia WHERE nombre = 'productos'), OLD.id_producto);
+        END
+    """)
+
+@migration(10, "Huella (fecha y total) de las ventas recibidas de los POS")
+def _huella_ventas_recibidas(conn):
+    crear_ventas_recibidas(conn)
+
+# ----------------------------------------------------------------------
+# Runner
+# ----------------------------------------------------------------------
+def current_version(conn) -> int:
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+def apply_migrations(db_path: str, target: Optional[int] = None) -> List[int]:
+    """Aplica las migraciones pendientes; cada una en su propia transacción"""
+    conn = sqlite3.connect(db_path, isolation_level=None)
+    applied = []
+    try:
+        if not table_columns(conn, 'productos'):
+            logger.warning(f"Migraciones omitidas: {db_path} no tiene el esquema base")
+            return applied
+
+        version = current_version(conn)
+        for m in MIGRATIONS:
+            if m.version <= version or (target is not None and m.version > target):
+                continue
+            logger.info(f"Aplicando migración {m.version}: {m.descripcion}")
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                m.aplicar(conn)
+                conn.execute(f"PRAGMA user_version = {int(m.version)}")
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                logger.exception(f"Falló la migración {m.version}")
+                raise
+            applied.append(m.version)
+    finally:
+        conn.close()
+    return applied
+
+def init_app(app):
+    """Aplica las migraciones pendientes al iniciar la app"""
+    try:
+        applied = apply_migrations(app.config['DATABASE_PATH'])
+        if applied:
+            logger.info(f"Migraciones aplicadas: {applied}")
+    except sqlite3.Error as e:
+        logger.error(f"Error aplicando migraciones: {e}")
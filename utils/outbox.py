@@ -0,0 +1,278 @@
+import random
+import time
+import logging
+from typing import Dict, Any, Callable, List, Optional
+
+from flask import current_app
+
+from utils import catalog_sync
+from utils import pos_sync
+from utils import queries
+from utils import serializer
+
+logger = logging.getLogger(__name__)
+
+class OutboxDelivery:
+    """Entrega el outbox a cada POS por lotes, con ack, reintentos y dead letter.
+
+    Los triggers de productos encolan cada cambio en sync_outbox en la
+    misma transacción que lo escribe. Cada POS avanza su propio cursor
+    (clientes_pos.version_productos) solo cuando confirma el lote con 200.
+    Un POS que no responde se reintenta con backoff sin perder nada; uno
+    que rechaza el mismo lote max_attempts veces lo manda a
+    sync_outbox_fallidos y sigue con el próximo.
+    """
+
+    def __init__(self, get_connection: Callable, run_write: Callable, batch_size: int = 500,
+                 max_attempts: int = 5, backoff_base: float = 30.0, backoff_max: float = 1800.0,
+                 timeout: float = 10.0, connect_timeout: float = 3.0, max_workers: int = 16):
+        self.get_connection = get_connection
+        self.run_write = run_write
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.timeout = timeout
+        self.connect_timeout = connect_timeout
+        self.max_workers = max_workers
+
+    def _backoff(self, intentos: int) -> float:
+        """Segundos hasta el próximo intento: exponencial con jitter"""
+        return min(self.backoff_max, self.backoff_base * 2 ** (intentos - 1)) * random.uniform(0.5, 1.0)
+
+    # ------------------------------------------------------------------
+    # Lectura: qué le toca a cada POS
+    # ------------------------------------------------------------------
+    def _preparar(self, conn):
+        """Arma los cuerpos por POS; retorna (clientes, cuerpos, entregas, con_outbox)"""
+        hasta = catalog_sync.version_actual(conn)
+        if hasta is None:
+            # Backend sin triggers ni outbox (PostgreSQL): catálogo completo a todos
+            clientes = conn.execute("SELECT * FROM clientes_pos WHERE activo = 1").fetchall()
+            payload = catalog_sync.payload(conn, 0, None)
+            body = serializer.dumps(payload)
+            entregas = {c['id_cliente']: {'desde': 0, 'hasta': None, 'entradas': len(payload['productos']),
+                                          'bytes': len(body), 'intentos': 0, 'mas_antiguo': None, 'mas': False}
+                        for c in clientes}
+            return clientes, {id_cliente: body for id_cliente in entregas}, entregas, False
+
+        row = queries.fetchone(conn, 'outbox.purgado')
+        purgado = row[0] if row else 0
+        cuerpos_por_lote: Dict[tuple, tuple] = {}  # (desde, hasta) -> (cuerpo, productos)
+        clientes, cuerpos, entregas = [], {}, {}
+        for cliente in queries.fetchall(conn, 'outbox.clientes'):
+            desde = cliente['version_productos'] or 0
+            if desde > hasta:
+                desde = 0  # base restaurada a una versión anterior
+            if desde == hasta:
+                continue
+            entrega = {'desde': desde, 'intentos': cliente['intentos'], 'mas_antiguo': None, 'mas': False}
+
+            if desde == 0 or desde < purgado:
+                # POS nuevo o más atrasado que lo que conserva el outbox
+                clave = (0, hasta)
+                if clave not in cuerpos_por_lote:
+                    payload = catalog_sync.payload(conn, 0, hasta)
+                    cuerpos_por_lote[clave] = (serializer.dumps(payload), len(payload['productos']))
+                entrega.update(desde=0, hasta=hasta, entradas=cuerpos_por_lote[clave][1])
+            else:
+                lote = queries.fetchone(conn, 'outbox.lote',
+                                        {'desde': desde, 'hasta': hasta, 'limite': self.batch_size})
+                if not lote['entradas']:
+                    # Solo cambiaron nombres de categorías o marcas: nada que enviar
+                    entregas[cliente['id_cliente']] = dict(entrega, hasta=hasta, entradas=0, sin_cambios=True)
+                    continue
+                mas = lote['entradas'] >= self.batch_size
+                hasta_lote = lote['hasta'] if mas else hasta
+                clave = (desde, hasta_lote)
+                if clave not in cuerpos_por_lote:
+                    columns, rows = queries.fetch_rows(conn, 'outbox.productos',
+                                                       {'desde': desde, 'hasta': hasta_lote})
+                    productos, eliminados = catalog_sync.separar(columns, rows)
+                    cuerpos_por_lote[clave] = (serializer.dumps(
+                        catalog_sync.armar(productos, eliminados, desde, hasta_lote)), len(rows))
+                entrega.update(hasta=hasta_lote, entradas=lote['entradas'],
+                               mas_antiguo=lote['mas_antiguo'], mas=mas)
+
+            cuerpos[cliente['id_cliente']] = cuerpos_por_lote[clave][0]
+            entrega['bytes'] = len(cuerpos_por_lote[clave][0])
+            entregas[cliente['id_cliente']] = entrega
+            clientes.append(cliente)
+        return clientes, cuerpos, entregas, True
+
+    # ------------------------------------------------------------------
+    # Escritura: acks, reintentos, dead letter y métricas
+    # ------------------------------------------------------------------
+    def _log(self, conn, id_cliente: int, entrega: Dict[str, Any], estado: str,
+             error: Optional[str], duracion_ms: float):
+        entradas = entrega['entradas']
+        conn.execute("""
+            INSERT INTO sincronizacion_log (
+                tipo_sincronizacion, direccion, registros_procesados, registros_exitosos,
+                registros_fallidos, fecha_inicio, fecha_fin, estado, error_mensaje,
+                id_cliente, bytes_enviados, duracion_ms, lag_segundos
+            ) VALUES ('productos', 'enviado', ?, ?, ?, datetime('now', ?), CURRENT_TIMESTAMP, ?, ?, ?, ?, ?,
+                      (julianday('now') - julianday(?)) * 86400)
+        """, (entradas, entradas if estado == 'completado' else 0, 0 if estado == 'completado' else entradas,
+              f"-{duracion_ms / 1000:.3f} seconds", estado, error, id_cliente, entrega['bytes'],
+              round(duracion_ms, 1), entrega['mas_antiguo'] if estado == 'completado' else None))
+
+    def _registrar(self, conn, entregas: Dict[int, Dict[str, Any]], resultados, duracion_ms: float,
+                   con_outbox: bool):
+        for estado, error, id_cliente in resultados:
+            entrega = entregas[id_cliente]
+            if estado == 'conectado':
+                conn.execute("""
+                    UPDATE clientes_pos
+                    SET estado = 'conectado', ultima_sincronizacion = CURRENT_TIMESTAMP,
+                        version_productos = COALESCE(?, version_productos)
+                    WHERE id_cliente = ?
+                """, (entrega['hasta'], id_cliente))
+                if con_outbox:
+                    conn.execute("DELETE FROM sync_entregas WHERE id_cliente = ?", (id_cliente,))
+                    self._log(conn, id_cliente, entrega, 'completado', None, duracion_ms)
+                continue
+
+            conn.execute("UPDATE clientes_pos SET estado = ?, ultimo_error = ? WHERE id_cliente = ?",
+                         (estado, error, id_cliente))
+            if not con_outbox:
+                continue
+            self._log(conn, id_cliente, entrega, 'error', error, duracion_ms)
+            intentos = entrega['intentos'] + 1
+            if estado == 'error' and intentos >= self.max_attempts:
+                # El POS responde pero rechaza este lote: se aparta para no frenar los siguientes
+                conn.execute("""
+                    INSERT INTO sync_outbox_fallidos (id_cliente, desde, hasta, intentos, error)
+                    VALUES (?, ?, ?, ?, ?)
+                """, (id_cliente, entrega['desde'], entrega['hasta'], intentos, error))
+                conn.execute("UPDATE clientes_pos SET version_productos = ? WHERE id_cliente = ?",
+                             (entrega['hasta'], id_cliente))
+                conn.execute("DELETE FROM sync_entregas WHERE id_cliente = ?", (id_cliente,))
+                logger.error(f"Lote ({entrega['desde']}, {entrega['hasta']}] del POS {id_cliente} "
+                             f"enviado a dead letter tras {intentos} intentos: {error}")
+            else:
+                conn.execute("""
+                    INSERT OR REPLACE INTO sync_entregas (id_cliente, intentos, proximo_intento, ultimo_error)
+                    VALUES (?, ?, datetime('now', ?), ?)
+                """, (id_cliente, intentos, f"+{self._backoff(intentos):.0f} seconds", error))
+
+        for id_cliente, entrega in entregas.items():
+            if entrega.get('sin_cambios'):
+                conn.execute("UPDATE clientes_pos SET version_productos = ? WHERE id_cliente = ?",
+                             (entrega['hasta'], id_cliente))
+        if con_outbox:
+            self._purgar(conn)
+
+    def _purgar(self, conn):
+        """Borra lo que ya confirmaron todos los POS activos"""
+        confirmado = conn.execute("""
+            SELECT COALESCE(MIN(version_productos),
+                            (SELECT valor FROM sync_secuencia WHERE nombre = 'productos'))
+            FROM clientes_pos WHERE activo = 1
+        """).fetchone()[0]
+        conn.execute("DELETE FROM sync_outbox WHERE version <= ?", (confirmado,))
+        conn.execute("UPDATE sync_secuencia SET valor = MAX(valor, ?) WHERE nombre = 'outbox_purgado'",
+                     (confirmado,))
+
+    # ------------------------------------------------------------------
+    # Ciclos
+    # ------------------------------------------------------------------
+    def run_cycle(self) -> Dict[str, Any]:
+        """Un lote por POS pendiente; retorna el resumen del ciclo"""
+        conn = self.get_connection()
+        try:
+            clientes, cuerpos, entregas, con_outbox = self._preparar(conn)
+        finally:
+            conn.close()
+
+        start = time.monotonic()
+        resultados = pos_sync.push_all(clientes, "/api/sync", cuerpos, timeout=self.timeout,
+                                       connect_timeout=self.connect_timeout,
+                                       max_workers=self.max_workers) if clientes else []
+        duracion_ms = (time.monotonic() - start) * 1000
+        if entregas:
+            self.run_write(self._registrar, entregas, resultados, duracion_ms, con_outbox)
+
+        ok = [id_cliente for estado, _, id_cliente in resultados if estado == 'conectado']
+        resumen = {
+            'clientes': len(clientes),
+            'confirmados': len(ok),
+            'fallidos': len(resultados) - len(ok),
+            'bytes': sum(entregas[c]['bytes'] for c in ok),
+            'duracion_ms': round(duracion_ms, 1),
+            'mas': any(entregas[c]['mas'] for c in ok),
+        }
+        if clientes:
+            logger.info(f"Outbox: {resumen['confirmados']}/{resumen['clientes']} POS confirmados, "
+                        f"{resumen['bytes']} bytes en {resumen['duracion_ms']} ms")
+        return resumen
+
+    def drain(self, max_cycles: int = 20) -> List[Dict[str, Any]]:
+        """Repite ciclos mientras algún POS confirme un lote lleno (tiene más pendiente)"""
+        resumenes = [self.run_cycle()]
+        while resumenes[-1]['mas'] and len(resumenes) < max_cycles:
+            resumenes.append(self.run_cycle())
+        return resumenes
+
+# ----------------------------------------------------------------------
+# Administración
+# ----------------------------------------------------------------------
+def estado(conn) -> Dict[str, Any]:
+    """Pendientes por POS, lotes en dead letter y las últimas entregas"""
+    pendientes = conn.execute("""
+        SELECT c.id_cliente, c.nombre, c.version_productos,
+               (SELECT COUNT(*) FROM sync_outbox o WHERE o.version > COALESCE(c.version_productos, 0))
+                   AS pendientes,
+               e.intentos, e.proximo_intento, e.ultimo_error
+        FROM clientes_pos c
+        LEFT JOIN sync_entregas e ON e.id_cliente = c.id_cliente
+        WHERE c.activo = 1
+        ORDER BY c.id_cliente
+    """).fetchall()
+    fallidos = conn.execute("""
+        SELECT id, id_cliente, desde, hasta, intentos, error, fecha
+        FROM sync_outbox_fallidos WHERE reintentado = 0 ORDER BY id DESC LIMIT 100
+    """).fetchall()
+    entregas = conn.execute("""
+        SELECT id_cliente, registros_procesados, bytes_enviados, duracion_ms, lag_segundos, estado, fecha_fin
+        FROM sincronizacion_log WHERE tipo_sincronizacion = 'productos' AND id_cliente IS NOT NULL
+        ORDER BY id_log DESC LIMIT 50
+    """).fetchall()
+    return {
+        'clientes': [dict(r) for r in pendientes],
+        'fallidos': [dict(r) for r in fallidos],
+        'entregas': [dict(r) for r in entregas],
+    }
+
+def reintentar_fallido(conn, id_fallido: int) -> bool:
+    """Vuelve el cursor del POS al inicio del lote fallido para reenviarlo"""
+    fallido = conn.execute("SELECT id_cliente, desde FROM sync_outbox_fallidos WHERE id = ? AND reintentado = 0",
+                           (id_fallido,)).fetchone()
+    if fallido is None:
+        return False
+    conn.execute("""
+        UPDATE clientes_pos SET version_productos = MIN(COALESCE(version_productos, 0), ?)
+        WHERE id_cliente = ?
+    """, (fallido[1], fallido[0]))
+    conn.execute("UPDATE sync_outbox_fallidos SET reintentado = 1 WHERE id = ?", (id_fallido,))
+    conn.execute("DELETE FROM sync_entregas WHERE id_cliente = ?", (fallido[0],))
+    return True
+
+def get_delivery() -> Optional[OutboxDelivery]:
+    return current_app.extensions.get('sync_outbox')
+
+def init_app(app):
+    """Crea el entregador del outbox con la configuración de sincronización"""
+    delivery = OutboxDelivery(
+        get_connection=lambda: app.extensions['db_backend'].get_connection(),
+        run_write=lambda fn, *args: app.extensions['db_writer'].run(fn, *args),
+        batch_size=app.config.get('OUTBOX_BATCH_SIZE', 500),
+        max_attempts=app.config.get('OUTBOX_MAX_ATTEMPTS', 5),
+        backoff_base=app.config.get('OUTBOX_BACKOFF_BASE', 30),
+        backoff_max=app.config.get('OUTBOX_BACKOFF_MAX', 1800),
+        timeout=app.config.get('SYNC_TIMEOUT', 10),
+        connect_timeout=app.config.get('SYNC_CONNECT_TIMEOUT', 3),
+        max_workers=app.config.get('SYNC_MAX_WORKERS', 16),
+    )
+    app.extensions['sync_outbox'] = delivery
+    return delivery
@@ -0,0 +1,451 @@
+import re
+import threading
+import time
+import uuid
+import logging
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import lru_cache
+from typing import Optional, Dict, Any, Callable, Iterator
+
+from flask import g, has_app_context
+
+from utils.pool import PoolTimeoutError
+
+try:
+    import psycopg2
+    import psycopg2.extensions
+    import psycopg2.extras
+    import psycopg2.pool
+except ImportError:  # dependencia opcional: solo con DB_BACKEND=postgresql
+    psycopg2 = None
+
+logger = logging.getLogger(__name__)
+
+DIALECT = 'postgresql'
+
+# ----------------------------------------------------------------------
+# Traducción del SQL escrito para SQLite
+# ----------------------------------------------------------------------
+_STRFTIME = {'%Y': 'YYYY', '%m': 'MM', '%d': 'DD', '%H': 'HH24', '%M': 'MI', '%S': 'SS',
+             '%W': 'IW', '%j': 'DDD', '%w': 'D'}
+
+def _strftime(match) -> str:
+    formato = match.group(1)
+    for sqlite_fmt, pg_fmt in _STRFTIME.items():
+        formato = formato.replace(sqlite_fmt, pg_fmt)
+    return f"to_char({match.group(2)}, '{formato}')"
+
+def _ahora(match) -> str:
+    funcion, modificador = match.group(1).upper(), match.group(2)
+    # datetime('now') de SQLite está en UTC; las columnas son TIMESTAMP sin zona
+    base = "CURRENT_DATE" if funcion == 'DATE' else "(CURRENT_TIMESTAMP AT TIME ZONE 'UTC')"
+    if not modificador:
+        return base
+    expr = f"{base} + INTERVAL '{modificador}'"
+    return f"CAST({expr} AS DATE)" if funcion == 'DATE' else f"({expr})"
+
+_REESCRITURAS = (
+    (re.compile(r"\b(DATE|DATETIME)\(\s*'now'\s*(?:,\s*'([^']*)'\s*)?\)", re.I), _ahora),
+    (re.compile(r"\bstrftime\(\s*'([^']*)'\s*,\s*([\w.]+)\s*\)", re.I), _strftime),
+    (re.compile(r"\bDATE\(\s*([\w.]+)\s*\)", re.I), r"CAST(\1 AS DATE)"),
+    (re.compile(r"\bIFNULL\(", re.I), "COALESCE("),
+)
+_INSERT_OR_IGNORE = re.compile(r"\bINSERT\s+OR\s+IGNORE\s+INTO\b", re.I)
+
+def _placeholders(sql: str) -> str:
+    """? -> %s, :nombre -> %(nombre)s y % -> %% fuera de literales y comentarios"""
+    out = []
+    i, n = 0, len(sql)
+    while i < n:
+        ch = sql[i]
+        if ch in ("'", '"'):
+            fin = i + 1
+            while fin < n:
+                if sql[fin] == ch:
+                    if fin + 1 < n and sql[fin + 1] == ch:
+                        fin += 2
+                        continue
+                    break
+                fin += 1
+            out.append(sql[i:fin + 1].replace('%', '%%'))
+            i = fin + 1
+        elif sql.startswith('--', i):
+            fin = sql.find('\n', i)
+            fin = n if fin == -1 else fin
+            out.append(sql[i:fin].replace('%', '%%'))
+            i = fin
+        elif ch == '?':
+            out.append('%s')
+            i += 1
+        elif ch == ':' and i + 1 < n and (sql[i + 1].isalpha() or sql[i + 1] == '_') \
+                and (i == 0 or sql[i - 1] != ':'):
+            fin = i + 1
+            while fin < n and (sql[fin].isalnum() or sql[fin] == '_'):
+                fin += 1
+            out.append(f"%({sql[i + 1:fin]})s")
+            i = fin
+        elif ch == '%':
+            out.append('%%')
+            i += 1
+        else:
+            out.append(ch)
+            i += 1
+    return ''.join(out)
+
+@lru_cache(maxsize=1024)
+def translate_sql(sql: str) -> str:
+    """Adapta una sentencia escrita para SQLite al dialecto de PostgreSQL"""
+    for patron, reemplazo in _REESCRITURAS:
+        sql = patron.sub(reemplazo, sql)
+    if _INSERT_OR_IGNORE.search(sql):
+        sql = _INSERT_OR_IGNORE.sub('INSERT INTO', sql).rstrip().rstrip(';') + ' ON CONFLICT DO NOTHING'
+    return _placeholders(sql)
+
+# ----------------------------------------------------------------------
+# Conexiones con la interfaz de sqlite3
+# ----------------------------------------------------------------------
+def _configure(raw):
+    """Fechas como texto ISO y NUMERIC como float, igual que en SQLite"""
+    as_text = psycopg2.extensions.new_type((1082, 1083, 1114, 1184), 'PG_FECHA_TEXTO',
+                                           lambda value, cur: value)
+    as_float = psycopg2.extensions.new_type((1700,), 'PG_NUMERIC_FLOAT',
+                                            lambda value, cur: float(value) if value is not None else None)
+    psycopg2.extensions.register_type(as_text, raw)
+    psycopg2.extensions.register_type(as_float, raw)
+
+class PgCursor:
+    """Cursor de psycopg2 con la interfaz de sqlite3 (?, lastrowid, row_factory)"""
+
+    def __init__(self, conn: 'PgConnection', name: Optional[str] = None, itersize: int = 2000):
+        self.connection = conn
+        self.row_factory = conn.row_factory
+        self._name = name
+        self._itersize = itersize
+        self._cursor = None
+
+    def _open(self):
+        if self._cursor is None:
+            factory = psycopg2.extras.DictCursor if self.row_factory is not None else None
+            if self._name:
+                self._cursor = self.connection.raw.cursor(name=self._name, cursor_factory=factory)
+                self._cursor.itersize = self._itersize
+            else:
+                self._cursor = self.connection.raw.cursor(cursor_factory=factory)
+        return self._cursor
+
+    def __getattr__(self, name):
+        return getattr(self._open(), name)
+
+    def execute(self, sql, parameters=()):
+        self._open().execute(translate_sql(sql), parameters if parameters is not None else ())
+        return self
+
+    def executemany(self, sql, seq_of_parameters):
+        psycopg2.extras.execute_batch(self._open(), translate_sql(sql), list(seq_of_parameters))
+        return self
+
+    def executescript(self, script):
+        self._open().execute(script)
+        return self
+
+    @property
+    def lastrowid(self):
+        """Último id SERIAL generado en la sesión (lastrowid de sqlite3)"""
+        with self.connection.raw.cursor() as cursor:
+            cursor.execute("SAVEPOINT pg_lastrowid")
+            try:
+                cursor.execute("SELECT lastval()")
+                value = cursor.fetchone()[0]
+            except psycopg2.Error:
+                cursor.execute("ROLLBACK TO SAVEPOINT pg_lastrowid")
+                value = None
+            cursor.execute("RELEASE SAVEPOINT pg_lastrowid")
+        return value
+
+    def fetchone(self):
+        return self._open().fetchone()
+
+    def fetchmany(self, size=None):
+        cursor = self._open()
+        return cursor.fetchmany(size if size is not None else cursor.arraysize)
+
+    def fetchall(self):
+        return self._open().fetchall()
+
+    def __iter__(self):
+        return iter(self._open())
+
+    def close(self):
+        if self._cursor is not None and not self._cursor.closed:
+            self._cursor.close()
+
+class PgConnection:
+    """Conexión de PostgreSQL que se usa como sqlite3.Connection y vuelve al pool al cerrarse"""
+
+    dialect = DIALECT
+
+    def __init__(self, pool: 'PgPool', raw):
+        self._pool = pool
+        self._conn = raw
+        self._created = time.monotonic()
+        self._bound = False
+        self._checked_out = False
+        # Como sqlite3.Row: acceso por nombre y por posición
+        self.row_factory = True
+
+    @property
+    def raw(self):
+        return self._conn
+
+    @property
+    def in_transaction(self) -> bool:
+        return self._conn.info.transaction_status != psycopg2.extensions.TRANSACTION_STATUS_IDLE
+
+    def cursor(self, name: Optional[str] = None):
+        return PgCursor(self, name, self._pool.itersize)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+    def executescript(self, script):
+        return self.cursor().executescript(script)
+
+    def commit(self):
+        self._conn.commit()
+
+    def rollback(self):
+        self._conn.rollback()
+
+    def close(self):
+        """Devuelve la conexión al pool (no-op si está ligada al contexto)"""
+        if self._bound or not self._checked_out:
+            return
+        self._pool.release(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.commit()
+        else:
+            self.rollback()
+        return False
+
+class PgPool:
+    """Pool acotado de conexiones PostgreSQL (ThreadedConnectionPool con espera)"""
+
+    def __init__(self, dsn: str, minconn: int = 1, maxconn: int = 10,
+                 timeout: float = 30.0, itersize: int = 2000):
+        if psycopg2 is None:
+            raise RuntimeError("DB_BACKEND=postgresql requiere psycopg2 (pip install psycopg2-binary)")
+        self.dsn = dsn
+        self.size = maxconn
+        self.timeout = timeout
+        self.itersize = itersize
+        self.query_log = None
+        self._pool = psycopg2.pool.ThreadedConnectionPool(minconn, maxconn, dsn)
+        # ThreadedConnectionPool falla si está agotado: el semáforo hace esperar
+        self._slots = threading.BoundedSemaphore(maxconn)
+        self._lock = threading.Lock()
+        self._stats = {'checkouts': 0, 'waits': 0, 'wait_time_total': 0.0, 'timeouts': 0,
+                       'in_use': 0, 'discarded': 0}
+
+    def acquire(self) -> PgConnection:
+        start = time.monotonic()
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self._stats['waits'] += 1
+            if not self._slots.acquire(timeout=self.timeout):
+                with self._lock:
+                    self._stats['timeouts'] += 1
+                raise PoolTimeoutError(f"Sin conexiones libres tras {self.timeout}s")
+            with self._lock:
+                self._stats['wait_time_total'] += time.monotonic() - start
+        try:
+            raw = self._pool.getconn()
+            if not getattr(raw, '_admin_configurada', False):
+                _configure(raw)
+                raw._admin_configurada = True
+        except Exception:
+            self._slots.release()
+            raise
+        with self._lock:
+            self._stats['checkouts'] += 1
+            self._stats['in_use'] += 1
+        conn = PgConnection(self, raw)
+        conn._checked_out = True
+        return conn
+
+    def release(self, conn: PgConnection):
+        """Devuelve una conexión al pool descartando cambios sin confirmar"""
+        conn._checked_out = False
+        conn._bound = False
+        discard = bool(conn.raw.closed)
+        if not discard:
+            try:
+                if conn.in_transaction:
+                    conn.raw.rollback()
+            except psycopg2.Error:
+                discard = True
+        try:
+            self._pool.putconn(conn.raw, close=discard)
+        finally:
+            with self._lock:
+                self._stats['in_use'] -= 1
+                if discard:
+                    self._stats['discarded'] += 1
+            self._slots.release()
+
+    def close_all(self):
+        self._pool.closeall()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+        stats.update({
+            'backend': DIALECT,
+            'size': self.size,
+            'idle': self.size - stats['in_use'],
+            'avg_wait_ms': round(stats['wait_time_total'] / stats['waits'] * 1000, 2) if stats['waits'] else 0,
+        })
+        stats['wait_time_total'] = round(stats['wait_time_total'], 4)
+        return stats
+
+    def get_connection(self) -> PgConnection:
+        """Conexión ligada al contexto de la app, como utils.pool.get_connection"""
+        if not has_app_context():
+            return self.acquire()
+        conn = g.get('_pg_connection')
+        if conn is None:
+            conn = self.acquire()
+            conn._bound = True
+            g._pg_connection = conn
+        return conn
+
+def release_context_connection(exc: Optional[BaseException] = None):
+    conn = g.pop('_pg_connection', None)
+    if conn is not None:
+        conn._pool.release(conn)
+
+def iter_rows(conn: PgConnection, sql: str, params=()) -> Iterator:
+    """Recorre un resultado grande con un cursor del lado del servidor"""
+    cursor = conn.cursor(name=f"reporte_{uuid.uuid4().hex[:12]}")
+    try:
+        cursor.execute(sql, params)
+        for row in cursor:
+            yield row
+    finally:
+        cursor.close()
+
+# ----------------------------------------------------------------------
+# Escrituras
+# ----------------------------------------------------------------------
+class PgWriter:
+    """Misma interfaz que utils.writer.WriteQueue sobre PostgreSQL.
+
+    Con MVCC no hace falta serializar: cada trabajo corre en su propia
+    transacción con una conexión del pool, varios a la vez.
+    """
+
+    def __init__(self, pool: PgPool, workers: int = 4):
+        self.pool = pool
+        self.workers = workers
+        self.query_log = None
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='pg-writer')
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._stats = {'submitted': 0, 'committed': 0, 'failed': 0, 'commit_time_total': 0.0}
+
+    def start(self):
+        pass
+
+    def stop(self, timeout: float = 5.0):
+        self._executor.shutdown(wait=True)
+
+    def _job(self, fn: Callable, args, kwargs):
+        conn = self.pool.acquire()
+        self._local.conn = conn
+        try:
+            result = fn(conn, *args, **kwargs)
+            start = time.perf_counter()
+            conn.commit()
+            with self._lock:
+                self._stats['committed'] += 1
+                self._stats['commit_time_total'] += time.perf_counter() - start
+            return result
+        except Exception:
+            conn.rollback()
+            with self._lock:
+                self._stats['failed'] += 1
+            raise
+        finally:
+            self._local.conn = None
+            conn.close()
+
+    def submit(self, fn: Callable, *args, **kwargs) -> Future:
+        """Encola un trabajo de escritura y retorna su Future"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            # Llamada reentrante desde otro trabajo: misma transacción
+            future = Future()
+            try:
+                future.set_result(fn(conn, *args, **kwargs))
+            except Exception as e:
+                future.set_exception(e)
+            return future
+        with self._lock:
+            self._stats['submitted'] += 1
+        return self._executor.submit(self._job, fn, args, kwargs)
+
+    def run(self, fn: Callable, *args, timeout: Optional[float] = None, **kwargs):
+        """Encola un trabajo y espera su resultado (ya confirmado)"""
+        return self.submit(fn, *args, **kwargs).result(timeout=timeout)
+
+    def execute(self, sql: str, params=()) -> Future:
+        return self.submit(lambda conn: conn.execute(sql, params).rowcount)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+        stats.update({
+            'backend': DIALECT,
+            'workers': self.workers,
+            'running': True,
+            'avg_commit_ms': round(stats['commit_time_total'] / stats['committed'] * 1000, 2)
+            if stats['committed'] else 0,
+        })
+        stats['commit_time_total'] = round(stats['commit_time_total'], 4)
+        return stats
+
+# ----------------------------------------------------------------------
+# Esquema
+# ----------------------------------------------------------------------
+_DDL_TIPOS = (
+    (re.compile(r"\bINTEGER\s+PRIMARY\s+KEY(\s+AUTOINCREMENT)?\b", re.I), "SERIAL PRIMARY KEY"),
+    (re.compile(r"\bAUTOINCREMENT\b", re.I), ""),
+    (re.compile(r"\bDATETIME\b", re.I), "TIMESTAMP"),
+    (re.compile(r"\b(REAL|DOUBLE|FLOAT)\b", re.I), "DOUBLE PRECISION"),
+    (re.compile(r"\bBOOLEAN\b", re.I), "INTEGER"),
+    (re.compile(r"\bBLOB\b", re.I), "BYTEA"),
+    (re.compile(r"\s+COLLATE\s+NOCASE\b", re.I), ""),
+    (re.compile(r"DEFAULT\s*\(\s*datetime\(\s*'now'[^)]*\)\s*\)", re.I), "DEFAULT CURRENT_TIMESTAMP"),
+)
+_REFERENCES = re.compile(
+    r"(REFERENCES\s+\w+\s*(?:\([^)]*\))?(?:\s+ON\s+(?:DELETE|UPDATE)\s+"
+    r"(?:CASCADE|SET\s+NULL|SET\s+DEFAULT|RESTRICT|NO\s+ACTION))*)", re.I)
+
+def sqlite_ddl_to_postgres(sql: str, foreign_keys: bool = True) -> str:
+    """Convierte un CREATE TABLE/INDEX de SQLite a PostgreSQL"""
+    for patron, reemplazo in _DDL_TIPOS:
+        sql = patron.sub(reemplazo, sql)
+    if foreign_keys:
+        # Diferidas: la copia de datos no depende del orden de las tablas
+        sql = _REFERENCES.sub(r"\1 DEFERRABLE INITIALLY DEFERRED", sql)
+    else:
+        sql = re.sub(r",\s*FOREIGN\s+KEY\s*\([^)]*\)\s*" + _REFERENCES.pattern, "", sql, flags=re.I)
+        sql = _REFERENCES.sub("", sql)
+    return sql
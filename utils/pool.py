@@ -0,0 +1,325 @@
+import sqlite3
+import threading
+import time
+import logging
+from typing import Optional, Dict, Any, List
+
+from flask import g, has_app_context
+
+from utils.storage import BusyRetryPolicy, WAL_PRAGMAS, retry_policy_from_config
+from utils.query_log import InstrumentedCursor
+
+logger = logging.getLogger(__name__)
+
+# Pragmas que se aplican una sola vez al abrir cada conexión del pool
+DEFAULT_PRAGMAS = (
+    ("cache_size", "-8000"),    # ~8 MB de caché de páginas por conexión
+    ("temp_store", "MEMORY"),
+    ("busy_timeout", "5000"),
+)
+
+class PoolTimeoutError(RuntimeError):
+    """No hubo conexiones libres dentro del tiempo de espera"""
+
+class PooledConnection:
+    """Envoltura de sqlite3.Connection que vuelve al pool al cerrarse"""
+
+    def __init__(self, pool: 'ConnectionPool', conn: sqlite3.Connection):
+        self._pool = pool
+        self._conn = conn
+        self._created = time.monotonic()
+        self._last_used = self._created
+        self._bound = False
+        self._checked_out = False
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    @property
+    def raw(self) -> sqlite3.Connection:
+        return self._conn
+
+    # Operaciones que pueden fallar con SQLITE_BUSY pasan por la política de reintentos
+    def cursor(self):
+        query_log = self._pool.query_log
+        if query_log is None:
+            return self._conn.cursor()
+        return InstrumentedCursor(self._conn.cursor(), query_log, self._pool.retry_policy)
+
+    def execute(self, sql, parameters=()):
+        if self._pool.query_log is not None:
+            return self.cursor().execute(sql, parameters)
+        return self._pool.retry_policy.call(self._conn.execute, sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        if self._pool.query_log is not None:
+            return self.cursor().executemany(sql, seq_of_parameters)
+        return self._pool.retry_policy.call(self._conn.executemany, sql, seq_of_parameters)
+
+    def executescript(self, script):
+        return self._pool.retry_policy.call(self._conn.executescript, script)
+
+    def commit(self):
+        return self._pool.retry_policy.call(self._conn.commit)
+
+    def close(self):
+        """Devuelve la conexión al pool (no-op si está ligada al contexto)"""
+        if self._bound or not self._checked_out:
+            return
+        self._pool.release(self)
+
+    def __del__(self):
+        # Conexión perdida sin close(): se descarta para no agotar el pool
+        if getattr(self, '_checked_out', False) and not self._bound:
+            self._checked_out = False
+            self._pool._destroy(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        # Misma semántica que sqlite3.Connection: commit/rollback, sin cerrar
+        if exc_type is None:
+            self.commit()
+        else:
+            self._conn.rollback()
+        return False
+
+class ConnectionPool:
+    """Pool acotado de conexiones SQLite compartido entre hilos"""
+
+    def __init__(self, db_path: str, size: int = 10, timeout: float = 30.0,
+                 max_lifetime: float = 3600.0, health_check_interval: float = 60.0,
+                 pragmas=DEFAULT_PRAGMAS, retry_policy: Optional[BusyRetryPolicy] = None,
+                 cached_statements: int = 256, attach=()):
+        self.db_path = db_path
+        # (alias, ruta) de bases adjuntas a cada conexión (p. ej. el catálogo en un shard)
+        self.attach = tuple(attach)
+        self.size = size
+        self.timeout = timeout
+        self.max_lifetime = max_lifetime
+        self.health_check_interval = health_check_interval
+        self.pragmas = tuple(pragmas)
+        self.retry_policy = retry_policy or BusyRetryPolicy()
+        self.cached_statements = cached_statements
+        self.query_log = None  # lo asigna utils.query_log.init_app
+
+        self._idle: List[PooledConnection] = []
+        self._total = 0
+        self._cond = threading.Condition()
+        self._stats = {
+            'checkouts': 0,
+            'waits': 0,
+            'wait_time_total': 0.0,
+            'timeouts': 0,
+            'created': 0,
+            'recycled': 0,
+            'discarded': 0,
+            'lifetime_total': 0.0,
+        }
+
+    # ------------------------------------------------------------------
+    # Apertura y validación de conexiones
+    # ------------------------------------------------------------------
+    def _open(self) -> PooledConnection:
+        conn = sqlite3.connect(self.db_path, check_same_thread=False,
+                               cached_statements=self.cached_statements)
+        conn.row_factory = sqlite3.Row
+        for pragma, value in self.pragmas:
+            conn.execute(f"PRAGMA {pragma} = {value}")
+        for alias, path in self.attach:
+            conn.execute(f"ATTACH DATABASE ? AS {alias}", (path,))
+        with self._cond:
+            self._stats['created'] += 1
+        return PooledConnection(self, conn)
+
+    def _is_healthy(self, pooled: PooledConnection) -> bool:
+        now = time.monotonic()
+        if now - pooled._created > self.max_lifetime:
+            with self._cond:
+                self._stats['recycled'] += 1
+            return False
+        if now - pooled._last_used < self.health_check_interval:
+            return True
+        try:
+            pooled._conn.execute("SELECT 1").fetchone()
+            return True
+        except sqlite3.Error as e:
+            logger.warning(f"Conexión descartada por health check: {e}")
+            with self._cond:
+                self._stats['discarded'] += 1
+            return False
+
+    def _destroy(self, pooled: PooledConnection):
+        try:
+            pooled._conn.close()
+        except sqlite3.Error:
+            pass
+        with self._cond:
+            self._total -= 1
+            self._stats['lifetime_total'] += time.monotonic() - pooled._created
+            self._cond.notify()
+
+    # ------------------------------------------------------------------
+    # Checkout / release
+    # ------------------------------------------------------------------
+    def acquire(self) -> PooledConnection:
+        """Obtiene una conexión del pool, esperando si está agotado"""
+        deadline = time.monotonic() + self.timeout
+        waited = False
+        wait_start = None
+
+        while True:
+            with self._cond:
+                while not self._idle and self._total >= self.size:
+                    if not waited:
+                        waited = True
+                        wait_start = time.monotonic()
+                        self._stats['waits'] += 1
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._stats['timeouts'] += 1
+                        raise PoolTimeoutError(
+                            f"Sin conexiones libres tras {self.timeout}s (pool de {self.size})")
+                    self._cond.wait(remaining)
+
+                if waited:
+                    self._stats['wait_time_total'] += time.monotonic() - wait_start
+                    waited = False
+
+                pooled = self._idle.pop() if self._idle else None
+                if pooled is None:
+                    self._total += 1
+
+            if pooled is None:
+                try:
+                    pooled = self._open()
+                except Exception:
+                    with self._cond:
+                        self._total -= 1
+                        self._cond.notify()
+                    raise
+            elif not self._is_healthy(pooled):
+                self._destroy(pooled)
+                continue
+
+            with self._cond:
+                self._stats['checkouts'] += 1
+            pooled._checked_out = True
+            pooled._last_used = time.monotonic()
+            return pooled
+
+    def release(self, pooled: PooledConnection):
+        """Devuelve una conexión al pool descartando cambios sin confirmar"""
+        pooled._checked_out = False
+        pooled._bound = False
+        try:
+            if pooled._conn.in_transaction:
+                pooled._conn.rollback()
+        except sqlite3.Error:
+            self._destroy(pooled)
+            return
+
+        if time.monotonic() - pooled._created > self.max_lifetime:
+            with self._cond:
+                self._stats['recycled'] += 1
+            self._destroy(pooled)
+            return
+
+        pooled._last_used = time.monotonic()
+        with self._cond:
+            self._idle.append(pooled)
+            self._cond.notify()
+
+    def close_all(self):
+        """Cierra las conexiones ociosas del pool"""
+        with self._cond:
+            idle, self._idle = self._idle, []
+        for pooled in idle:
+            self._destroy(pooled)
+
+    def stats(self) -> Dict[str, Any]:
+        """Estadísticas del pool para monitoreo"""
+        with self._cond:
+            stats = dict(self._stats)
+            idle = len(self._idle)
+            total = self._total
+            now = time.monotonic()
+            ages = [now - p._created for p in self._idle]
+
+        closed = stats['created'] - total
+        stats.update({
+            'db_path': self.db_path,
+            'size': self.size,
+            'open': total,
+            'idle': idle,
+            'in_use': total - idle,
+            'avg_wait_ms': round(stats['wait_time_total'] / stats['waits'] * 1000, 2) if stats['waits'] else 0,
+            'avg_lifetime_s': round(stats['lifetime_total'] / closed, 2) if closed > 0 else 0,
+            'oldest_idle_s': round(max(ages), 2) if ages else 0,
+        })
+        stats.update(self.retry_policy.stats())
+        stats['wait_time_total'] = round(stats['wait_time_total'], 4)
+        stats['lifetime_total'] = round(stats['lifetime_total'], 2)
+        return stats
+
+# ----------------------------------------------------------------------
+# Registro de pools por ruta de base de datos
+# ----------------------------------------------------------------------
+_pools: Dict[str, ConnectionPool] = {}
+_pools_lock = threading.Lock()
+
+def get_pool(db_path: str, **kwargs) -> ConnectionPool:
+    """Obtiene (o crea) el pool compartido para una base de datos"""
+    with _pools_lock:
+        pool = _pools.get(db_path)
+        if pool is None:
+            pool = ConnectionPool(db_path, **kwargs)
+            _pools[db_path] = pool
+        return pool
+
+def get_connection(db_path: str) -> PooledConnection:
+    """Conexión ligada al contexto de la app o, fuera de él, una conexión propia.
+
+    Dentro de un request todas las llamadas comparten la misma conexión y
+    close() no la libera; se devuelve al pool en el teardown del contexto.
+    """
+    pool = get_pool(db_path)
+    if not has_app_context():
+        return pool.acquire()
+
+    bound = g.setdefault('_db_connections', {})
+    pooled = bound.get(db_path)
+    if pooled is None:
+        pooled = pool.acquire()
+        pooled._bound = True
+        bound[db_path] = pooled
+    return pooled
+
+def release_context_connections(exc: Optional[BaseException] = None):
+    """Libera las conexiones ligadas al contexto actual"""
+    bound = g.pop('_db_connections', None)
+    if not bound:
+        return
+    for pooled in bound.values():
+        pooled._pool.release(pooled)
+
+def init_app(app):
+    """Crea el pool de la app y registra la liberación en el teardown"""
+    pragmas = DEFAULT_PRAGMAS
+    if app.config.get('DB_JOURNAL_MODE', 'WAL').upper() == 'WAL':
+        pragmas = DEFAULT_PRAGMAS + WAL_PRAGMAS
+
+    pool = get_pool(
+        app.config['DATABASE_PATH'],
+        size=app.config.get('DB_POOL_SIZE', 10),
+        timeout=app.config.get('DB_POOL_TIMEOUT', 30),
+        max_lifetime=app.config.get('DB_POOL_MAX_LIFETIME', 3600),
+        health_check_interval=app.config.get('DB_POOL_HEALTH_CHECK', 60),
+        pragmas=pragmas,
+        retry_policy=retry_policy_from_config(app.config),
+        cached_statements=app.config.get('DB_CACHED_STATEMENTS', 256),
+    )
+    app.extensions['db_pool'] = pool
+    app.teardown_appcontext(release_context_connections)
+    return pool
@@ -0,0 +1,185 @@
+import random
+import threading
+import time
+import logging
+from typing import Dict, Any
+
+import requests
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+# Respuestas que indican un POS momentáneamente no disponible: se reintentan
+RETRY_STATUS = (502, 503, 504)
+
+class CircuitOpenError(requests.exceptions.ConnectionError):
+    """El POS falló varias veces seguidas: no se lo llama hasta que pase el reset"""
+
+class CircuitBreaker:
+    """Corta las llamadas a un POS caído y deja pasar una de prueba tras reset_timeout"""
+
+    CLOSED, OPEN, HALF_OPEN = 'cerrado', 'abierto', 'semiabierto'
+
+    def __init__(self, failure_threshold: int = 3, reset_timeout: float = 60.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at = 0.0
+        self._state = self.CLOSED
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._state
+
+    def allow(self) -> bool:
+        """True si se puede llamar; en abierto solo pasa una llamada de prueba por período"""
+        with self._lock:
+            if self._state == self.CLOSED:
+                return True
+            if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+                self._state = self.HALF_OPEN
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._state = self.CLOSED
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                if self._state != self.OPEN:
+                    logger.warning(f"Circuito abierto tras {self._failures} fallos seguidos")
+                self._state = self.OPEN
+                self._opened_at = time.monotonic()
+
+    def retry_in(self) -> float:
+        """Segundos hasta la próxima llamada de prueba (0 si no está abierto)"""
+        with self._lock:
+            if self._state != self.OPEN:
+                return 0.0
+            return max(0.0, self.reset_timeout - (time.monotonic() - self._opened_at))
+
+class POSClient:
+    """Cliente HTTP de un POS: sesión con keep-alive, reintentos con backoff y circuit breaker"""
+
+    def __init__(self, base_url: str, pool_size: int = 4, retries: int = 2,
+                 backoff_base: float = 0.5, backoff_max: float = 5.0,
+                 failure_threshold: int = 3, reset_timeout: float = 60.0):
+        self.base_url = base_url.rstrip('/')
+        self.retries = retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.breaker = CircuitBreaker(failure_threshold, reset_timeout)
+        self.session = requests.Session()
+        # Los reintentos los maneja request(): el adapter no reintenta por su cuenta
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self._lock = threading.Lock()
+        self._stats = {'requests': 0, 'retries': 0, 'failures': 0, 'rejected': 0}
+
+    def _backoff(self, intento: int) -> float:
+        """Backoff exponencial con jitter completo"""
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** intento)))
+
+    def _count(self, key: str):
+        with self._lock:
+            self._stats[key] += 1
+
+    def request(self, method: str, url: str, probe: bool = False, **kwargs) -> requests.Response:
+        """Llama al POS; probe=True ignora el circuito (prueba de conexión manual)"""
+        if not probe and not self.breaker.allow():
+            self._count('rejected')
+            raise CircuitOpenError(f"POS {self.base_url} no disponible "
+                                   f"(reintento en {self.breaker.retry_in():.0f}s)")
+        self._count('requests')
+        intento = 0
+        while True:
+            try:
+                response = self.session.request(method, url, **kwargs)
+                if response.status_code not in RETRY_STATUS or intento >= self.retries:
+                    break
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+                if intento >= self.retries:
+                    self._count('failures')
+                    self.breaker.record_failure()
+                    raise
+            self._count('retries')
+            time.sleep(self._backoff(intento))
+            intento += 1
+
+        if response.status_code in RETRY_STATUS:
+            self._count('failures')
+            self.breaker.record_failure()
+        else:
+            self.breaker.record_success()
+        return response
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url: str, **kwargs) -> requests.Response:
+        return self.request('POST', url, **kwargs)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+        stats['circuito'] = self.breaker.state
+        stats['reintento_en'] = round(self.breaker.retry_in(), 1)
+        return stats
+
+    def close(self):
+        self.session.close()
+
+# ----------------------------------------------------------------------
+# Un cliente por URL de POS, compartido entre ciclos de sincronización
+# ----------------------------------------------------------------------
+_clients: Dict[str, POSClient] = {}
+_clients_lock = threading.Lock()
+_settings: Dict[str, Any] = {'retries': 2, 'backoff_max': 5.0}
+
+def base_url(url: str) -> str:
+    """URL del POS sin la ruta de la API ('http://caja1:5001/api/sync' -> 'http://caja1:5001')"""
+    return url.split('/api/', 1)[0].rstrip('/')
+
+def get_client(url: str) -> POSClient:
+    base = base_url(url)
+    with _clients_lock:
+        client = _clients.get(base)
+        if client is None:
+            client = _clients[base] = POSClient(base, **_settings)
+        return client
+
+def max_duration(timeout) -> float:
+    """Peor caso de una llamada con todos sus reintentos (para los plazos de push_all)"""
+    total = sum(timeout) if isinstance(timeout, tuple) else timeout
+    return total * (_settings['retries'] + 1) + _settings['backoff_max'] * _settings['retries']
+
+def stats() -> Dict[str, Dict[str, Any]]:
+    with _clients_lock:
+        clients = dict(_clients)
+    return {base: client.stats() for base, client in clients.items()}
+
+def close_all():
+    with _clients_lock:
+        clients = list(_clients.values())
+        _clients.clear()
+    for client in clients:
+        client.close()
+
+def init_app(app):
+    """Configura los clientes HTTP de los POS desde app.config"""
+    close_all()
+    _settings.update(
+        pool_size=app.config.get('POS_HTTP_POOL_SIZE', 4),
+        retries=app.config.get('POS_HTTP_RETRIES', 2),
+        backoff_base=app.config.get('POS_HTTP_BACKOFF_BASE', 0.5),
+        backoff_max=app.config.get('POS_HTTP_BACKOFF_MAX', 5.0),
+        failure_threshold=app.config.get('POS_CIRCUIT_THRESHOLD', 3),
+        reset_timeout=app.config.get('POS_CIRCUIT_RESET', 60),
+    )
@@ -0,0 +1,94 @@
+import threading
+import time
+import logging
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import List, Tuple, Optional, Union, Dict
+
+from utils import compression
+from utils import pos_client
+
+logger = logging.getLogger(__name__)
+
+# (estado, error, id_cliente), el formato que registra outbox.OutboxDelivery
+Resultado = Tuple[str, Optional[str], int]
+
+# Codificación que acepta cada POS, aprendida del Accept-Encoding de sus respuestas
+_encodings: Dict[str, Optional[str]] = {}
+_encodings_lock = threading.Lock()
+
+def post(url: str, body: bytes, timeout, compress: bool = True):
+    """POST JSON al POS, comprimido si el POS anunció que lo acepta.
+
+    El primer envío a cada POS va sin comprimir; si responde con
+    Accept-Encoding, los siguientes usan la mejor codificación común. Un
+    415 (POS que dejó de aceptarla) se reintenta una vez sin comprimir.
+    """
+    base = pos_client.base_url(url)
+    with _encodings_lock:
+        encoding = _encodings.get(base) if compress else None
+    headers = {'Content-Type': 'application/json',
+               'Accept-Encoding': compression.accept_encoding_header()}
+    data = body
+    if encoding and len(body) >= compression.MIN_SIZE:
+        data = compression.compress(body, encoding)
+        headers['Content-Encoding'] = encoding
+
+    response = pos_client.get_client(url).post(url, data=data, headers=headers, timeout=timeout)
+    if response.status_code == 415 and 'Content-Encoding' in headers:
+        with _encodings_lock:
+            _encodings[base] = None
+        return post(url, body, timeout, compress=False)
+
+    with _encodings_lock:
+        _encodings[base] = compression.choose_encoding(response.headers.get('Accept-Encoding'))
+    return response
+
+def _post(url: str, body: bytes, timeout: Tuple[float, float]) -> Tuple[str, Optional[str]]:
+    try:
+        response = post(url, body, timeout)
+    except Exception as e:
+        return 'desconectado', str(e)
+    if response.status_code == 200:
+        return 'conectado', None
+    return 'error', f"HTTP {response.status_code}"
+
+def push_all(clientes, path: str, body: Union[bytes, Dict[int, bytes]], timeout: float = 10.0,
+             connect_timeout: float = 3.0, max_workers: int = 16) -> List[Resultado]:
+    """Envía el cuerpo (uno común o uno por id_cliente) a todos los clientes POS en paralelo.
+
+    Cada cliente tiene su propio plazo (conexión + lectura, con sus
+    reintentos); el ciclo completo no espera más que el plazo de un
+    cliente, así que dura lo que el más lento y no la suma de todos. Un
+    POS con el circuito abierto (ver pos_client) se descarta al instante.
+    """
+    clientes = list(clientes)
+    if not clientes:
+        return []
+
+    start = time.monotonic()
+    executor = ThreadPoolExecutor(max_workers=min(max_workers, len(clientes)),
+                                  thread_name_prefix='pos-sync')
+    bodies = body if isinstance(body, dict) else {}
+    futures = {
+        executor.submit(_post, f"{cliente['url']}{path}", bodies.get(cliente['id_cliente'], body),
+                        (connect_timeout, timeout)): cliente['id_cliente']
+        for cliente in clientes
+    }
+    # Con más clientes que workers, los últimos esperan turno: el plazo total lo contempla
+    tandas = -(-len(clientes) // max_workers)
+    done, pending = wait(futures, timeout=pos_client.max_duration((connect_timeout, timeout)) * tandas + 1)
+    # Los envíos colgados terminan solos al vencer su timeout; no se los espera
+    executor.shutdown(wait=False)
+
+    resultados = []
+    for future, id_cliente in futures.items():
+        if future in pending:
+            future.cancel()
+            resultados.append(('desconectado', f"Sin respuesta en {timeout}s", id_cliente))
+        else:
+            estado, error = future.result()
+            resultados.append((estado, error, id_cliente))
+
+    logger.info(f"Sincronización con {len(clientes)} clientes POS en "
+                f"{time.monotonic() - start:.2f}s ({len(pending)} sin respuesta)")
+    return resultados
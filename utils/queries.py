@@ -0,0 +1,441 @@
+import threading
+import time
+import logging
+from typing import Dict, Any, List, Optional
+
+logger = logging.getLogger(__name__)
+
+class Query:
+    """Sentencia con nombre y sus contadores de uso"""
+
+    __slots__ = ('name', 'sql', 'descripcion', 'calls', 'rows', 'errors', 'total_time', 'max_time')
+
+    def __init__(self, name: str, sql: str, descripcion: str = ''):
+        self.name = name
+        # El texto exacto es la clave del caché de sentencias de sqlite3:
+        # al reutilizarlo cada conexión compila la sentencia una sola vez.
+        self.sql = sql
+        self.descripcion = descripcion
+        self.calls = 0
+        self.rows = 0
+        self.errors = 0
+        self.total_time = 0.0
+        self.max_time = 0.0
+
+_registry: Dict[str, Query] = {}
+_lock = threading.Lock()
+
+def register(name: str, sql: str, descripcion: str = '') -> Query:
+    """Registra una sentencia con nombre"""
+    if name in _registry:
+        raise ValueError(f"Consulta ya registrada: {name}")
+    query = Query(name, sql, descripcion)
+    _registry[name] = query
+    return query
+
+def get(name: str) -> Query:
+    try:
+        return _registry[name]
+    except KeyError:
+        raise KeyError(f"Consulta no registrada: {name}") from None
+
+def _run(conn, name: str, params, fetch: Optional[str]):
+    query = get(name)
+    start = time.perf_counter()
+    try:
+        if fetch == 'tuples':
+            cursor = conn.cursor()
+            cursor.row_factory = None
+            cursor.execute(query.sql, params)
+            result = ([d[0] for d in cursor.description], cursor.fetchall())
+            rows = len(result[1])
+        elif fetch == 'all':
+            result = conn.execute(query.sql, params).fetchall()
+            rows = len(result)
+        elif fetch == 'one':
+            result = conn.execute(query.sql, params).fetchone()
+            rows = 0 if result is None else 1
+        else:
+            result = conn.execute(query.sql, params)
+            rows = max(result.rowcount, 0)
+    except Exception:
+        record(name, time.perf_counter() - start, error=True)
+        raise
+    record(name, time.perf_counter() - start, rows)
+    return result
+
+def record(name: str, elapsed: float, rows: int = 0, error: bool = False):
+    """Suma una ejecución a los contadores de la consulta"""
+    query = get(name)
+    with _lock:
+        if error:
+            query.errors += 1
+            return
+        query.calls += 1
+        query.rows += rows
+        query.total_time += elapsed
+        if elapsed > query.max_time:
+            query.max_time = elapsed
+
+def fetchall(conn, name: str, params=()) -> list:
+    """Ejecuta la consulta registrada y retorna todas las filas"""
+    return _run(conn, name, params, 'all')
+
+def fetchone(conn, name: str, params=()):
+    """Ejecuta la consulta registrada y retorna la primera fila"""
+    return _run(conn, name, params, 'one')
+
+def fetch_rows(conn, name: str, params=()):
+    """Como fetchall pero con filas como tuplas; retorna (columnas, filas)"""
+    return _run(conn, name, params, 'tuples')
+
+def execute(conn, name: str, params=()):
+    """Ejecuta una sentencia registrada (INSERT/UPDATE/DELETE) y retorna el cursor"""
+    return _run(conn, name, params, None)
+
+def stats() -> List[Dict[str, Any]]:
+    """Contadores por consulta, ordenados por tiempo total"""
+    with _lock:
+        data = [{
+            'name': q.name,
+            'descripcion': q.descripcion,
+            'calls': q.calls,
+            'rows': q.rows,
+            'errors': q.errors,
+            'total_ms': round(q.total_time * 1000, 2),
+            'avg_ms': round(q.total_time / q.calls * 1000, 2) if q.calls else 0,
+            'max_ms': round(q.max_time * 1000, 2),
+        } for q in _registry.values()]
+    data.sort(key=lambda q: q['total_ms'], reverse=True)
+    return data
+
+def reset_stats():
+    with _lock:
+        for q in _registry.values():
+            q.calls = q.rows = q.errors = 0
+            q.total_time = q.max_time = 0.0
+
+# ----------------------------------------------------------------------
+# Taxonomía y catálogos
+# ----------------------------------------------------------------------
+register('categorias.todas', "SELECT * FROM categorias ORDER BY nombre")
+register('subcategorias.todas', "SELECT * FROM subcategorias ORDER BY nombre")
+register('marcas.todas', "SELECT * FROM marcas ORDER BY nombre")
+register('versiones.todas', "SELECT * FROM versiones ORDER BY nombre")
+register('proveedores.todos', "SELECT id_proveedor, nombre FROM proveedores")
+register('taxonomia.version', "SELECT valor FROM sync_secuencia WHERE nombre = 'taxonomia'",
+         "Versión de categorías/subcategorías/marcas/versiones (caché en memoria)")
+register('categorias.api', "SELECT id_categoria, nombre, es_pesable FROM categorias ORDER BY nombre",
+         "Categorías para el POS")
+
+# ----------------------------------------------------------------------
+# Productos (join con categorías, subcategorías, marcas y versiones)
+# ----------------------------------------------------------------------
+# Los filtros opcionales van como parámetros con nombre (NULL = sin filtro)
+# para que todas las combinaciones compartan una sola sentencia compilada.
+
+# Listado del admin paginado por keyset: una sentencia por orden y sentido,
+# y otra para las páginas siguientes (seek desde la última fila enviada).
+# La clave de orden termina siempre en id_producto para que sea única, y
+# cada una tiene su índice parcial (migración 7): la página cuesta lo mismo
+# con cualquier tamaño de catálogo. Los nombres de la taxonomía se
+# completan desde el caché en memoria en lugar de hacer los JOIN.
+ADMIN_ORDENES = {
+    'nombre': 'p.nombre',
+    'codigo': 'p.codigo',
+    'precio': 'IFNULL(p.precio_venta, 0)',
+    'stock': 'IFNULL(p.stock, 0)',
+    'id': 'p.id_producto',
+}
+
+_ADMIN_PAGINA = """
+    SELECT
+        p.id_producto,
+        p.codigo,
+        p.nombre,
+        p.categoria_id,
+        p.subcategoria_id,
+        p.marca_id,
+        p.version_id,
+        p.precio_compra,
+        p.precio_venta,
+        p.stock,
+        p.es_pesable,
+        p.unidad_medida,
+        p.ultima_sincronizacion,
+        {clave} AS clave
+    FROM productos p
+    WHERE p.activo = 1 AND p.eliminado = 0
+      AND (:categoria_id IS NULL OR p.categoria_id = :categoria_id)
+      AND (:subcategoria_id IS NULL OR p.subcategoria_id = :subcategoria_id)
+      AND (:marca_id IS NULL OR p.marca_id = :marca_id)
+      AND (:version_id IS NULL OR p.version_id = :version_id)
+      AND (:es_pesable IS NULL OR p.es_pesable = :es_pesable){seek}
+    ORDER BY {clave} {sentido}, p.id_producto {sentido}
+    LIMIT :limite
+"""
+
+# El seek se escribe como rango sobre la clave más el desempate por id: con
+# un row value (clave, id) > (...) sqlite no busca en índices de expresiones
+_ADMIN_SEEK = """
+      AND {clave} {op}= :clave AND ({clave} {op} :clave OR p.id_producto {op} :id_producto)"""
+
+for _orden, _clave in ADMIN_ORDENES.items():
+    for _sentido, _op in (('asc', '>'), ('desc', '<')):
+        _nombre = f'productos.admin.{_orden}.{_sentido}'
+        register(_nombre, _ADMIN_PAGINA.format(clave=_clave, sentido=_sentido.upper(), seek=''),
+                 f"Primera página del listado del admin por {_orden} ({_sentido})")
+        register(f'{_nombre}.siguiente', _ADMIN_PAGINA.format(
+            clave=_clave, sentido=_sentido.upper(), seek=_ADMIN_SEEK.format(clave=_clave, op=_op)),
+            f"Página siguiente del listado del admin por {_orden} ({_sentido})")
+
+register('productos.para_venta', """
+    SELECT p.id_producto, p.codigo, p.nombre, p.precio_venta, p.stock,
+           c.nombre AS categoria, s.nombre AS subcategoria, m.nombre AS marca, v.nombre AS version
+    FROM productos p
+    LEFT JOIN categorias c ON p.categoria_id = c.id_categoria
+    LEFT JOIN subcategorias s ON p.subcategoria_id = s.id_subcategoria
+    LEFT JOIN marcas m ON p.marca_id = m.id_marca
+    LEFT JOIN versiones v ON p.version_id = v.id_version
+    WHERE p.activo = 1 AND p.eliminado = 0 AND p.stock > 0
+    ORDER BY p.nombre
+""", "Productos con stock para la pantalla de ventas")
+
+register('productos.pos', """
+    SELECT
+        p.id_producto, p.codigo, p.nombre, p.categoria_id, p.subcategoria_id,
+        p.marca_id, p.version_id, p.precio_compra, p.precio_venta, p.stock,
+        p.es_pesable, p.venta_por_peso, p.unidad_medida, p.activo, p.eliminado, p.fecha_creacion,
+        p.precio_venta AS precio
+    FROM productos p
+    WHERE p.activo = 1 AND p.eliminado = 0
+    ORDER BY p.nombre
+""", "Productos activos para el POS (precio duplica precio_venta por compatibilidad)")
+
+register('productos.api', """
+    SELECT
+        p.id_producto,
+        p.codigo,
+        p.nombre,
+        m.nombre as marca,
+        p.precio_venta,
+        p.stock,
+        p.es_pesable,
+        p.unidad_medida,
+        c.nombre as categoria_nombre
+    FROM productos p
+    LEFT JOIN categorias c ON p.categoria_id = c.id_categoria
+    LEFT JOIN marcas m ON p.marca_id = m.id_marca
+    WHERE p.activo = 1 AND p.eliminado = 0
+    ORDER BY p.nombre
+""", "Catálogo de productos para el POS")
+
+register('productos.api_por_codigo', """
+    SELECT
+        p.id_producto,
+        p.codigo,
+        p.nombre,
+        m.nombre as marca,
+        p.precio_venta,
+        p.stock,
+        p.es_pesable,
+        p.unidad_medida,
+        c.nombre as categoria_nombre
+    FROM productos p
+    LEFT JOIN categorias c ON p.categoria_id = c.id_categoria
+    LEFT JOIN marcas m ON p.marca_id = m.id_marca
+    WHERE p.codigo = ? AND p.activo = 1 AND p.eliminado = 0
+""", "Producto por código de barras para el POS")
+
+# ----------------------------------------------------------------------
+# Búsqueda de productos (ver utils.busqueda)
+# ----------------------------------------------------------------------
+# bm25 se calcula en la subconsulta sobre productos_fts (necesita la tabla FTS
+# como origen) y solo para los primeros :candidatos resultados por id: ordenar
+# todas las coincidencias de un prefijo corto como "p" cuesta lo mismo que
+# recorrer el catálogo. El filtro de stock va dentro, antes del corte, y el
+# código idéntico se busca aparte por el índice único: ninguno de los dos
+# depende de qué coincidencias entren en los candidatos.
+# Pesos bm25: nombre, codigo, marca, subcategoria, version.
+register('productos.buscar', """
+    SELECT
+        p.id_producto,
+        p.codigo,
+        p.nombre,
+        p.precio_compra,
+        p.precio_venta,
+        p.stock,
+        p.es_pesable,
+        p.unidad_medida,
+        p.categoria_id,
+        r.marca,
+        r.subcategoria,
+        r.version
+    FROM (
+        SELECT * FROM (
+            SELECT f.rowid AS id_producto, f.marca, f.subcategoria, f.version,
+                   bm25(productos_fts, 10.0, 10.0, 3.0, 2.0, 1.0) AS rango, 0 AS exacto
+            FROM productos_fts f
+            JOIN productos c ON c.id_producto = f.rowid
+            WHERE productos_fts MATCH :consulta
+              AND c.codigo <> :codigo
+              AND (:con_stock = 0 OR c.stock > 0)
+            LIMIT :candidatos
+        )
+        UNION ALL
+        SELECT f.rowid, f.marca, f.subcategoria, f.version, 0, 1
+        FROM productos c
+        JOIN productos_fts f ON f.rowid = c.id_producto
+        WHERE c.codigo = :codigo
+          AND (:con_stock = 0 OR c.stock > 0)
+    ) r
+    JOIN productos p ON p.id_producto = r.id_producto
+    ORDER BY r.exacto DESC, r.rango
+    LIMIT :limite OFFSET :offset
+""", "Búsqueda de productos por texto (FTS5, prefijos)")
+
+register('productos.buscar_like', """
+    SELECT
+        p.id_producto,
+        p.codigo,
+        p.nombre,
+        p.precio_compra,
+        p.precio_venta,
+        p.stock,
+        p.es_pesable,
+        p.unidad_medida,
+        p.categoria_id,
+        m.nombre AS marca,
+        s.nombre AS subcategoria,
+        v.nombre AS version
+    FROM productos p
+    LEFT JOIN marcas m ON p.marca_id = m.id_marca
+    LEFT JOIN subcategorias s ON p.subcategoria_id = s.id_subcategoria
+    LEFT JOIN versiones v ON p.version_id = v.id_version
+    WHERE p.activo = 1 AND p.eliminado = 0
+      AND (p.codigo = :codigo OR p.codigo LIKE :prefijo OR LOWER(p.nombre) LIKE :patron)
+      AND (:con_stock = 0 OR p.stock > 0)
+    ORDER BY p.codigo = :codigo DESC, p.nombre
+    LIMIT :limite OFFSET :offset
+""", "Búsqueda de productos sin FTS5 (PostgreSQL o SQLite sin el módulo)")
+
+# Las dos secuencias solo avanzan: la suma cambia con cualquier cambio de
+# productos (stock incluido) o de la taxonomía
+register('busqueda.version', """
+    SELECT SUM(valor) FROM sync_secuencia WHERE nombre IN ('productos', 'taxonomia')
+""", "Versión del catálogo y la taxonomía para el caché de búsquedas")
+
+# ----------------------------------------------------------------------
+# Sincronización incremental del catálogo (ver utils.catalog_sync)
+# ----------------------------------------------------------------------
+register('catalogo.version', "SELECT valor FROM sync_secuencia WHERE nombre = 'productos'",
+         "Versión actual de la secuencia de cambios del catálogo")
+
+register('productos.cambios', """
+    SELECT
+        id_producto, codigo, nombre, precio_venta, stock,
+        categoria_id, subcategoria_id, marca_id, version_id,
+        es_pesable, unidad_medida, activo, eliminado, version_sincronizacion
+    FROM productos
+    WHERE version_sincronizacion > :desde AND version_sincronizacion <= :hasta
+    ORDER BY version_sincronizacion
+""", "Productos cambiados en un rango de versiones (incluye eliminados)")
+
+register('productos.cambios_pagina', """
+    SELECT
+        id_producto, codigo, nombre, precio_venta, stock,
+        categoria_id, subcategoria_id, marca_id, version_id,
+        es_pesable, unidad_medida, activo, eliminado, version_sincronizacion
+    FROM productos
+    WHERE version_sincronizacion > :desde AND version_sincronizacion <= :hasta
+    ORDER BY version_sincronizacion
+    LIMIT :limite
+""", "Página del feed incremental de productos (keyset por version_sincronizacion)")
+
+# ----------------------------------------------------------------------
+# Reconciliación del catálogo por buckets de hashes (ver utils.reconciliacion)
+# ----------------------------------------------------------------------
+register('reconciliacion.vigentes', """
+    SELECT
+        id_producto, codigo, nombre, precio_venta, stock,
+        categoria_id, subcategoria_id, marca_id, version_id,
+        es_pesable, unidad_medida
+    FROM productos
+    WHERE activo = 1 AND eliminado = 0
+""", "Productos vigentes para reconstruir el árbol de hashes")
+
+register('reconciliacion.cambios', """
+    SELECT
+        id_producto, codigo, nombre, precio_venta, stock,
+        categoria_id, subcategoria_id, marca_id, version_id,
+        es_pesable, unidad_medida, activo, eliminado
+    FROM productos
+    WHERE version_sincronizacion > :desde AND version_sincronizacion <= :hasta
+""", "Productos cambiados desde la última versión del árbol de hashes")
+
+register('reconciliacion.borrados', """
+    SELECT id_producto FROM productos_borrados
+    WHERE version > :desde AND version <= :hasta
+""", "Productos borrados físicamente desde la última versión del árbol de hashes")
+
+# ----------------------------------------------------------------------
+# Índice de códigos de barras en memoria (ver utils.codigos)
+# ----------------------------------------------------------------------
+register('codigos.vigentes', """
+    SELECT
+        id_producto, codigo, nombre, precio_venta, stock,
+        es_pesable, unidad_medida, categoria_id, marca_id
+    FROM productos
+    WHERE activo = 1 AND eliminado = 0
+""", "Productos vigentes para cargar el índice de códigos")
+
+register('codigos.cambios', """
+    SELECT
+        id_producto, codigo, nombre, precio_venta, stock,
+        es_pesable, unidad_medida, categoria_id, marca_id, activo, eliminado
+    FROM productos
+    WHERE version_sincronizacion > :desde AND version_sincronizacion <= :hasta
+""", "Productos cambiados desde la versión del índice de códigos")
+
+register('codigos.producto', """
+    SELECT
+        id_producto, codigo, nombre, precio_venta, stock,
+        es_pesable, unidad_medida, categoria_id, marca_id, activo, eliminado
+    FROM productos
+    WHERE id_producto = :id_producto
+""", "Un producto para el índice de códigos (backends sin secuencia de cambios)")
+
+# ----------------------------------------------------------------------
+# Outbox de sincronización (ver utils.outbox)
+# ----------------------------------------------------------------------
+register('outbox.lote', """
+    SELECT MAX(version) AS hasta, COUNT(*) AS entradas, MIN(creado) AS mas_antiguo
+    FROM (
+        SELECT version, creado FROM sync_outbox
+        WHERE version > :desde AND version <= :hasta
+        ORDER BY version
+        LIMIT :limite
+    )
+""", "Próximo lote del outbox para un POS: última versión, entradas y la más antigua")
+
+register('outbox.productos', """
+    SELECT
+        id_producto, codigo, nombre, precio_venta, stock,
+        categoria_id, subcategoria_id, marca_id, version_id,
+        es_pesable, unidad_medida, activo, eliminado, version_sincronizacion
+    FROM productos
+    WHERE id_producto IN (
+        SELECT id_producto FROM sync_outbox WHERE version > :desde AND version <= :hasta
+    )
+""", "Estado actual de los productos de un lote del outbox")
+
+register('outbox.purgado', "SELECT valor FROM sync_secuencia WHERE nombre = 'outbox_purgado'",
+         "Versión hasta la que se purgó el outbox (un POS más atrasado recibe el catálogo completo)")
+
+register('outbox.clientes', """
+    SELECT c.*, COALESCE(e.intentos, 0) AS intentos
+    FROM clientes_pos c
+    LEFT JOIN sync_entregas e ON e.id_cliente = c.id_cliente
+    WHERE c.activo = 1
+      AND (e.proximo_intento IS NULL OR e.proximo_intento <= CURRENT_TIMESTAMP)
+""", "POS activos a los que les toca entrega (respeta el backoff de cada uno)")
@@ -0,0 +1,305 @@
+import os
+import re
+import threading
+import time
+import logging
+from collections import deque
+from logging.handlers import RotatingFileHandler
+from typing import Optional, Dict, Any, List
+
+from flask import has_request_context, request
+
+logger = logging.getLogger(__name__)
+
+# Sentencias a las que se les puede pedir EXPLAIN QUERY PLAN
+_EXPLICABLES = ('SELECT', 'WITH', 'INSERT', 'UPDATE', 'DELETE', 'REPLACE')
+
+_ESPACIOS = re.compile(r'\s+')
+
+def normalize_sql(sql: str, max_length: int = 2000) -> str:
+    """SQL en una sola línea, para agrupar y mostrar"""
+    return _ESPACIOS.sub(' ', sql).strip()[:max_length]
+
+def is_full_scan(detail: str) -> bool:
+    """Indica si un paso del plan recorre la tabla completa sin índice"""
+    detail = detail.upper()
+    return detail.startswith('SCAN ') and 'USING' not in detail and 'CONSTANT ROW' not in detail
+
+class QueryLog:
+    """Registro de consultas: agregados por ruta y log de consultas lentas"""
+
+    def __init__(self, threshold_ms: float = 100.0, history: int = 200,
+                 log_file: Optional[str] = None, max_bytes: int = 5 * 1024 * 1024,
+                 backup_count: int = 5, max_distinct: int = 1000):
+        self.threshold_ms = threshold_ms
+        self._slow: deque = deque(maxlen=history)
+        self._aggregates: Dict[tuple, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._counts = {'statements': 0, 'slow': 0, 'full_scans': 0}
+        # SQL armado dinámicamente no debe hacer crecer los agregados sin límite
+        self.max_distinct = max_distinct
+        self._overflow = self._new_aggregate('(otras)', '(consultas por encima del límite de agregados)')
+
+        self._file_logger = logging.getLogger('slow_queries')
+        self._file_logger.propagate = False
+        if log_file and not self._file_logger.handlers:
+            directory = os.path.dirname(log_file)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            handler = RotatingFileHandler(log_file, maxBytes=max_bytes,
+                                          backupCount=backup_count, encoding='utf-8')
+            handler.setFormatter(logging.Formatter('%(asctime)s %(message)s'))
+            self._file_logger.addHandler(handler)
+            self._file_logger.setLevel(logging.INFO)
+
+    # ------------------------------------------------------------------
+    # Ruta que origina la consulta
+    # ------------------------------------------------------------------
+    def current_route(self) -> str:
+        route = getattr(self._local, 'route', None)
+        if route:
+            return route
+        if has_request_context():
+            return request.endpoint or request.path
+        return threading.current_thread().name
+
+    def set_route(self, route: Optional[str]):
+        """Fija la ruta del hilo actual (p. ej. el escritor ejecutando un trabajo ajeno)"""
+        self._local.route = route
+
+    # ------------------------------------------------------------------
+    # Registro
+    # ------------------------------------------------------------------
+    @staticmethod
+    def _new_aggregate(route: str, sql: str) -> Dict[str, Any]:
+        return {'route': route, 'sql': sql, 'count': 0, 'rows': 0,
+                'total_ms': 0.0, 'max_ms': 0.0, 'slow': 0}
+
+    def explain(self, conn, sql: str, params=()) -> List[str]:
+        if not sql.lstrip().upper().startswith(_EXPLICABLES):
+            return []
+        try:
+            rows = conn.execute(f"EXPLAIN QUERY PLAN {sql}", params).fetchall()
+        except Exception as e:
+            return [f"(EXPLAIN no disponible: {e})"]
+        return [row[3] for row in rows]
+
+    def record(self, sql: str, params, elapsed: float, rows: int, route: str, conn=None):
+        """Registra una sentencia ejecutada; si es lenta captura su plan"""
+        ms = elapsed * 1000
+        normalized = normalize_sql(sql)
+        key = (route, normalized)
+        with self._lock:
+            self._counts['statements'] += 1
+            agg = self._aggregates.get(key)
+            if agg is None and len(self._aggregates) >= self.max_distinct:
+                agg = self._overflow
+            elif agg is None:
+                agg = self._new_aggregate(route, normalized)
+                self._aggregates[key] = agg
+            agg['count'] += 1
+            agg['rows'] += rows
+            agg['total_ms'] += ms
+            agg['max_ms'] = max(agg['max_ms'], ms)
+            if ms >= self.threshold_ms:
+                agg['slow'] += 1
+
+        if ms < self.threshold_ms:
+            return None
+
+        plan = self.explain(conn, sql, params) if conn is not None else []
+        full_scans = [step for step in plan if is_full_scan(step)]
+        entry = {
+            'at': time.time(),
+            'fecha': time.strftime('%d/%m/%Y %H:%M:%S'),
+            'route': route,
+            'sql': normalized,
+            'duration_ms': round(ms, 2),
+            'rows': rows,
+            'plan': plan,
+            'full_scans': full_scans,
+        }
+        with self._lock:
+            self._counts['slow'] += 1
+            if full_scans:
+                self._counts['full_scans'] += 1
+            self._slow.appendleft(entry)
+
+        self._file_logger.warning(
+            f"{ms:.1f}ms rows={rows} route={route}"
+            f"{' FULL_SCAN=' + '|'.join(full_scans) if full_scans else ''} "
+            f"sql={normalized} plan={' | '.join(plan)}"
+        )
+        return entry
+
+    # ------------------------------------------------------------------
+    # Consulta de resultados
+    # ------------------------------------------------------------------
+    def slow_queries(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            return list(self._slow)
+
+    def top_queries(self, limit: int = 20, order_by: str = 'total_ms') -> List[Dict[str, Any]]:
+        with self._lock:
+            aggregates = [dict(a) for a in self._aggregates.values()]
+            if self._overflow['count']:
+                aggregates.append(dict(self._overflow))
+        aggregates.sort(key=lambda a: a[order_by], reverse=True)
+        for agg in aggregates:
+            agg['avg_ms'] = round(agg['total_ms'] / agg['count'], 2) if agg['count'] else 0
+            agg['total_ms'] = round(agg['total_ms'], 2)
+            agg['max_ms'] = round(agg['max_ms'], 2)
+        return aggregates[:limit]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._counts)
+            stats['distinct'] = len(self._aggregates)
+        stats['threshold_ms'] = self.threshold_ms
+        return stats
+
+    def reset(self):
+        with self._lock:
+            self._slow.clear()
+            self._aggregates.clear()
+            self._overflow = self._new_aggregate('(otras)', '(consultas por encima del límite de agregados)')
+            self._counts = {'statements': 0, 'slow': 0, 'full_scans': 0}
+
+class InstrumentedCursor:
+    """Cursor que mide duración y filas de cada sentencia.
+
+    SQLite hace la mayor parte del trabajo al avanzar el cursor, así que el
+    tiempo incluye los fetch; la sentencia se registra al agotarse, al
+    ejecutar otra o al cerrar el cursor.
+    """
+
+    def __init__(self, cursor, query_log: QueryLog, retry_policy=None):
+        self._cursor = cursor
+        self._log = query_log
+        self._retry = retry_policy
+        self._pending = None
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    @property
+    def row_factory(self):
+        return self._cursor.row_factory
+
+    @row_factory.setter
+    def row_factory(self, value):
+        self._cursor.row_factory = value
+
+    def _call(self, fn, *args):
+        if self._retry is not None:
+            return self._retry.call(fn, *args)
+        return fn(*args)
+
+    def _finish(self):
+        pending, self._pending = self._pending, None
+        if pending is None:
+            return
+        sql, params, elapsed, rows, route = pending
+        self._log.record(sql, params, elapsed, rows, route, conn=self._cursor.connection)
+
+    def execute(self, sql, parameters=()):
+        self._finish()
+        route = self._log.current_route()
+        start = time.perf_counter()
+        self._call(self._cursor.execute, sql, parameters)
+        elapsed = time.perf_counter() - start
+        self._pending = [sql, parameters, elapsed, 0, route]
+        if self._cursor.description is None:
+            # Sentencia sin resultados: se registra ya con las filas afectadas
+            self._pending[3] = max(self._cursor.rowcount, 0)
+            self._finish()
+        return self
+
+    def executemany(self, sql, seq_of_parameters):
+        self._finish()
+        route = self._log.current_route()
+        start = time.perf_counter()
+        self._call(self._cursor.executemany, sql, seq_of_parameters)
+        elapsed = time.perf_counter() - start
+        self._log.record(sql, (), elapsed, max(self._cursor.rowcount, 0), route)
+        return self
+
+    def executescript(self, script):
+        self._finish()
+        route = self._log.current_route()
+        start = time.perf_counter()
+        self._call(self._cursor.executescript, script)
+        self._log.record(script, (), time.perf_counter() - start, 0, route)
+        return self
+
+    def _timed_fetch(self, fn, *args):
+        start = time.perf_counter()
+        result = fn(*args)
+        if self._pending is not None:
+            self._pending[2] += time.perf_counter() - start
+        return result
+
+    def fetchone(self):
+        row = self._timed_fetch(self._cursor.fetchone)
+        if row is None:
+            self._finish()
+        elif self._pending is not None:
+            self._pending[3] += 1
+        return row
+
+    def fetchmany(self, size=None):
+        size = self._cursor.arraysize if size is None else size
+        rows = self._timed_fetch(self._cursor.fetchmany, size)
+        if self._pending is not None:
+            self._pending[3] += len(rows)
+        if len(rows) < size:
+            self._finish()
+        return rows
+
+    def fetchall(self):
+        rows = self._timed_fetch(self._cursor.fetchall)
+        if self._pending is not None:
+            self._pending[3] += len(rows)
+        self._finish()
+        return rows
+
+    def __iter__(self):
+        while True:
+            row = self.fetchone()
+            if row is None:
+                return
+            yield row
+
+    def close(self):
+        self._finish()
+        self._cursor.close()
+
+    def __del__(self):
+        # Cursor descartado sin agotarse (p. ej. conn.execute(...).fetchone())
+        try:
+            self._finish()
+        except Exception:
+            pass
+
+# ----------------------------------------------------------------------
+# Integración con la app
+# ----------------------------------------------------------------------
+def init_app(app):
+    """Crea el registro de consultas y lo conecta al pool y al escritor"""
+    if not app.config.get('QUERY_LOG_ENABLED', True):
+        return None
+
+    query_log = QueryLog(
+        threshold_ms=app.config.get('SLOW_QUERY_THRESHOLD_MS', 100),
+        history=app.config.get('SLOW_QUERY_HISTORY', 200),
+        log_file=app.config.get('SLOW_QUERY_LOG_FILE'),
+        max_bytes=app.config.get('SLOW_QUERY_LOG_MAX_BYTES', 5 * 1024 * 1024),
+        backup_count=app.config.get('SLOW_QUERY_LOG_BACKUPS', 5),
+    )
+    for name in ('db_pool', 'db_writer'):
+        component = app.extensions.get(name)
+        if component is not None:
+            component.query_log = query_log
+    app.extensions['query_log'] = query_log
+    return query_log
@@ -0,0 +1,221 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import logging
+from typing import Dict, Any, List, Optional, Sequence
+
+from utils import catalog_sync
+from utils import queries
+from utils.serializer import to_dicts
+
+logger = logging.getLogger(__name__)
+
+# Buckets por id_producto % BUCKETS, agrupados de a GRUPO bajo la raíz:
+# raíz -> BUCKETS / GRUPO grupos -> BUCKETS buckets -> productos
+BUCKETS = 1024
+GRUPO = 32
+# Filas de reparación por respuesta; el resto de los buckets se pide de nuevo
+MAX_PRODUCTOS = 5000
+
+_CHUNK = 500
+
+class ProtocolError(ValueError):
+    """Pedido de reconciliación mal formado"""
+
+# ----------------------------------------------------------------------
+# Hashes (el POS tiene que calcularlos igual)
+# ----------------------------------------------------------------------
+def _normalizar(valor):
+    # 184.0 (REAL en el admin) y 184 (INTEGER en el POS) son el mismo valor
+    if isinstance(valor, float) and valor.is_integer():
+        return int(valor)
+    return valor
+
+def hash_fila(fila: Sequence) -> int:
+    """Hash de 64 bits de un producto: blake2b-8 del JSON compacto de la fila
+
+    La fila es [id_producto, codigo, nombre, precio_venta, stock,
+    categoria_id, subcategoria_id, marca_id, version_id, es_pesable,
+    unidad_medida], con los floats enteros escritos como enteros.
+    """
+    canonica = json.dumps([_normalizar(v) for v in fila], separators=(',', ':'), ensure_ascii=False)
+    return int.from_bytes(hashlib.blake2b(canonica.encode('utf-8'), digest_size=8).digest(), 'big')
+
+def hex64(valor: int) -> str:
+    return f"{valor:016x}"
+
+def hash_nodos(hijos: Sequence[int]) -> str:
+    """Hash de un nodo interno: blake2b-8 de los hashes hijos en hex concatenados"""
+    return hashlib.blake2b(''.join(hex64(h) for h in hijos).encode('ascii'), digest_size=8).hexdigest()
+
+class CatalogTree:
+    """Árbol de hashes de los productos vigentes, al día con la versión del catálogo.
+
+    El hash de un bucket es el XOR de los hashes de sus filas: se actualiza
+    en O(cambios) leyendo solo los productos con versión posterior a la del
+    árbol. Los borrados físicos también avanzan la versión (migración 9) y
+    se leen de productos_borrados.
+    """
+
+    def __init__(self, buckets: int = BUCKETS, grupo: int = GRUPO):
+        if buckets % grupo:
+            raise ValueError("buckets debe ser múltiplo de grupo")
+        self.buckets = buckets
+        self.grupo = grupo
+        self._lock = threading.Lock()
+        self._version: Optional[int] = None
+        self._filas: Dict[int, int] = {}
+        self._hashes: List[int] = [0] * buckets
+        self._stats = {'reconstrucciones': 0, 'actualizaciones': 0}
+
+    def _reconstruir(self, conn):
+        _, rows = queries.fetch_rows(conn, 'reconciliacion.vigentes')
+        self._filas = {row[0]: hash_fila(row) for row in rows}
+        self._hashes = [0] * self.buckets
+        for id_producto, h in self._filas.items():
+            self._hashes[id_producto % self.buckets] ^= h
+        self._stats['reconstrucciones'] += 1
+
+    def _quitar(self, id_producto: int):
+        anterior = self._filas.pop(id_producto, None)
+        if anterior is not None:
+            self._hashes[id_producto % self.buckets] ^= anterior
+
+    def _aplicar_cambios(self, conn, desde: int, hasta: int):
+        rango = {'desde': desde, 'hasta': hasta}
+        try:
+            _, borrados = queries.fetch_rows(conn, 'reconciliacion.borrados', rango)
+        except sqlite3.OperationalError:
+            # Base sin la migración 9: un borrado físico no se vería en el delta
+            self._reconstruir(conn)
+            return
+        for (id_producto,) in borrados:
+            self._quitar(id_producto)
+        columns, rows = queries.fetch_rows(conn, 'reconciliacion.cambios', rango)
+        activo, eliminado = columns.index('activo'), columns.index('eliminado')
+        for row in rows:
+            id_producto = row[0]
+            self._quitar(id_producto)
+            if row[activo] == 1 and row[eliminado] == 0:
+                h = hash_fila(row[:activo])
+                self._filas[id_producto] = h
+                self._hashes[id_producto % self.buckets] ^= h
+        self._stats['actualizaciones'] += 1
+
+    def actualizar(self, conn):
+        """Lleva el árbol a la versión vigente del catálogo"""
+        with self._lock:
+            version = catalog_sync.version_actual(conn)
+            if version is None or self._version is None or version < self._version:
+                self._reconstruir(conn)
+            elif version > self._version:
+                self._aplicar_cambios(conn, self._version, version)
+            self._version = version
+
+    @property
+    def version(self) -> Optional[int]:
+        return self._version
+
+    # ------------------------------------------------------------------
+    # Niveles del árbol
+    # ------------------------------------------------------------------
+    def bucket_hashes(self, grupo: Optional[int] = None) -> List[str]:
+        """Hashes de todos los buckets, o solo los del grupo indicado"""
+        with self._lock:
+            hashes = self._hashes if grupo is None else self._hashes[grupo * self.grupo:(grupo + 1) * self.grupo]
+            return [hex64(h) for h in hashes]
+
+    def grupo_hashes(self) -> List[str]:
+        with self._lock:
+            return [hash_nodos(self._hashes[i:i + self.grupo]) for i in range(0, self.buckets, self.grupo)]
+
+    def raiz(self) -> str:
+        return hashlib.blake2b(''.join(self.grupo_hashes()).encode('ascii'), digest_size=8).hexdigest()
+
+    def ids_por_bucket(self, buckets: Sequence[int]) -> Dict[int, List[int]]:
+        ids: Dict[int, List[int]] = {bucket: [] for bucket in buckets}
+        with self._lock:
+            for id_producto in self._filas:
+                lista = ids.get(id_producto % self.buckets)
+                if lista is not None:
+                    lista.append(id_producto)
+        return ids
+
+    def resumen(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats, version=self._version, productos=len(self._filas))
+        return dict(stats, buckets=self.buckets, grupo=self.grupo, raiz=self.raiz())
+
+# ----------------------------------------------------------------------
+# Protocolo: el POS manda el nivel que quiera y se le responde lo que difiere
+# ----------------------------------------------------------------------
+def _lista_hashes(valor, largo: int, nombre: str) -> List[str]:
+    if not isinstance(valor, list) or len(valor) != largo or not all(isinstance(h, str) for h in valor):
+        raise ProtocolError(f"{nombre} debe ser una lista de {largo} hashes")
+    return [h.lower() for h in valor]
+
+def productos_de(conn, ids: List[int]) -> List[Dict[str, Any]]:
+    """Filas vigentes de los ids dados, con las columnas del hash"""
+    productos: List[Dict[str, Any]] = []
+    sql = queries.get('reconciliacion.vigentes').sql
+    for i in range(0, len(ids), _CHUNK):
+        chunk = ids[i:i + _CHUNK]
+        cursor = conn.cursor()
+        cursor.row_factory = None
+        cursor.execute(f"{sql} AND id_producto IN ({', '.join('?' * len(chunk))})", chunk)
+        columns = [d[0] for d in cursor.description]
+        productos.extend(to_dicts(columns, cursor.fetchall()))
+    return productos
+
+def reconciliar(conn, tree: CatalogTree, pedido: Dict[str, Any],
+                max_productos: int = MAX_PRODUCTOS) -> Dict[str, Any]:
+    """Compara los hashes del POS con los del admin.
+
+    - {"raiz": h}: coincide o no (una vuelta en el caso normal).
+    - {"grupos": [...]}: índices de los grupos que difieren; el POS manda
+      después solo los buckets de esos grupos.
+    - {"buckets": {"<n>": h, ...}}: buckets que difieren con sus productos
+      vigentes; el POS reemplaza esos buckets completos (y borra lo que
+      tenga de más en ellos). mas=true si quedaron buckets sin enviar.
+    """
+    tree.actualizar(conn)
+    respuesta: Dict[str, Any] = {'version': tree.version, 'buckets_total': tree.buckets,
+                                 'grupo': tree.grupo}
+    if 'buckets' in pedido:
+        recibidos = pedido['buckets']
+        if not isinstance(recibidos, dict):
+            raise ProtocolError("buckets debe ser un objeto {bucket: hash}")
+        try:
+            recibidos = {int(b): str(h).lower() for b, h in recibidos.items()}
+        except (TypeError, ValueError):
+            raise ProtocolError("Los buckets deben ser enteros") from None
+        if any(not 0 <= b < tree.buckets for b in recibidos):
+            raise ProtocolError(f"Bucket fuera de rango (0..{tree.buckets - 1})")
+        propios = tree.bucket_hashes()
+        difieren = sorted(b for b, h in recibidos.items() if propios[b] != h)
+        por_bucket = tree.ids_por_bucket(difieren)
+        enviados, ids = [], []
+        for bucket in difieren:
+            ids_bucket = por_bucket[bucket]
+            if enviados and len(ids) + len(ids_bucket) > max_productos:
+                break
+            enviados.append(bucket)
+            ids.extend(ids_bucket)
+        respuesta.update(coincide=not difieren, difieren=difieren, enviados=enviados,
+                         productos=productos_de(conn, ids), mas=len(enviados) < len(difieren))
+    elif 'grupos' in pedido:
+        recibidos = _lista_hashes(pedido['grupos'], tree.buckets // tree.grupo, 'grupos')
+        difieren = [i for i, (suyo, propio) in enumerate(zip(recibidos, tree.grupo_hashes())) if suyo != propio]
+        respuesta.update(coincide=not difieren, difieren=difieren)
+    elif 'raiz' in pedido:
+        respuesta.update(coincide=str(pedido['raiz']).lower() == tree.raiz())
+    else:
+        raise ProtocolError("Se espera raiz, grupos o buckets")
+    return respuesta
+
+def init_app(app):
+    """Árbol de hashes del catálogo para /api/reconciliacion"""
+    tree = CatalogTree(app.config.get('RECONCILE_BUCKETS', BUCKETS), app.config.get('RECONCILE_GRUPO', GRUPO))
+    app.extensions['catalog_tree'] = tree
+    return tree
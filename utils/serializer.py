@@ -0,0 +1,146 @@
+import json
+import sqlite3
+import time
+import logging
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from flask import current_app, request
+
+from utils import queries
+
+logger = logging.getLogger(__name__)
+
+# Sin espacios ni escapes ASCII: el cuerpo más corto que produce el encoder en C
+_encoder = json.JSONEncoder(separators=(',', ':'), ensure_ascii=False, default=str)
+
+FORMATO_FILAS = 'filas'
+FORMATO_COLUMNAR = 'columnar'
+
+# Columnas por texto de consulta (el SQL de las rutas es fijo, el conjunto es acotado)
+_columns_cache: Dict[str, List[str]] = {}
+_MAX_COLUMNS_CACHE = 512
+# Consultas que SQLite no puede convertir a JSON (BLOBs, demasiadas columnas...)
+_sin_json: set = set()
+
+def tuple_cursor(conn):
+    """Cursor que devuelve tuplas en lugar de sqlite3.Row"""
+    cursor = conn.cursor()
+    cursor.row_factory = None
+    return cursor
+
+def fetch_rows(conn, sql: str, params=()) -> Tuple[List[str], List[tuple]]:
+    """Ejecuta una consulta y retorna (columnas, filas como tuplas)"""
+    cursor = tuple_cursor(conn)
+    cursor.execute(sql, params)
+    columns = [d[0] for d in cursor.description]
+    return columns, cursor.fetchall()
+
+def to_dicts(columns: Sequence[str], rows: Sequence[tuple]) -> List[Dict[str, Any]]:
+    return [dict(zip(columns, row)) for row in rows]
+
+def payload(columns: Sequence[str], rows: Sequence[tuple], formato: str = FORMATO_FILAS):
+    """Objetos por fila o, en formato columnar, {"columns": [...], "rows": [[...]]}"""
+    if formato == FORMATO_COLUMNAR:
+        # Las tuplas se codifican como arrays sin pasar por diccionarios
+        return {'columns': list(columns), 'rows': rows}
+    return to_dicts(columns, rows)
+
+def dumps(obj) -> bytes:
+    return _encoder.encode(obj).encode('utf-8')
+
+# ----------------------------------------------------------------------
+# JSON armado por SQLite
+# ----------------------------------------------------------------------
+def _quote(name: str) -> str:
+    return '"' + name.replace('"', '""') + '"'
+
+def _literal(name: str) -> str:
+    return "'" + name.replace("'", "''") + "'"
+
+def columns_for(conn, sql: str, params=()) -> List[str]:
+    """Columnas de una consulta sin ejecutarla (LIMIT 0), cacheadas por texto"""
+    columns = _columns_cache.get(sql)
+    if columns is None:
+        cursor = tuple_cursor(conn)
+        cursor.execute(f"SELECT * FROM ({sql}) LIMIT 0", params)
+        columns = [d[0] for d in cursor.description]
+        cursor.fetchall()
+        if len(_columns_cache) < _MAX_COLUMNS_CACHE:
+            _columns_cache[sql] = columns
+    return columns
+
+def sql_json(conn, sql: str, params=(), formato: str = FORMATO_FILAS) -> Tuple[str, int]:
+    """Arma el JSON dentro de SQLite con json_group_array; retorna (json, filas).
+
+    Las filas nunca se materializan como objetos Python. El agregado
+    recorre la subconsulta en su orden, así que ORDER BY se respeta.
+    """
+    columns = columns_for(conn, sql, params)
+    if formato == FORMATO_COLUMNAR:
+        fila = "json_array(" + ", ".join(_quote(c) for c in columns) + ")"
+    else:
+        fila = "json_object(" + ", ".join(f"{_literal(c)}, {_quote(c)}" for c in columns) + ")"
+
+    cursor = tuple_cursor(conn)
+    cursor.execute(f"SELECT json_group_array({fila}), COUNT(*) FROM ({sql})", params)
+    rows_json, count = cursor.fetchone()
+    if formato == FORMATO_COLUMNAR:
+        rows_json = '{"columns":' + _encoder.encode(columns) + ',"rows":' + rows_json + '}'
+    return rows_json, count
+
+def rows_json(conn, sql: str, params=(), formato: str = FORMATO_FILAS) -> Tuple[str, int]:
+    """JSON de las filas: lo arma SQLite y, si no puede, el encoder de Python"""
+    if sql not in _sin_json and getattr(conn, 'dialect', 'sqlite') == 'sqlite':
+        try:
+            return sql_json(conn, sql, params, formato)
+        except sqlite3.OperationalError as e:
+            logger.info(f"JSON en SQLite no disponible para la consulta, se usa Python: {e}")
+            _sin_json.add(sql)
+    columns, rows = fetch_rows(conn, sql, params)
+    return _encoder.encode(payload(columns, rows, formato)), len(rows)
+
+# ----------------------------------------------------------------------
+# Respuestas
+# ----------------------------------------------------------------------
+def requested_format() -> str:
+    """Formato pedido por el cliente (?formato=columnar)"""
+    formato = request.args.get('formato', FORMATO_FILAS)
+    return FORMATO_COLUMNAR if formato == FORMATO_COLUMNAR else FORMATO_FILAS
+
+def wrap(data_json: str, envelope: Optional[Dict[str, Any]] = None) -> str:
+    """Inserta un JSON ya armado como envelope['data'] sin decodificarlo"""
+    if not envelope:
+        return data_json
+    head = _encoder.encode(envelope)
+    return head[:-1] + ',"data":' + data_json + '}'
+
+def json_response(body, status: int = 200, headers: Optional[Dict[str, str]] = None):
+    """Respuesta JSON compacta sin pasar por jsonify (body: objeto, str o bytes)"""
+    if isinstance(body, str):
+        body = body.encode('utf-8')
+    elif not isinstance(body, bytes):
+        body = dumps(body)
+    return current_app.response_class(body, status=status, headers=headers,
+                                      mimetype='application/json')
+
+def query_response(conn, sql: str, params=(), envelope: Optional[Dict[str, Any]] = None):
+    """Ejecuta la consulta y responde con las filas (o dentro de envelope['data'])"""
+    data_json, _ = rows_json(conn, sql, params, requested_format())
+    return json_response(wrap(data_json, envelope))
+
+def named_json(conn, name: str, params=(), formato: str = FORMATO_FILAS) -> str:
+    """JSON de una consulta del registro, sumando a sus contadores"""
+    query = queries.get(name)
+    start = time.perf_counter()
+    try:
+        data_json, count = rows_json(conn, query.sql, params, formato)
+    except Exception:
+        queries.record(name, time.perf_counter() - start, error=True)
+        raise
+    queries.record(name, time.perf_counter() - start, count)
+    return data_json
+
+def named_response(conn, name: str, params=(), envelope: Optional[Dict[str, Any]] = None):
+    """Como query_response, para una consulta del registro"""
+    data_json = named_json(conn, name, params, requested_format())
+    return json_response(wrap(data_json, envelope))
@@ -0,0 +1,266 @@
+import heapq
+import os
+import sqlite3
+import threading
+import time
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Dict, Any, Callable, List, Tuple
+
+from flask import current_app, has_request_context, request, session
+
+from utils import migrations
+from utils import pool as db_pool
+from utils import writer as db_writer
+from utils.storage import enable_wal
+
+logger = logging.getLogger(__name__)
+
+# Tablas transaccionales que viven en el archivo de cada tienda; el resto
+# (catálogo, clientes, usuarios, clientes_pos) queda en la base compartida.
+SHARD_TABLES = ('ventas', 'detalles_venta', 'ventas_detalles', 'pagos_parciales', 'ventas_pos_recibidas')
+
+# La base compartida es el shard de la tienda central (ventas del admin)
+CENTRAL = 0
+# Los ids de cada tienda arrancan en tienda * ID_SPAN: el id indica el shard
+ID_SPAN = 10 ** 9
+CATALOG_ALIAS = 'catalogo'
+
+class UnknownShardError(ValueError):
+    """La tienda no está registrada en clientes_pos"""
+
+class ShardRouter:
+    """Elige el archivo de cada tienda y reparte los reportes entre todos"""
+
+    def __init__(self, shared_path: str, shard_dir: str, pool_size: int = 5, workers: int = 8,
+                 pool_kwargs: Optional[Dict[str, Any]] = None,
+                 writer_kwargs: Optional[Dict[str, Any]] = None, query_log=None):
+        self.shared_path = shared_path
+        self.shard_dir = shard_dir
+        self.pool_size = pool_size
+        self.pool_kwargs = dict(pool_kwargs or {})
+        self.writer_kwargs = dict(writer_kwargs or {})
+        self.query_log = query_log
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='shard')
+        self._lock = threading.Lock()
+        self._ready: set = set()
+        self._stats = {'fan_outs': 0, 'fan_out_time_total': 0.0, 'routed': 0}
+        os.makedirs(shard_dir, exist_ok=True)
+
+    # ------------------------------------------------------------------
+    # Ubicación de los shards
+    # ------------------------------------------------------------------
+    def shard_path(self, tienda: int) -> str:
+        if tienda == CENTRAL:
+            return self.shared_path
+        return os.path.join(self.shard_dir, f"tienda_{tienda}.db")
+
+    def tienda_for_id(self, id_registro: int) -> int:
+        """Tienda dueña de un id de venta (ver ID_SPAN)"""
+        return int(id_registro) // ID_SPAN
+
+    def tiendas(self) -> List[int]:
+        """Tiendas con shard creado, más la central"""
+        tiendas = [CENTRAL]
+        for nombre in sorted(os.listdir(self.shard_dir)):
+            if nombre.startswith('tienda_') and nombre.endswith('.db'):
+                try:
+                    tiendas.append(int(nombre[len('tienda_'):-len('.db')]))
+                except ValueError:
+                    continue
+        return tiendas
+
+    def _tienda_registrada(self, tienda: int) -> bool:
+        conn = sqlite3.connect(self.shared_path)
+        try:
+            return conn.execute("SELECT 1 FROM clientes_pos WHERE id_cliente = ?", (tienda,)).fetchone() is not None
+        finally:
+            conn.close()
+
+    def ensure_shard(self, tienda: int) -> str:
+        """Crea el archivo de la tienda con el esquema transaccional si no existe"""
+        path = self.shard_path(tienda)
+        if tienda == CENTRAL or tienda in self._ready:
+            return path
+        with self._lock:
+            if tienda in self._ready:
+                return path
+            if not os.path.exists(path):
+                if not self._tienda_registrada(tienda):
+                    raise UnknownShardError(f"Tienda desconocida: {tienda}")
+                self._create_shard(tienda, path)
+            self._upgrade_shard(path)
+            self._ready.add(tienda)
+        return path
+
+    def _create_shard(self, tienda: int, path: str):
+        shared = sqlite3.connect(self.shared_path)
+        try:
+            placeholders = ", ".join("?" * len(SHARD_TABLES))
+            ddl = shared.execute(f"""
+                SELECT type, name, sql FROM sqlite_master
+                WHERE tbl_name IN ({placeholders}) AND type IN ('table', 'index') AND sql IS NOT NULL
+                ORDER BY type = 'index', rowid
+            """, SHARD_TABLES).fetchall()
+        finally:
+            shared.close()
+
+        tmp_path = path + '.tmp'
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        conn = sqlite3.connect(tmp_path)
+        try:
+            tables = []
+            for tipo, nombre, sql in ddl:
+                conn.execute(sql)
+                if tipo == 'table':
+                    tables.append(nombre)
+            # Ids globalmente únicos: la tienda queda codificada en el id
+            has_sequence = conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE name = 'sqlite_sequence'").fetchone()
+            if has_sequence:
+                conn.executemany("INSERT INTO sqlite_sequence (name, seq) VALUES (?, ?)",
+                                 [(t, tienda * ID_SPAN) for t in tables])
+            conn.commit()
+        finally:
+            conn.close()
+        os.replace(tmp_path, path)
+        enable_wal(path)
+        logger.info(f"Shard creado para la tienda {tienda}: {path} ({', '.join(tables)})")
+
+    def _upgrade_shard(self, path: str):
+        """Pone al día el mapeo de ventas recibidas de un shard creado antes de la migración 10"""
+        conn = sqlite3.connect(path)
+        try:
+            migrations.crear_ventas_recibidas(conn)
+            conn.commit()
+        finally:
+            conn.close()
+
+    # ------------------------------------------------------------------
+    # Conexiones y escritores por tienda
+    # ------------------------------------------------------------------
+    def pool(self, tienda: int) -> db_pool.ConnectionPool:
+        path = self.ensure_shard(tienda)
+        if tienda == CENTRAL:
+            return db_pool.get_pool(path)
+        pool = db_pool.get_pool(path, size=self.pool_size,
+                                attach=((CATALOG_ALIAS, self.shared_path),), **self.pool_kwargs)
+        pool.query_log = self.query_log
+        return pool
+
+    def connection(self, tienda: int):
+        """Conexión al shard (con el catálogo adjunto); en un request se reutiliza hasta el teardown"""
+        pool = self.pool(tienda)
+        with self._lock:
+            self._stats['routed'] += 1
+        return db_pool.get_connection(pool.db_path)
+
+    def connection_for_id(self, id_registro: int):
+        return self.connection(self.tienda_for_id(id_registro))
+
+    def writer(self, tienda: int) -> db_writer.WriteQueue:
+        path = self.ensure_shard(tienda)
+        attach = () if tienda == CENTRAL else ((CATALOG_ALIAS, self.shared_path),)
+        writer = db_writer.get_writer(path, attach=attach, **self.writer_kwargs)
+        if tienda != CENTRAL:
+            writer.query_log = self.query_log
+        writer.start()
+        return writer
+
+    # ------------------------------------------------------------------
+    # Reportes entre tiendas
+    # ------------------------------------------------------------------
+    def _run_on(self, tienda: int, fn: Callable, args):
+        pooled = self.pool(tienda).acquire()
+        try:
+            return fn(pooled, *args)
+        finally:
+            pooled.close()
+
+    def fan_out(self, fn: Callable, *args, tiendas: Optional[List[int]] = None) -> List[Tuple[int, Any]]:
+        """Ejecuta fn(conn, *args) en cada tienda en paralelo; retorna [(tienda, resultado)]"""
+        tiendas = self.tiendas() if tiendas is None else tiendas
+        start = time.perf_counter()
+        futures = [(t, self._executor.submit(self._run_on, t, fn, args)) for t in tiendas]
+        results = [(t, future.result()) for t, future in futures]
+        with self._lock:
+            self._stats['fan_outs'] += 1
+            self._stats['fan_out_time_total'] += time.perf_counter() - start
+        return results
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+        stats['tiendas'] = self.tiendas()
+        stats['avg_fan_out_ms'] = round(stats['fan_out_time_total'] / stats['fan_outs'] * 1000, 2) \
+            if stats['fan_outs'] else 0
+        stats['fan_out_time_total'] = round(stats['fan_out_time_total'], 4)
+        return stats
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False)
+
+def merge_sorted(results: List[Tuple[int, list]], key: Callable, reverse: bool = False) -> list:
+    """Une las filas ya ordenadas de cada tienda manteniendo el orden"""
+    return list(heapq.merge(*(rows for _, rows in results), key=key, reverse=reverse))
+
+def merge_totals(results: List[Tuple[int, list]]) -> List[tuple]:
+    """Suma filas (clave, n1, n2, ...) de cada tienda agrupando por la clave"""
+    totals: Dict[Any, list] = {}
+    for _, rows in results:
+        for row in rows:
+            acc = totals.setdefault(row[0], [0] * (len(row) - 1))
+            for i, value in enumerate(row[1:]):
+                acc[i] += value or 0
+    return [(clave, *valores) for clave, valores in totals.items()]
+
+# ----------------------------------------------------------------------
+# Integración con la app
+# ----------------------------------------------------------------------
+def tienda_from_headers(headers, data: Optional[dict] = None) -> int:
+    """Tienda de un request del POS: cabecera X-Tienda-Id o campo id_tienda"""
+    value = headers.get('X-Tienda-Id') or headers.get('x-tienda-id')
+    if value is None and data:
+        value = data.get('id_tienda')
+    try:
+        return int(value) if value is not None else CENTRAL
+    except (TypeError, ValueError):
+        raise UnknownShardError(f"Tienda inválida: {value}") from None
+
+def current_tienda() -> int:
+    """Tienda del request actual: cabecera del POS o la sesión del usuario"""
+    if not has_request_context():
+        return CENTRAL
+    if request.headers.get('X-Tienda-Id'):
+        return tienda_from_headers(request.headers)
+    return int(session.get('tienda_id') or CENTRAL)
+
+def get_router() -> Optional[ShardRouter]:
+    """Router de la app, o None si el modo por tienda está desactivado"""
+    return current_app.extensions.get('shard_router')
+
+def init_app(app):
+    """Activa el modo por tienda (solo con el backend SQLite)"""
+    if not app.config.get('SHARDING_ENABLED', False):
+        return None
+    if app.config.get('DB_BACKEND', 'sqlite') != 'sqlite':
+        logger.warning("SHARDING_ENABLED se ignora con un backend distinto de SQLite")
+        return None
+
+    main_pool = app.extensions.get('db_pool')
+    main_writer = app.extensions.get('db_writer')
+    router = ShardRouter(
+        app.config['DATABASE_PATH'],
+        app.config.get('SHARD_DIR', os.path.join('db', 'tiendas')),
+        pool_size=app.config.get('SHARD_POOL_SIZE', 5),
+        workers=app.config.get('SHARD_WORKERS', 8),
+        pool_kwargs={'pragmas': main_pool.pragmas, 'retry_policy': main_pool.retry_policy,
+                     'cached_statements': main_pool.cached_statements} if main_pool else None,
+        writer_kwargs={'max_batch': main_writer.max_batch, 'batch_window': main_writer.batch_window,
+                       'pragmas': main_writer.pragmas, 'retry_policy': main_writer.retry_policy,
+                       'cached_statements': main_writer.cached_statements} if main_writer else None,
+        query_log=app.extensions.get('query_log'),
+    )
+    app.extensions['shard_router'] = router
+    return router
@@ -0,0 +1,214 @@
+import os
+import random
+import sqlite3
+import threading
+import time
+import logging
+from typing import Optional, Dict, Any
+
+logger = logging.getLogger(__name__)
+
+# Pragmas por conexión cuando la base está en modo WAL.
+# wal_autocheckpoint queda alto como red de seguridad: el checkpoint
+# normal lo hace el hilo en segundo plano, fuera del camino de los commits.
+WAL_PRAGMAS = (
+    ("synchronous", "NORMAL"),
+    ("wal_autocheckpoint", "10000"),
+)
+
+SQLITE_BUSY = 5
+SQLITE_LOCKED = 6
+
+def is_busy_error(error: Exception) -> bool:
+    """Indica si el error es un SQLITE_BUSY / SQLITE_LOCKED"""
+    if not isinstance(error, sqlite3.OperationalError):
+        return False
+    code = getattr(error, 'sqlite_errorcode', None)
+    if code is not None:
+        return code & 0xFF in (SQLITE_BUSY, SQLITE_LOCKED)
+    message = str(error).lower()
+    return 'database is locked' in message or 'database is busy' in message
+
+class BusyRetryPolicy:
+    """Reintentos acotados con backoff exponencial y jitter ante SQLITE_BUSY"""
+
+    def __init__(self, attempts: int = 5, base_delay: float = 0.02, max_delay: float = 1.0):
+        self.attempts = max(1, attempts)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._lock = threading.Lock()
+        self.retries = 0
+        self.failures = 0
+
+    def delay(self, attempt: int) -> float:
+        # "Full jitter": espera aleatoria entre 0 y el tope exponencial
+        cap = min(self.max_delay, self.base_delay * (2 ** attempt))
+        return random.uniform(0, cap)
+
+    def call(self, fn, *args, **kwargs):
+        """Ejecuta fn reintentando mientras la base esté ocupada"""
+        for attempt in range(self.attempts):
+            try:
+                return fn(*args, **kwargs)
+            except sqlite3.OperationalError as e:
+                if not is_busy_error(e):
+                    raise
+                if attempt == self.attempts - 1:
+                    with self._lock:
+                        self.failures += 1
+                    logger.warning(f"Base ocupada tras {self.attempts} intentos: {e}")
+                    raise
+                with self._lock:
+                    self.retries += 1
+                time.sleep(self.delay(attempt))
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {'busy_retries': self.retries, 'busy_failures': self.failures}
+
+def enable_wal(db_path: str) -> str:
+    """Activa el modo WAL (persistente en el archivo) y retorna el modo final"""
+    conn = sqlite3.connect(db_path)
+    try:
+        mode = conn.execute("PRAGMA journal_mode = WAL").fetchone()[0]
+    finally:
+        conn.close()
+    if str(mode).lower() != 'wal':
+        logger.warning(f"No se pudo activar WAL en {db_path}, modo actual: {mode}")
+    return mode
+
+def wal_size(db_path: str) -> int:
+    """Tamaño actual del archivo -wal en bytes"""
+    try:
+        return os.path.getsize(f"{db_path}-wal")
+    except OSError:
+        return 0
+
+class Checkpointer:
+    """Hilo que hace checkpoints PASSIVE periódicos y TRUNCATE por tamaño"""
+
+    def __init__(self, db_path: str, interval: float = 30.0,
+                 truncate_threshold: int = 16 * 1024 * 1024, busy_timeout_ms: int = 1000):
+        self.db_path = db_path
+        self.interval = interval
+        self.truncate_threshold = truncate_threshold
+        self.busy_timeout_ms = busy_timeout_ms
+
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self._last: Dict[str, Any] = {}
+        self._counts = {'passive': 0, 'truncate': 0, 'busy': 0, 'errors': 0}
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='wal-checkpointer', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+
+    def _run(self):
+        conn = None
+        while not self._stop.wait(self.interval):
+            try:
+                if conn is None:
+                    conn = sqlite3.connect(self.db_path, check_same_thread=False)
+                    conn.execute(f"PRAGMA busy_timeout = {self.busy_timeout_ms}")
+                self.checkpoint(conn)
+            except sqlite3.Error as e:
+                with self._lock:
+                    self._counts['errors'] += 1
+                logger.error(f"Error en checkpoint WAL: {e}")
+                if conn is not None:
+                    conn.close()
+                    conn = None
+        if conn is not None:
+            conn.close()
+
+    def checkpoint(self, conn: sqlite3.Connection, mode: Optional[str] = None) -> Dict[str, Any]:
+        """Ejecuta un checkpoint y registra el resultado"""
+        size_before = wal_size(self.db_path)
+        if mode is None:
+            mode = 'TRUNCATE' if size_before >= self.truncate_threshold else 'PASSIVE'
+
+        start = time.perf_counter()
+        busy, log_frames, checkpointed = conn.execute(f"PRAGMA wal_checkpoint({mode})").fetchone()
+        elapsed = time.perf_counter() - start
+
+        result = {
+            'mode': mode,
+            'busy': bool(busy),
+            'log_frames': log_frames,
+            'checkpointed_frames': checkpointed,
+            'lag_frames': max(0, log_frames - checkpointed) if log_frames >= 0 else 0,
+            'wal_bytes_before': size_before,
+            'wal_bytes_after': wal_size(self.db_path),
+            'duration_ms': round(elapsed * 1000, 2),
+            'at': time.time(),
+        }
+        with self._lock:
+            self._counts[mode.lower()] = self._counts.get(mode.lower(), 0) + 1
+            if busy:
+                self._counts['busy'] += 1
+            self._last = result
+        return result
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            last = dict(self._last)
+            counts = dict(self._counts)
+        age = round(time.time() - last['at'], 1) if last else None
+        return {
+            'wal_bytes': wal_size(self.db_path),
+            'truncate_threshold': self.truncate_threshold,
+            'interval': self.interval,
+            'running': bool(self._thread and self._thread.is_alive()),
+            'checkpoints': counts,
+            'last_checkpoint': last or None,
+            'checkpoint_lag_frames': last.get('lag_frames') if last else None,
+            'seconds_since_checkpoint': age,
+        }
+
+# ----------------------------------------------------------------------
+# Integración con la app
+# ----------------------------------------------------------------------
+_checkpointers: Dict[str, Checkpointer] = {}
+
+def retry_policy_from_config(config) -> BusyRetryPolicy:
+    return BusyRetryPolicy(
+        attempts=config.get('DB_BUSY_RETRIES', 5),
+        base_delay=config.get('DB_BUSY_BASE_DELAY', 0.02),
+        max_delay=config.get('DB_BUSY_MAX_DELAY', 1.0),
+    )
+
+def get_checkpointer(db_path: str) -> Optional[Checkpointer]:
+    return _checkpointers.get(db_path)
+
+def init_app(app):
+    """Activa WAL y arranca el checkpointer en segundo plano"""
+    db_path = app.config['DATABASE_PATH']
+    if app.config.get('DB_JOURNAL_MODE', 'WAL').upper() != 'WAL':
+        return None
+
+    try:
+        enable_wal(db_path)
+    except sqlite3.Error as e:
+        logger.error(f"No se pudo activar WAL: {e}")
+        return None
+
+    checkpointer = _checkpointers.get(db_path)
+    if checkpointer is None:
+        checkpointer = Checkpointer(
+            db_path,
+            interval=app.config.get('WAL_CHECKPOINT_INTERVAL', 30),
+            truncate_threshold=app.config.get('WAL_TRUNCATE_THRESHOLD', 16 * 1024 * 1024),
+        )
+        _checkpointers[db_path] = checkpointer
+    checkpointer.start()
+    app.extensions['wal_checkpointer'] = checkpointer
+    return checkpointer
@@ -0,0 +1,135 @@
+import threading
+import time
+import logging
+from typing import Dict, Any, List, Optional
+
+from utils import backends
+from utils import queries
+
+logger = logging.getLogger(__name__)
+
+# Tabla -> (consulta registrada, id, columna del padre)
+TABLAS = {
+    'categorias': ('categorias.todas', 'id_categoria', None),
+    'subcategorias': ('subcategorias.todas', 'id_subcategoria', 'categoria_id'),
+    'marcas': ('marcas.todas', 'id_marca', 'subcategoria_id'),
+    'versiones': ('versiones.todas', 'id_version', 'marca_id'),
+}
+
+# Segundos entre lecturas de la versión en la base (cambios hechos por otros procesos)
+CHECK_INTERVAL = 1.0
+
+class _Tabla:
+    """Filas ordenadas por nombre, mapa id -> nombre e hijos por id del padre"""
+
+    __slots__ = ('filas', 'nombres', 'hijos')
+
+    def __init__(self, filas: list, id_col: str, padre_col: Optional[str]):
+        self.filas = filas
+        self.nombres = {fila[id_col]: fila['nombre'] for fila in filas}
+        self.hijos: Dict[Any, List[Dict[str, Any]]] = {}
+        if padre_col:
+            for fila in filas:
+                self.hijos.setdefault(fila[padre_col], []).append(
+                    {id_col: fila[id_col], 'nombre': fila['nombre'], padre_col: fila[padre_col]})
+
+class TaxonomyCache:
+    """Categorías, subcategorías, marcas y versiones en memoria.
+
+    Las escrituras de la app llaman a invalidar() después del commit; los
+    triggers de la migración 6 además avanzan la versión 'taxonomia' de
+    sync_secuencia, que se relee cada check_interval segundos para ver los
+    cambios de otros procesos (o de scripts que escriben directo en la base).
+    """
+
+    def __init__(self, check_interval: float = CHECK_INTERVAL):
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._tablas: Dict[str, _Tabla] = {}
+        self._version_db: Optional[int] = None
+        self._verificado = 0.0
+        # Avanza con cada invalidación: una carga que empezó antes no se guarda
+        self._generacion = 0
+        self._stats = {'aciertos': 0, 'cargas': 0, 'invalidaciones': 0}
+
+    def _version_base(self, conn) -> Optional[int]:
+        if backends.dialect(conn) != backends.SQLITE:
+            return None
+        try:
+            row = queries.fetchone(conn, 'taxonomia.version')
+        except Exception:
+            # Base sin la migración 6: solo la invalidación local
+            return None
+        return row[0] if row else None
+
+    def _verificar(self, conn):
+        ahora = time.monotonic()
+        if ahora - self._verificado < self.check_interval:
+            return
+        version = self._version_base(conn)
+        with self._lock:
+            self._verificado = ahora
+            if version != self._version_db:
+                self._version_db = version
+                self._tablas.clear()
+                self._generacion += 1
+
+    def tabla(self, conn, nombre: str) -> _Tabla:
+        self._verificar(conn)
+        with self._lock:
+            tabla = self._tablas.get(nombre)
+            generacion = self._generacion
+            if tabla is not None:
+                self._stats['aciertos'] += 1
+                return tabla
+        sql_name, id_col, padre_col = TABLAS[nombre]
+        tabla = _Tabla(queries.fetchall(conn, sql_name), id_col, padre_col)
+        with self._lock:
+            if generacion == self._generacion:
+                self._tablas[nombre] = tabla
+            self._stats['cargas'] += 1
+        return tabla
+
+    def invalidar(self):
+        with self._lock:
+            self._tablas.clear()
+            self._generacion += 1
+            # La próxima lectura también relee la versión de la base
+            self._verificado = 0.0
+            self._stats['invalidaciones'] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return dict(self._stats, tablas=sorted(self._tablas), version=self._version_db)
+
+_cache = TaxonomyCache()
+
+def filas(conn, tabla: str) -> list:
+    """Todas las filas de la tabla ordenadas por nombre (copia de la lista cacheada)"""
+    return list(_cache.tabla(conn, tabla).filas)
+
+def nombre(conn, tabla: str, id_registro) -> Optional[str]:
+    """Nombre de un registro por id (acepta el id como texto de un formulario)"""
+    try:
+        return _cache.tabla(conn, tabla).nombres.get(int(id_registro))
+    except (TypeError, ValueError):
+        return None
+
+def nombres(conn, tabla: str) -> Dict[Any, str]:
+    """Mapa id -> nombre cacheado (compartido: no modificar)"""
+    return _cache.tabla(conn, tabla).nombres
+
+def hijos(conn, tabla: str, id_padre: int) -> List[Dict[str, Any]]:
+    """Registros de la tabla cuyo padre es id_padre, ordenados por nombre"""
+    return [dict(fila) for fila in _cache.tabla(conn, tabla).hijos.get(id_padre, [])]
+
+def invalidar():
+    """Llamar después de confirmar una escritura en cualquiera de las tablas"""
+    _cache.invalidar()
+
+def stats() -> Dict[str, Any]:
+    return _cache.stats()
+
+def init_app(app):
+    _cache.check_interval = app.config.get('TAXONOMIA_CHECK_INTERVAL', CHECK_INTERVAL)
+    _cache.invalidar()
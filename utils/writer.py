@@ -0,0 +1,295 @@
+import queue
+import sqlite3
+import threading
+import time
+import logging
+from concurrent.futures import Future
+from typing import Optional, Dict, Any, Callable
+
+from utils.storage import BusyRetryPolicy, WAL_PRAGMAS
+from utils.pool import DEFAULT_PRAGMAS
+from utils.query_log import InstrumentedCursor
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+class _Job:
+    __slots__ = ('fn', 'args', 'kwargs', 'future', 'submitted', 'route')
+
+    def __init__(self, fn, args, kwargs, route=None):
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.future = Future()
+        self.submitted = time.monotonic()
+        self.route = route
+
+class WriterConnection:
+    """Conexión que reciben los trabajos: el escritor controla la transacción"""
+
+    def __init__(self, conn: sqlite3.Connection, writer: 'WriteQueue'):
+        self._conn = conn
+        self._writer = writer
+        self.db_path = writer.db_path
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    def cursor(self):
+        query_log = self._writer.query_log
+        if query_log is None:
+            return self._conn.cursor()
+        return InstrumentedCursor(self._conn.cursor(), query_log)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+    def commit(self):
+        raise RuntimeError("Los trabajos del escritor no deben hacer commit; lo hace el grupo")
+
+    def rollback(self):
+        raise RuntimeError("Los trabajos del escritor no deben hacer rollback; lance una excepción")
+
+    def close(self):
+        pass
+
+class WriteQueue:
+    """Hilo escritor único con cola de envíos y commit agrupado.
+
+    Cada trabajo es una función fn(conn, *args) que recibe una conexión
+    dedicada. Los trabajos pendientes se agrupan en una sola transacción;
+    cada uno corre dentro de su propio SAVEPOINT, de modo que si uno lanza
+    una excepción solo se deshace ese trabajo y su Future recibe el error.
+    """
+
+    def __init__(self, db_path: str, max_batch: int = 64, batch_window: float = 0.0,
+                 pragmas=DEFAULT_PRAGMAS, retry_policy: Optional[BusyRetryPolicy] = None,
+                 cached_statements: int = 256, attach=()):
+        self.db_path = db_path
+        self.cached_statements = cached_statements
+        self.attach = tuple(attach)
+        self.max_batch = max_batch
+        self.batch_window = batch_window
+        self.pragmas = tuple(pragmas)
+        self.retry_policy = retry_policy or BusyRetryPolicy()
+        self.query_log = None  # lo asigna utils.query_log.init_app
+
+        self._queue: 'queue.Queue' = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self._stats = {
+            'submitted': 0,
+            'committed': 0,
+            'failed': 0,
+            'batches': 0,
+            'max_batch': 0,
+            'queue_wait_total': 0.0,
+            'commit_time_total': 0.0,
+        }
+
+    # ------------------------------------------------------------------
+    # API pública
+    # ------------------------------------------------------------------
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._thread = threading.Thread(target=self._run, name='db-writer', daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0):
+        self._queue.put(_STOP)
+        if self._thread:
+            self._thread.join(timeout=timeout)
+
+    def submit(self, fn: Callable, *args, **kwargs) -> Future:
+        """Encola un trabajo de escritura y retorna su Future"""
+        route = self.query_log.current_route() if self.query_log is not None else None
+        job = _Job(fn, args, kwargs, route)
+        if threading.current_thread() is self._thread:
+            # Llamada reentrante desde otro trabajo: se ejecuta en línea
+            try:
+                job.future.set_result(fn(self._writer_conn, *args, **kwargs))
+            except Exception as e:
+                job.future.set_exception(e)
+            return job.future
+
+        self.start()
+        with self._lock:
+            self._stats['submitted'] += 1
+        self._queue.put(job)
+        return job.future
+
+    def run(self, fn: Callable, *args, timeout: Optional[float] = None, **kwargs):
+        """Encola un trabajo y espera su resultado (ya confirmado)"""
+        return self.submit(fn, *args, **kwargs).result(timeout=timeout)
+
+    def execute(self, sql: str, params=()) -> Future:
+        """Atajo para una sola sentencia; el Future retorna filas afectadas"""
+        return self.submit(lambda conn: conn.execute(sql, params).rowcount)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+        batches = stats['batches']
+        done = stats['committed'] + stats['failed']
+        stats.update({
+            'queue_depth': self._queue.qsize(),
+            'running': bool(self._thread and self._thread.is_alive()),
+            'avg_batch': round(done / batches, 2) if batches else 0,
+            'avg_queue_wait_ms': round(stats['queue_wait_total'] / done * 1000, 2) if done else 0,
+            'avg_commit_ms': round(stats['commit_time_total'] / batches * 1000, 2) if batches else 0,
+        })
+        stats['queue_wait_total'] = round(stats['queue_wait_total'], 4)
+        stats['commit_time_total'] = round(stats['commit_time_total'], 4)
+        stats.update(self.retry_policy.stats())
+        return stats
+
+    # ------------------------------------------------------------------
+    # Hilo escritor
+    # ------------------------------------------------------------------
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, isolation_level=None,
+                               cached_statements=self.cached_statements)
+        conn.row_factory = sqlite3.Row
+        for pragma, value in self.pragmas:
+            conn.execute(f"PRAGMA {pragma} = {value}")
+        for alias, path in self.attach:
+            conn.execute(f"ATTACH DATABASE ? AS {alias}", (path,))
+        return conn
+
+    def _next_batch(self):
+        first = self._queue.get()
+        if first is _STOP:
+            return None
+        batch = [first]
+        deadline = time.monotonic() + self.batch_window
+        while len(batch) < self.max_batch:
+            try:
+                remaining = deadline - time.monotonic()
+                job = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if job is _STOP:
+                self._queue.put(_STOP)
+                break
+            batch.append(job)
+        return batch
+
+    def _run(self):
+        conn = self._connect()
+        self._writer_conn = WriterConnection(conn, self)
+        while True:
+            batch = self._next_batch()
+            if batch is None:
+                break
+            try:
+                self._process(conn, batch)
+            except sqlite3.Error as e:
+                logger.error(f"Error en el escritor, reabriendo conexión: {e}")
+                for job in batch:
+                    if not job.future.done():
+                        job.future.set_exception(e)
+                try:
+                    conn.close()
+                except sqlite3.Error:
+                    pass
+                conn = self._connect()
+                self._writer_conn = WriterConnection(conn, self)
+        conn.close()
+
+    def _process(self, conn: sqlite3.Connection, batch):
+        started = time.monotonic()
+        outcomes = []
+        try:
+            self.retry_policy.call(conn.execute, "BEGIN IMMEDIATE")
+        except sqlite3.Error as e:
+            for job in batch:
+                job.future.set_exception(e)
+            with self._lock:
+                self._stats['failed'] += len(batch)
+            raise
+
+        query_log = self.query_log
+        for job in batch:
+            if query_log is not None:
+                # Las consultas del trabajo se atribuyen a la ruta que lo encoló
+                query_log.set_route(job.route)
+            conn.execute("SAVEPOINT trabajo")
+            try:
+                result = job.fn(self._writer_conn, *job.args, **job.kwargs)
+                conn.execute("RELEASE trabajo")
+                outcomes.append((job, True, result))
+            except Exception as e:
+                conn.execute("ROLLBACK TO trabajo")
+                conn.execute("RELEASE trabajo")
+                outcomes.append((job, False, e))
+        if query_log is not None:
+            query_log.set_route(None)
+
+        try:
+            self.retry_policy.call(conn.execute, "COMMIT")
+        except sqlite3.Error as e:
+            conn.execute("ROLLBACK")
+            for job in batch:
+                job.future.set_exception(e)
+            with self._lock:
+                self._stats['failed'] += len(batch)
+                self._stats['batches'] += 1
+            return
+
+        finished = time.monotonic()
+        ok = 0
+        wait_total = 0.0
+        for job, success, value in outcomes:
+            wait_total += started - job.submitted
+            if success:
+                ok += 1
+                job.future.set_result(value)
+            else:
+                job.future.set_exception(value)
+
+        with self._lock:
+            self._stats['committed'] += ok
+            self._stats['failed'] += len(batch) - ok
+            self._stats['batches'] += 1
+            self._stats['max_batch'] = max(self._stats['max_batch'], len(batch))
+            self._stats['queue_wait_total'] += wait_total
+            self._stats['commit_time_total'] += finished - started
+
+# ----------------------------------------------------------------------
+# Registro de escritores por base de datos
+# ----------------------------------------------------------------------
+_writers: Dict[str, WriteQueue] = {}
+_writers_lock = threading.Lock()
+
+def get_writer(db_path: str, **kwargs) -> WriteQueue:
+    """Obtiene (o crea) el escritor único de una base de datos"""
+    with _writers_lock:
+        writer = _writers.get(db_path)
+        if writer is None:
+            writer = WriteQueue(db_path, **kwargs)
+            _writers[db_path] = writer
+        return writer
+
+def init_app(app):
+    """Crea e inicia el escritor único de la app"""
+    pool = app.extensions.get('db_pool')
+    pragmas = DEFAULT_PRAGMAS
+    if app.config.get('DB_JOURNAL_MODE', 'WAL').upper() == 'WAL':
+        pragmas = DEFAULT_PRAGMAS + WAL_PRAGMAS
+
+    writer = get_writer(
+        app.config['DATABASE_PATH'],
+        max_batch=app.config.get('WRITER_MAX_BATCH', 64),
+        batch_window=app.config.get('WRITER_BATCH_WINDOW', 0.0),
+        pragmas=pragmas,
+        retry_policy=pool.retry_policy if pool is not None else None,
+        cached_statements=app.config.get('DB_CACHED_STATEMENTS', 256),
+    )
+    writer.start()
+    app.extensions['db_writer'] = writer
+    return writer